@@ -20,12 +20,19 @@ from .client import (
     AsyncTranslator
 )
 
+# 导出缓存相关
+from .cache import TranslationCache
+
 # 导出异常相关
 from .exceptions import (
     TranslatorError,
     ConfigurationError,
     APIError,
     RateLimitError,
+    QuotaExceededError,
+    InputTooLongError,
+    NetworkError,
+    TimeoutError,
     AuthenticationError,
     ValidationError,
     FileProcessingError
@@ -49,11 +56,18 @@ __all__ = [
     "AsyncDoubaoClient",
     "AsyncTranslator",
     
+    # Cache
+    "TranslationCache",
+    
     # Exceptions
     "TranslatorError",
     "ConfigurationError",
     "APIError",
     "RateLimitError",
+    "QuotaExceededError",
+    "InputTooLongError",
+    "NetworkError",
+    "TimeoutError",
     "AuthenticationError",
     "ValidationError",
     "FileProcessingError"
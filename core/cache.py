@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+翻译记忆缓存 (Translation Memory)
+基于 SQLite 的磁盘缓存：WAL 模式支持多个 CLI 进程 / Server worker 同时读写，
+按条目数上限做 LRU 淘汰。
+"""
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# 模型日期版本后缀，如 doubao-seed-translation-250915 中的 -250915
+_VERSION_SUFFIX_RE = re.compile(r'-\d{6}$')
+
+
+def normalize_text(text: str) -> str:
+    """归一化原文：合并连续空白并去除首尾空白"""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def model_family(model: str) -> str:
+    """提取模型家族名 (去掉日期版本后缀)，同一家族的不同版本共享缓存"""
+    return _VERSION_SUFFIX_RE.sub('', model.strip().lower())
+
+
+class TranslationCache:
+    """磁盘翻译记忆，键为 (归一化原文, 源语言, 目标语言, 模型家族)"""
+
+    # 每写入多少条检查一次是否需要淘汰
+    EVICT_CHECK_INTERVAL = 500
+
+    def __init__(self, path: str = ".translation_cache.db", max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._evict_interval = max(1, min(self.EVICT_CHECK_INTERVAL, max_entries // 10))
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """延迟打开连接，避免仅构造对象就创建数据库文件"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY,"
+                " translation TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON translations(last_access)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(text: str, source: str, target: str, family: str) -> str:
+        raw = "\x1f".join([normalize_text(text), source or "", target or "", family])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text: str, source: str, target: str, families: List[str]) -> Optional[str]:
+        """按模型池优先级依次查找，命中第一个即返回"""
+        keys = [self.make_key(text, source, target, f) for f in families]
+        if not keys:
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                placeholders = ",".join("?" * len(keys))
+                rows = dict(conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders})", keys
+                ).fetchall())
+                for key in keys:
+                    if key in rows:
+                        conn.execute("UPDATE translations SET last_access = ? WHERE key = ?", (time.time(), key))
+                        self.stats['hits'] += 1
+                        return rows[key]
+                self.stats['misses'] += 1
+                return None
+        except sqlite3.Error as e:
+            # 缓存故障绝不能影响翻译主流程，按未命中处理
+            self.stats['errors'] += 1
+            self.stats['misses'] += 1
+            logger.warning(f"翻译缓存读取失败: {e}")
+            return None
+
+    def put(self, text: str, source: str, target: str, family: str, translation: str):
+        key = self.make_key(text, source, target, family)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, translation, created, last_access) VALUES (?, ?, ?, ?)",
+                    (key, translation, now, now)
+                )
+                self.stats['writes'] += 1
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self._evict_interval:
+                    self._writes_since_evict = 0
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.warning(f"翻译缓存写入失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """超出上限时删除最久未访问的条目"""
+        count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        conn.execute(
+            "DELETE FROM translations WHERE key IN ("
+            " SELECT key FROM translations ORDER BY last_access ASC LIMIT ?)",
+            (overflow,)
+        )
+        self.stats['evictions'] += overflow
+        logger.debug(f"翻译缓存淘汰 {overflow} 条旧记录")
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+模型熔断器 (Circuit Breaker)
+closed (正常) → open (熔断，暂停调用) → half_open (放行一个探测请求) → closed / open
+
+取代原先只增不减的 disabled_models 黑名单：额度用尽时熔断到下次配额重置 (或定时探测)，
+连续失败时短暂熔断后自动探测恢复，长时间批处理可以自动回到快速模型。
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个模型的熔断器"""
+
+    HISTORY_SIZE = 20
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 max_recovery_timeout: float = 600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self._open_until = 0.0
+        self._current_timeout = recovery_timeout
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        # 状态变化记录: (时间戳, 旧状态, 新状态, 原因)
+        self.history: Deque[tuple] = deque(maxlen=self.HISTORY_SIZE)
+
+    def _transition(self, new_state: str, reason: str):
+        old_state = self.state
+        if old_state == new_state:
+            return
+        self.state = new_state
+        self.history.append((time.time(), old_state, new_state, reason))
+        if new_state == CircuitState.OPEN:
+            retry_in = max(0.0, self._open_until - time.monotonic())
+            logger.warning(f"🔌 熔断器 [{self.name}]: {old_state} → open ({reason})，{retry_in:.0f}s 后探测")
+        elif new_state == CircuitState.CLOSED:
+            logger.info(f"🔌 熔断器 [{self.name}]: {old_state} → closed ({reason})，模型恢复使用")
+        else:
+            logger.info(f"🔌 熔断器 [{self.name}]: {old_state} → half_open，发送探测请求")
+
+    def is_available(self) -> bool:
+        """只读检查：当前是否可能放行请求 (不占用探测名额)"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            return time.monotonic() >= self._open_until
+        return not self._probe_busy()
+
+    def _probe_busy(self) -> bool:
+        # 探测请求被取消时不会回报结果：超过最长退避时间仍未回报视为丢失，允许重新探测
+        return self._probe_in_flight and time.monotonic() - self._probe_started < self.max_recovery_timeout
+
+    def allow_request(self) -> bool:
+        """放行检查：open 超时后转入 half_open 并占用唯一的探测名额"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() < self._open_until:
+                return False
+            self._transition(CircuitState.HALF_OPEN, "probe")
+        if self._probe_busy():
+            return False
+        self._probe_in_flight = True
+        self._probe_started = time.monotonic()
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CircuitState.CLOSED:
+            self._current_timeout = self.recovery_timeout
+            self._transition(CircuitState.CLOSED, "probe succeeded")
+
+    def record_failure(self, reason: str = "failures"):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == CircuitState.HALF_OPEN:
+            # 探测失败：退避时间翻倍
+            self._current_timeout = min(self.max_recovery_timeout, self._current_timeout * 2)
+            self._open(self._current_timeout, reason)
+        elif self.state == CircuitState.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open(self._current_timeout, reason)
+
+    def trip(self, open_seconds: float, reason: str):
+        """立即熔断指定时长 (如额度用尽时熔断到配额重置)"""
+        self._probe_in_flight = False
+        self._open(open_seconds, reason)
+
+    def _open(self, seconds: float, reason: str):
+        self._open_until = time.monotonic() + max(0.0, seconds)
+        self.open_count += 1
+        if self.state == CircuitState.OPEN:
+            return
+        self._transition(CircuitState.OPEN, reason)
+
+    def get_stats(self) -> Dict:
+        retry_in: Optional[float] = None
+        if self.state == CircuitState.OPEN:
+            retry_in = round(max(0.0, self._open_until - time.monotonic()), 1)
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'open_count': self.open_count,
+            'retry_in_seconds': retry_in,
+            'transitions': [
+                {'time': round(t, 3), 'from': old, 'to': new, 'reason': reason}
+                for t, old, new, reason in self.history
+            ],
+        }
@@ -6,40 +6,121 @@ Doubao API Client - 终极版
 
 import asyncio
 import httpx
+import json
 import logging
 import os
 import re
-from typing import List, Dict, Set, Optional
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional
 
 from core.token_tracker import TokenTracker
-from core.config import DOUBAO_TRANSLATION_URL, DOUBAO_CHAT_URL
+from core.config import (
+    DOUBAO_TRANSLATION_URL, DOUBAO_CHAT_URL, RATE_LIMIT_HEADROOM,
+    DEFAULT_PACK_TOKEN_BUDGET, DEFAULT_PACK_MAX_SEGMENTS, DEFAULT_MAX_RETRIES,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT, BREAKER_MAX_RECOVERY_TIMEOUT, QUOTA_PROBE_INTERVAL,
+    get_model_concurrency, get_model_rate_limits, get_model_max_input_tokens
+)
+from core.circuit_breaker import CircuitBreaker, CircuitState
+from core.concurrency import AdaptiveConcurrencyLimiter
+from core.rate_limiter import ModelRateLimiter, TokenBucket
+from core.cache import TranslationCache, model_family, normalize_text
+from core.exceptions import (
+    APIError, AuthenticationError, InputTooLongError, NetworkError, QuotaExceededError,
+    RateLimitError, TranslatorError, ValidationError, TimeoutError as RequestTimeoutError,
+)
+from core.retry import RetryPolicy, RetryState
 
 logger = logging.getLogger(__name__)
 
+# 错误体关键词 (匹配 error.code 与原始响应体，小写)
+QUOTA_ERROR_KEYWORDS = ("setlimitexceeded", "insufficient_quota", "accountoverdue")
+INPUT_TOO_LONG_KEYWORDS = (
+    "invalidparameter",  # doubao-seed-translation 实际返回
+    "context_length", "too long", "token limit",
+    "max_token", "length exceed", "input too long",
+)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头 (秒数或 HTTP 日期)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
 
 
 class AsyncDoubaoClient:
-    def __init__(self, api_key: str, models: List[str], max_concurrent: int = 150, source_language: str = "", target_language: str = "en"):
+    def __init__(self, api_key: str, models: List[str], max_concurrent: int = 150, source_language: str = "", target_language: str = "en",
+                 cache: Optional[TranslationCache] = None, max_requests_per_second: Optional[float] = None,
+                 rpm_overrides: Optional[Dict[str, int]] = None, tpm_overrides: Optional[Dict[str, int]] = None,
+                 pack_enabled: bool = True, pack_token_budget: int = DEFAULT_PACK_TOKEN_BUDGET,
+                 pack_max_segments: int = DEFAULT_PACK_MAX_SEGMENTS, max_retries: int = DEFAULT_MAX_RETRIES,
+                 max_input_overrides: Optional[Dict[str, int]] = None, cache_read: bool = True):
         self.api_key = api_key
         self.models = models if models else ["doubao-seed-translation-250915"]
         self.token_tracker = TokenTracker()
         
+        # 翻译记忆缓存 (可选)：按模型池优先级排列的家族名用于查找
+        self.cache = cache
+        # 补漏/强制重译时关闭读取：只写回新译文，不再复用上一轮缓存的 (可能未翻译的) 结果
+        self.cache_read = cache_read
+        self._cache_families = list(dict.fromkeys(model_family(m) for m in self.models))
+        
+        # 单飞 (single-flight)：相同 (原文, 源语言, 目标语言) 的并发请求共享同一个上游调用
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.flight_stats = {'requests': 0, 'deduplicated': 0}
+        
+        # 多段打包：Chat 模型一次请求翻译多个短段落 (编号 JSON)，摊薄系统提示词与往返开销
+        self.pack_enabled = pack_enabled
+        self.pack_token_budget = pack_token_budget
+        self.pack_max_segments = pack_max_segments
+        self.pack_stats = {'packs': 0, 'packed_segments': 0, 'fallbacks': 0, 'failed': 0}
+        
         # [新增] 统计字典：{模型ID: 成功次数}
         self.model_stats = {
             m: {'calls': 0, 'input': 0, 'output': 0} 
             for m in self.models
         }
         
-        # 熔断列表：记录已经彻底挂掉的模型
-        self.disabled_models: Set[str] = set()
+        # 熔断器：每个模型一个，额度用尽/连续失败时暂停调用，到期后放行探测请求自动恢复
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        
+        # 重试策略：指数退避 + 抖动，429 遵循 Retry-After，按错误类型分别计预算
+        self.retry_policy = RetryPolicy(max_retries)
+        self.retry_stats = {'retries': 0, 'gave_up': 0, 'backoff_seconds': 0.0}
         
-        # --- 优化的并发控制策略 ---
+        # 长度预路由：按估算 Token 与模型输入上限直接跳过放不下的模型 (如 seed-translation ≤900)
+        self.max_input_tokens = {m: get_model_max_input_tokens(m, max_input_overrides) for m in self.models}
+        self.routing_stats = {'routed': 0, 'skipped_calls': 0, 'skipped_by_model': {}}
+        
+        # --- 自适应并发控制策略 (AIMD) ---
+        # 每个模型一个控制器，起步于车道上限：
         # doubao-seed-translation-250915: RPM=5000 → 慢车道=80并发
         # 其他高性能模型 (DeepSeek, Doubao Pro等): RPM=30000 → 快车道=500并发
-        self.sem_fast = asyncio.Semaphore(500)  # 快车道：500并发 (RPM=30000/60=500)
-        self.sem_seed = asyncio.Semaphore(80)   # 慢车道：80并发 (RPM=5000/60≈83)
+        # 429/5xx 或延迟飙升时减半，成功后逐步恢复
+        self.concurrency_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+        
+        logger.info(f"🚀 并发策略: 快车道(DeepSeek/Doubao)≤500, 慢车道(Seed-Translation)≤80 (AIMD自适应)")
         
-        logger.info(f"🚀 并发策略: 快车道(DeepSeek/Doubao)=500, 慢车道(Seed-Translation)=80")
+        # --- 令牌桶限流 ---
+        # 每个模型独立的 RPM/TPM 桶 (按服务商上限的 95% 运行)，外加一个全局 RPS 桶 (--max-rps)
+        self.rpm_overrides = rpm_overrides or {}
+        self.tpm_overrides = tpm_overrides or {}
+        self.rate_limiters: Dict[str, ModelRateLimiter] = {}
+        self.global_bucket: Optional[TokenBucket] = None
+        if max_requests_per_second and max_requests_per_second > 0:
+            self.global_bucket = TokenBucket(max_requests_per_second, max_requests_per_second * ModelRateLimiter.BURST_SECONDS)
         
         self.source_language = source_language
         self.target_language = target_language
@@ -60,13 +141,65 @@ class AsyncDoubaoClient:
         )
 
 
-    def _get_semaphore(self, model: str) -> asyncio.Semaphore:
-        """根据模型类型返回对应的信号量控制器"""
-        model_lower = model.lower()
-        # 慢车道模型: seed-translation (RPM=5000), kimi-k2 (RPM=5000)
-        if "seed-translation" in model_lower or "kimi-k2" in model_lower:
-            return self.sem_seed  # 慢车道: 80并发
-        return self.sem_fast  # 快车道: 500并发
+    def _get_semaphore(self, model: str) -> AdaptiveConcurrencyLimiter:
+        """返回模型对应的自适应并发控制器 (按需创建)"""
+        limiter = self.concurrency_limiters.get(model)
+        if limiter is None:
+            # 慢车道模型: seed-translation, kimi-k2 → 80；其余 → 500
+            limiter = AdaptiveConcurrencyLimiter(model, get_model_concurrency(model))
+            self.concurrency_limiters[model] = limiter
+        return limiter
+
+    def _get_breaker(self, model: str) -> CircuitBreaker:
+        """返回模型对应的熔断器 (按需创建)"""
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT, BREAKER_MAX_RECOVERY_TIMEOUT)
+            self.breakers[model] = breaker
+        return breaker
+
+    def _trip_on_quota(self, model: str):
+        """额度用尽：熔断到下次配额重置，但最长 QUOTA_PROBE_INTERVAL 秒后探测一次 (额度可能已被充值)"""
+        breaker = self._get_breaker(model)
+        if breaker.state == CircuitState.OPEN:
+            return
+        open_seconds = min(self.token_tracker.daily_quota.seconds_until_reset(), QUOTA_PROBE_INTERVAL)
+        logger.error(f"🚫 模型 {model} 额度用尽，熔断 {open_seconds:.0f}s 后探测。")
+        breaker.trip(open_seconds, "quota_exhausted")
+
+    @staticmethod
+    def _congestion_reason(error: Exception) -> Optional[str]:
+        """429 / 5xx / 超时视为拥塞信号，返回原因 (非拥塞错误返回 None)"""
+        if isinstance(error, QuotaExceededError):
+            return None
+        if isinstance(error, RateLimitError):
+            return "throttled"
+        if isinstance(error, RequestTimeoutError):
+            return "timeout"
+        if isinstance(error, APIError) and error.status_code is not None and error.status_code >= 500:
+            return "server_error"
+        return None
+
+    def _get_rate_limiter(self, model: str) -> ModelRateLimiter:
+        """按需创建模型的 RPM/TPM 限流器"""
+        limiter = self.rate_limiters.get(model)
+        if limiter is None:
+            rpm, tpm = get_model_rate_limits(model, self.rpm_overrides, self.tpm_overrides)
+            limiter = ModelRateLimiter(rpm, tpm, RATE_LIMIT_HEADROOM)
+            self.rate_limiters[model] = limiter
+        return limiter
+
+    def _estimate_request_tokens(self, text: str, model: str, target: str) -> int:
+        """预估一次请求的 Token 消耗 (输入 + 同量输出，Chat 模型另计系统提示词)"""
+        tokens = self.token_tracker.estimate_tokens(text) * 2
+        if not self._is_translation_special_model(model):
+            tokens += self.token_tracker.estimate_tokens(self._get_system_prompt(target))
+        return max(1, tokens)
+
+    async def _acquire_rate_limit(self, model: str, estimated_tokens: int):
+        if self.global_bucket:
+            await self.global_bucket.acquire(1)
+        await self._get_rate_limiter(model).acquire(estimated_tokens)
 
     async def async_translate(self, text: str, source: str = "", target: str = "en") -> str:
         if not text.strip(): return text
@@ -74,85 +207,358 @@ class AsyncDoubaoClient:
         source = self.source_language
         target = self.target_language
 
+        self.flight_stats['requests'] += 1
+        return await self._single_flight(text, source, target)
+
+    async def _single_flight(self, text: str, source: str, target: str) -> str:
+        """相同 (原文, 语言对) 的在途请求共用一次上游调用；调用方负责计入 flight_stats['requests']"""
+        key = (normalize_text(text), source, target)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._translate_once(text, source, target))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._release_inflight(k, t))
+        else:
+            self.flight_stats['deduplicated'] += 1
+        # shield: 某个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    def _release_inflight(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _translate_once(self, text: str, source: str, target: str) -> str:
+        """单飞的实际执行体：缓存查找 -> 多模型降级翻译 -> 写回缓存"""
+        # [缓存] 在占用车道信号量之前先查翻译记忆
+        if self.cache and self.cache_read:
+            cached = await asyncio.to_thread(self.cache.get, text, source, target, self._cache_families)
+            if cached is not None:
+                return cached
+
+        result, model = await self._translate_with_fallback(text, source, target)
+
+        if self.cache and model and self._is_cacheable(text, result):
+            await asyncio.to_thread(self.cache.put, text, source, target, model_family(model), result)
+        return result
+
+    @staticmethod
+    def _is_cacheable(text: str, result: str) -> bool:
+        """失败标记与原样回显的结果不写入缓存，否则之后的补漏轮次会一直命中这条未翻译的结果"""
+        return result != "[TRANSLATION_FAILED]" and normalize_text(result) != normalize_text(text)
+
+    async def _translate_with_fallback(self, text: str, source: str, target: str) -> tuple[str, Optional[str]]:
+        """按模型池顺序尝试翻译，返回 (译文, 成功的模型)；全部失败时模型为 None"""
         last_exception = None
         
-        for i in range(len(self.models)):
-            model = self.models[i]
-            
-            if model in self.disabled_models:
+        for i, model in enumerate(self._route_models(text)):
+            breaker = self._get_breaker(model)
+            if not breaker.is_available():
                 continue
 
             semaphore = self._get_semaphore(model)
+            # 首选模型按错误类型的预算重试；备用模型最多重试一次，尽快轮到下一个模型
+            retry_state = self.retry_policy.new_state(None if i == 0 else 1)
             
-            async with semaphore:
-                # [Check 2] 关键修复：拿到锁之后再次检查！
-                # 防止排队期间模型被其他并发请求拉黑
-                if model in self.disabled_models:
-                    continue
+            estimated_tokens = self._estimate_request_tokens(text, model, target)
+            while True:
+                # 先在令牌桶排队，拿到发送配额后再占并发名额：等待限流期间不占用车道
+                await self._acquire_rate_limit(model, estimated_tokens)
+                async with semaphore:
+                    # [Check 2] 关键修复：拿到锁之后再次检查！
+                    # 防止排队期间模型被其他并发请求熔断；half_open 时只有一个请求能拿到探测名额
+                    if not breaker.allow_request():
+                        break
+                    try:
+                        started = time.monotonic()
+                        if self._is_translation_special_model(model):
+                            result, in_t, out_t = await self._request_special_endpoint(text, source, target, model)
+                        else:
+                            result, in_t, out_t = await self._request_chat_endpoint(text, source, target, model)
+                        
+                        # 更新详细统计
+                        self._record_model_usage(model, in_t, out_t)
+                        self._get_rate_limiter(model).settle(estimated_tokens, in_t + out_t)
+                        # 延迟按文本长度归一化 (每100 Token)，避免长段落被误判为拥塞
+                        semaphore.record_success((time.monotonic() - started) / max(1.0, estimated_tokens / 100))
+                        breaker.record_success()
+                        
+                        return result, model
+                    
+                    except Exception as e:
+                        if not isinstance(e, TranslatorError):
+                            # 响应结构异常等：视为不可重试的接口错误
+                            e = APIError(f"{model} 响应解析失败: {e!r}", status_code=200)
+                        last_exception = e
+                        delay = self._handle_request_error(model, e, semaphore, breaker, retry_state)
+                        if delay is None:
+                            break
+                
+                # 退避期间不占用并发名额
+                self.retry_stats['retries'] += 1
+                self.retry_stats['backoff_seconds'] += delay
+                await asyncio.sleep(delay)
 
-                try:
-                    retries = 2 if i == 0 else 1
-                    for attempt in range(retries):
-                        if model in self.disabled_models:
-                            raise Exception("Model disabled during retry")
-                        try:
-                            if self._is_translation_special_model(model):
-                                result, in_t, out_t = await self._request_special_endpoint(text, source, target, model)
-                            else:
-                                result, in_t, out_t = await self._request_chat_endpoint(text, source, target, model)
-                            
-                            # 更新详细统计
-                            if model not in self.model_stats:
-                                self.model_stats[model] = {'calls': 0, 'input': 0, 'output': 0}
-                            
-                            self.model_stats[model]['calls'] += 1
-                            self.model_stats[model]['input'] += in_t
-                            self.model_stats[model]['output'] += out_t
-                            
-                            return result
+        if last_exception:
+            logger.error(f"❌ 翻译失败 (所有可用模型均尝试失败): {last_exception}")
+        return "[TRANSLATION_FAILED]", None
 
-                        
-                        except Exception as e:
-                            error_str = str(e).lower()
-                            
-                            # [情况1] 额度用尽 - 永久拉黑该模型
-                            if "setlimitexceeded" in error_str or "insufficient_quota" in error_str:
-                                if model not in self.disabled_models:
-                                    logger.error(f"🚫 模型 {model} 额度用尽，已永久拉黑。")
-                                    self.disabled_models.add(model)
-                                raise e
-                            
-                            # [情况2] 输入过长 - 仅本次请求降级，不拉黑模型
-                            # 实测 doubao-seed-translation 超限时返回: 400 InvalidParameter
-                            # 其他可能的关键词: context_length_exceeded, too long, max_tokens
-                            token_limit_keywords = [
-                                "invalidparameter",  # doubao-seed-translation 实际返回
-                                "context_length", "too long", "token limit", 
-                                "max_token", "length exceed", "input too long"
-                            ]
-                            if any(kw in error_str for kw in token_limit_keywords):
-                                logger.warning(f"⚠️ [{model}] 输入过长 ({len(text)} chars)，降级到下一个模型...")
-                                raise e  # 抛出让外层 continue 到下一个模型
-
-                            if attempt == retries - 1:
-                                raise e
-                            await asyncio.sleep(1)
-                    break 
-                            
+    def _route_models(self, text: str) -> List[str]:
+        """按输入长度筛选模型池：跳过输入上限放不下该文本的模型；都放不下时保持原顺序交给接口判断"""
+        tokens = self.token_tracker.estimate_tokens(text)
+        fitting = [m for m in self.models if tokens <= self.max_input_tokens[m]]
+        if not fitting or len(fitting) == len(self.models):
+            return self.models
+        # 只统计原本会被调用的模型 (排在第一个可用模型之前、且未熔断)
+        skipped = [m for m in self.models[:self.models.index(fitting[0])] if self._get_breaker(m).is_available()]
+        if skipped:
+            self.routing_stats['routed'] += 1
+            self.routing_stats['skipped_calls'] += len(skipped)
+            by_model = self.routing_stats['skipped_by_model']
+            for m in skipped:
+                by_model[m] = by_model.get(m, 0) + 1
+            logger.debug(f"📏 超长文本 (~{tokens} tokens) 跳过 {skipped}，直接路由到 {fitting[0]}")
+        return fitting
+
+    def get_routing_stats(self) -> Dict:
+        return {**self.routing_stats, 'skipped_by_model': dict(self.routing_stats['skipped_by_model'])}
+
+    def _handle_request_error(self, model: str, error: TranslatorError, semaphore: AdaptiveConcurrencyLimiter,
+                              breaker: CircuitBreaker, retry_state: RetryState) -> Optional[float]:
+        """根据错误类型更新并发/熔断状态；返回重试前的等待秒数，None 表示放弃该模型"""
+        reason = self._congestion_reason(error)
+        if reason:
+            semaphore.record_congestion(reason)
+        
+        # [情况1] 额度用尽 - 熔断该模型直到配额重置 (期间定时探测)
+        if isinstance(error, QuotaExceededError):
+            self._trip_on_quota(model)
+            return None
+        
+        # [情况2] 输入过长 - 仅本次请求降级，不计入熔断 (模型本身是健康的)
+        if isinstance(error, InputTooLongError):
+            breaker.record_success()
+            logger.warning(f"⚠️ [{model}] 输入过长，降级到下一个模型...")
+            return None
+        
+        # 探测请求只发一次，失败即重新熔断
+        delay = retry_state.next_delay(error) if breaker.state == CircuitState.CLOSED else None
+        if delay is not None and delay > self.retry_policy.max_delay:
+            # Retry-After 太长：不原地等待，熔断该模型到期后再用，先换下一个模型
+            breaker.trip(delay, "retry_after")
+            return None
+        if delay is None:
+            self.retry_stats['gave_up'] += 1
+            breaker.record_failure(type(error).__name__)
+            logger.debug(f"[{model}] 放弃重试: {error}")
+        return delay
+
+    def get_retry_stats(self) -> Dict[str, float]:
+        return {**self.retry_stats, 'backoff_seconds': round(self.retry_stats['backoff_seconds'], 2)}
+
+    def _record_model_usage(self, model: str, in_tokens: int, out_tokens: int):
+        if model not in self.model_stats:
+            self.model_stats[model] = {'calls': 0, 'input': 0, 'output': 0}
+        self.model_stats[model]['calls'] += 1
+        self.model_stats[model]['input'] += in_tokens
+        self.model_stats[model]['output'] += out_tokens
+
+    # ==================== 多段打包翻译 ====================
+
+    def _get_pack_model(self) -> Optional[str]:
+        """当前首选可用模型为 Chat 模型时才打包 (Seed 翻译接口只接受单段文本)"""
+        if not self.pack_enabled:
+            return None
+        for model in self.models:
+            if not self._get_breaker(model).is_available():
+                continue
+            return None if self._is_translation_special_model(model) else model
+        return None
+
+    async def async_translate_many(self, texts: List[str], source: str = "", target: str = "en") -> List[str]:
+        """批量翻译：可打包时把短段落按 Token 预算合并成少量请求，否则逐段并发"""
+        pack_model = self._get_pack_model()
+        if not pack_model:
+            return list(await asyncio.gather(*[self.async_translate(t, source, target) for t in texts]))
+
+        source = self.source_language
+        target = self.target_language
+        results = list(texts)
+
+        # 1. 批内去重 (空文本原样返回)
+        positions: Dict[str, List[int]] = {}
+        originals: Dict[str, str] = {}
+        for idx, text in enumerate(texts):
+            if not text.strip():
+                continue
+            key = normalize_text(text)
+            positions.setdefault(key, []).append(idx)
+            originals.setdefault(key, text)
+        duplicates = sum(len(v) - 1 for v in positions.values())
+        self.flight_stats['requests'] += sum(len(v) for v in positions.values())
+        self.flight_stats['deduplicated'] += duplicates
+
+        # 2. 查翻译记忆
+        resolved: Dict[str, str] = {}
+        if self.cache and self.cache_read and positions:
+            lookups = await asyncio.to_thread(
+                lambda: {k: self.cache.get(originals[k], source, target, self._cache_families) for k in positions}
+            )
+            resolved.update({k: v for k, v in lookups.items() if v is not None})
+
+        # 3. 按 Token 预算分组：短段落打包，超长段落单独请求
+        packs: List[List[str]] = []
+        solo: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for key in positions:
+            if key in resolved:
+                continue
+            tokens = self.token_tracker.estimate_tokens(originals[key])
+            if tokens * 2 > self.pack_token_budget:
+                solo.append(key)
+                continue
+            if current and (current_tokens + tokens > self.pack_token_budget or len(current) >= self.pack_max_segments):
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append(key)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+
+        async def run_pack(keys: List[str]):
+            pack_texts = [originals[k] for k in keys]
+            translations = None
+            if len(keys) > 1:
+                translations = await self._translate_pack(pack_texts, source, target, pack_model)
+            if translations is None:
+                # 单段或打包未对齐/输入过长/模型已熔断：退回逐段翻译 (请求数已在第 1 步计入)
+                translations = await asyncio.gather(*[self._single_flight(t, source, target) for t in pack_texts])
+            resolved.update(zip(keys, translations))
+
+        async def run_solo(key: str):
+            resolved[key] = await self._single_flight(originals[key], source, target)
+
+        await asyncio.gather(*[run_pack(p) for p in packs], *[run_solo(k) for k in solo])
+
+        for key, indices in positions.items():
+            for idx in indices:
+                results[idx] = resolved[key]
+        return results
+
+    async def _translate_pack(self, texts: List[str], source: str, target: str, model: str) -> Optional[List[str]]:
+        """
+        发送一个打包请求，429/超时/5xx 按重试策略整包重试；返回 None 表示由调用方退回逐段翻译。
+        只有对齐校验不通过、输入过长或该模型已熔断时才逐段翻译：
+        拥塞时把一个被拒的请求拆成几十个单段请求只会加重服务端压力。
+        """
+        limiter = self._get_semaphore(model)
+        breaker = self._get_breaker(model)
+        retry_state = self.retry_policy.new_state()
+        estimated_tokens = sum(self.token_tracker.estimate_tokens(t) * 2 for t in texts) + \
+            self.token_tracker.estimate_tokens(self._get_pack_system_prompt(target))
+        while True:
+            # 限流排队在占用并发名额之前
+            await self._acquire_rate_limit(model, estimated_tokens)
+            async with limiter:
+                if not breaker.allow_request():
+                    return None
+                started = time.monotonic()
+                try:
+                    translations, in_t, out_t = await self._request_chat_packed(texts, target, model)
+                except ValidationError as e:
+                    # 模型有响应，只是格式不对齐：不计入熔断
+                    breaker.record_success()
+                    self.pack_stats['fallbacks'] += 1
+                    logger.warning(f"⚠️ [{model}] 打包结果未对齐 ({len(texts)} 段)，退回逐段翻译: {e}")
+                    return None
                 except Exception as e:
-                    last_exception = e
-                    continue 
+                    if not isinstance(e, TranslatorError):
+                        e = APIError(f"{model} 响应解析失败: {e!r}", status_code=200)
+                    delay = self._handle_request_error(model, e, limiter, breaker, retry_state)
+                    if delay is None:
+                        if isinstance(e, InputTooLongError) or breaker.state != CircuitState.CLOSED:
+                            # 逐段请求会跳过已熔断的模型，交给模型池中的其他模型
+                            self.pack_stats['fallbacks'] += 1
+                            logger.warning(f"⚠️ [{model}] 打包请求失败，退回逐段翻译: {e}")
+                            return None
+                        # 模型仍可用但重试已用尽：整包记为失败，留给后续补漏轮次
+                        self.pack_stats['failed'] += 1
+                        logger.error(f"❌ [{model}] 打包请求失败 ({len(texts)} 段): {e}")
+                        return ["[TRANSLATION_FAILED]"] * len(texts)
+                else:
+                    self._record_model_usage(model, in_t, out_t)
+                    self._get_rate_limiter(model).settle(estimated_tokens, in_t + out_t)
+                    limiter.record_success((time.monotonic() - started) / max(1.0, estimated_tokens / 100))
+                    breaker.record_success()
+                    break
 
-        if last_exception:
-            logger.error(f"❌ 翻译失败 (所有可用模型均尝试失败)")
-        return "[TRANSLATION_FAILED]"
+            # 退避期间不占用并发名额
+            self.retry_stats['retries'] += 1
+            self.retry_stats['backoff_seconds'] += delay
+            await asyncio.sleep(delay)
+
+        self.pack_stats['packs'] += 1
+        self.pack_stats['packed_segments'] += len(texts)
+        entries = [(t, r) for t, r in zip(texts, translations) if self._is_cacheable(t, r)]
+        if self.cache and entries:
+            family = model_family(model)
+            await asyncio.to_thread(
+                lambda: [self.cache.put(t, source, target, family, r) for t, r in entries]
+            )
+        return translations
+
+    @staticmethod
+    def _parse_packed_response(content: str, expected: int) -> List[str]:
+        """解析打包响应 {"1": "...", ...} 并校验编号与数量完全对齐"""
+        body = content.strip()
+        # 去掉模型偶尔添加的 ```json 代码块包裹
+        body = re.sub(r'^```(?:json)?\s*|\s*```$', '', body)
+        start, end = body.find('{'), body.rfind('}')
+        if start == -1 or end <= start:
+            raise ValidationError("响应中没有 JSON 对象")
+        try:
+            data = json.loads(body[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"JSON 解析失败: {e}")
+        if not isinstance(data, dict):
+            raise ValidationError("响应不是 JSON 对象")
+
+        expected_ids = [str(i) for i in range(1, expected + 1)]
+        if sorted(data.keys(), key=lambda k: (len(k), k)) != expected_ids:
+            raise ValidationError(f"编号不匹配: 期望 {expected} 段, 实际 {len(data)} 段")
+        translations = []
+        for seg_id in expected_ids:
+            value = data[seg_id]
+            if not isinstance(value, str) or not value.strip():
+                raise ValidationError(f"第 {seg_id} 段译文为空")
+            translations.append(value.strip())
+        return translations
+
+    def get_pack_stats(self) -> Dict[str, float]:
+        packs = self.pack_stats['packs']
+        return {
+            **self.pack_stats,
+            'avg_segments_per_pack': round(self.pack_stats['packed_segments'] / packs, 2) if packs else 0.0,
+        }
+
+    def get_flight_stats(self) -> Dict[str, float]:
+        requests = self.flight_stats['requests']
+        deduplicated = self.flight_stats['deduplicated']
+        return {
+            'requests': requests,
+            'deduplicated': deduplicated,
+            'dedup_ratio': round(deduplicated / requests, 4) if requests else 0.0,
+        }
 
     def _is_translation_special_model(self, model_name: str) -> bool:
         return "seed-translation" in model_name
 
-    def _get_system_prompt(self, target_lang: str) -> str:
+    def _get_target_name(self, target_lang: str) -> str:
         lang_map = {"zh": "Simplified Chinese", "en": "English", "jp": "Japanese"}
-        target_name = lang_map.get(target_lang, target_lang)
+        return lang_map.get(target_lang, target_lang)
+
+    def _get_system_prompt(self, target_lang: str) -> str:
+        target_name = self._get_target_name(target_lang)
         return (
             f"You are a professional literary translator. Translate into {target_name}.\n"
             "Rules:\n"
@@ -161,6 +567,53 @@ class AsyncDoubaoClient:
             "3. Handle fragments as fragments."
         )
 
+    def _get_pack_system_prompt(self, target_lang: str) -> str:
+        target_name = self._get_target_name(target_lang)
+        return (
+            f"You are a professional literary translator. Translate into {target_name}.\n"
+            "The input is a JSON object mapping segment ids to source segments.\n"
+            "Rules:\n"
+            "1. Output ONLY a JSON object with exactly the same ids, each mapped to its translation.\n"
+            "2. Translate every segment on its own. Never merge, split or drop segments.\n"
+            "3. Keep original style and tone. No notes/explanations."
+        )
+
+    async def _post(self, url: str, payload: Dict, label: str) -> httpx.Response:
+        """发送请求，把超时/网络错误/非 200 响应转换为带类型的异常"""
+        try:
+            response = await self.client.post(url, json=payload)
+        except httpx.TimeoutException as e:
+            raise RequestTimeoutError(f"{label} API timeout: {e!r}") from e
+        except httpx.TransportError as e:
+            raise NetworkError(f"{label} API network error: {e!r}") from e
+        if response.status_code != 200:
+            raise self._classify_response_error(response, label)
+        return response
+
+    @staticmethod
+    def _classify_response_error(response: httpx.Response, label: str) -> TranslatorError:
+        """按状态码与错误体 (error.code) 归类"""
+        status = response.status_code
+        body = response.text
+        message = f"{label} API {status}: {body}"
+        try:
+            code = str((response.json().get("error") or {}).get("code", ""))
+        except (ValueError, AttributeError):
+            code = ""
+        lowered = f"{code} {body}".lower()
+
+        if any(kw in lowered for kw in QUOTA_ERROR_KEYWORDS):
+            return QuotaExceededError(message, status_code=status, response=body)
+        # 实测 doubao-seed-translation 超限时返回: 400 InvalidParameter
+        if status in (400, 413) and any(kw in lowered for kw in INPUT_TOO_LONG_KEYWORDS):
+            return InputTooLongError(message, status_code=status, response=body)
+        if status == 429:
+            return RateLimitError(message, retry_after=_parse_retry_after(response.headers.get("retry-after")),
+                                  status_code=status, response=body)
+        if status in (401, 403):
+            return AuthenticationError(message)
+        return APIError(message, status_code=status, response=body)
+
     async def _request_special_endpoint(self, text: str, source: str, target: str, model: str) -> str:
         """Seed 模型接口"""
         payload = {
@@ -168,10 +621,7 @@ class AsyncDoubaoClient:
             "input": [{"role": "user", "content": [{"type": "input_text", "text": text, 
                        "translation_options": {"source_language": source, "target_language": target}}]}]
         }
-        response = await self.client.post(DOUBAO_TRANSLATION_URL, json=payload)
-        
-        if response.status_code != 200:
-            raise Exception(f"Seed API {response.status_code}: {response.text}")
+        response = await self._post(DOUBAO_TRANSLATION_URL, payload, "Seed")
             
         logger.debug(f"✅ [{model}] 翻译成功")
         result_text = response.json()["output"][0]["content"][0]["text"].strip()
@@ -183,14 +633,12 @@ class AsyncDoubaoClient:
         # [修改] 返回元组 (文本, 输入Token, 输出Token)
         return result_text, in_tokens, out_tokens
 
-    async def _request_chat_endpoint(self, text: str, source: str, target: str, model: str) -> tuple[str, int, int]:
-        """通用 Chat 接口 (适配 DeepSeek, Doubao Pro/1.6 等高性能模型)"""
-        
+    def _build_chat_payload(self, model: str, system_prompt: str, user_content: str) -> Dict:
         payload = {
             "model": model,
             "messages": [
-                {"role": "system", "content": self._get_system_prompt(target)},
-                {"role": "user", "content": text}
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
             ],
             "stream": False,
             "temperature": 0.3
@@ -202,11 +650,13 @@ class AsyncDoubaoClient:
             payload["reasoning_effort"] = "minimal"
             # 1.6 模型通常建议稍微调高一点 max_tokens 防止截断，虽然翻译一般够用
             # payload["max_completion_tokens"] = 4096 
+        return payload
 
-        response = await self.client.post(DOUBAO_CHAT_URL, json=payload)
+    async def _request_chat_endpoint(self, text: str, source: str, target: str, model: str) -> tuple[str, int, int]:
+        """通用 Chat 接口 (适配 DeepSeek, Doubao Pro/1.6 等高性能模型)"""
         
-        if response.status_code != 200:
-            raise Exception(f"Chat API {response.status_code}: {response.text}")
+        payload = self._build_chat_payload(model, self._get_system_prompt(target), text)
+        response = await self._post(DOUBAO_CHAT_URL, payload, "Chat")
             
         logger.debug(f"✅ [{model}] 翻译成功")
         data = response.json()
@@ -221,8 +671,25 @@ class AsyncDoubaoClient:
         
         return result_text, in_tokens, out_tokens
 
+    async def _request_chat_packed(self, texts: List[str], target: str, model: str) -> tuple[List[str], int, int]:
+        """Chat 接口打包请求：编号 JSON 输入，返回对齐后的译文列表"""
+        numbered = {str(i): t for i, t in enumerate(texts, 1)}
+        payload = self._build_chat_payload(
+            model, self._get_pack_system_prompt(target), json.dumps(numbered, ensure_ascii=False)
+        )
+        response = await self._post(DOUBAO_CHAT_URL, payload, "Chat")
+
+        data = response.json()
+        translations = self._parse_packed_response(data["choices"][0]["message"]["content"], len(texts))
+        logger.debug(f"✅ [{model}] 打包翻译成功 ({len(texts)} 段)")
+
+        usage = data.get("usage", {})
+        return translations, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
     async def close(self):
         await self.client.aclose()
+        if self.cache:
+            self.cache.close()
 
 
 class AsyncTranslator:
@@ -234,6 +701,8 @@ class AsyncTranslator:
             max_concurrent = 20
             source_language = ""
             target_language = "zh"
+            cache = None
+            limit_kwargs = {}
         else:
             api_key = config_or_key.api_key
             models = getattr(config_or_key, 'models', [])
@@ -243,21 +712,45 @@ class AsyncTranslator:
             
             if not models and hasattr(config_or_key, 'model'):
                 models = [config_or_key.model]
+            
+            cache = None
+            if getattr(config_or_key, 'cache_enabled', False):
+                cache = TranslationCache(config_or_key.cache_path, config_or_key.cache_max_entries)
+            
+            limit_kwargs = {
+                'max_requests_per_second': getattr(config_or_key, 'max_requests_per_second', None),
+                'rpm_overrides': getattr(config_or_key, 'model_rpm_overrides', None),
+                'tpm_overrides': getattr(config_or_key, 'model_tpm_overrides', None),
+                'pack_enabled': getattr(config_or_key, 'pack_enabled', True),
+                'pack_token_budget': getattr(config_or_key, 'pack_token_budget', DEFAULT_PACK_TOKEN_BUDGET),
+                'pack_max_segments': getattr(config_or_key, 'pack_max_segments', DEFAULT_PACK_MAX_SEGMENTS),
+                'max_retries': getattr(config_or_key, 'max_retries', DEFAULT_MAX_RETRIES),
+                'max_input_overrides': getattr(config_or_key, 'model_max_input_overrides', None),
+                'cache_read': getattr(config_or_key, 'cache_read', True),
+            }
                 
-        self.client = AsyncDoubaoClient(api_key, models, max_concurrent, source_language, target_language)
+        self.client = AsyncDoubaoClient(api_key, models, max_concurrent, source_language, target_language,
+                                        cache=cache, **limit_kwargs)
     
     async def translate_batch(self, texts: List[str], source_lang: Optional[str] = None, target_lang: Optional[str] = None) -> List[str]:
         source = source_lang if source_lang is not None else self.client.source_language
         target = target_lang if target_lang is not None else self.client.target_language
-        tasks = [
-            self.client.async_translate(text, source, target)
-            for text in texts
-        ]
-        return await asyncio.gather(*tasks)
+        return await self.client.async_translate_many(texts, source, target)
     
     # [新增] 获取统计信息接口
-    def get_stats(self) -> Dict[str, int]:
-        return self.client.model_stats
+    # 模型统计以模型名为键；运行时指标 (缓存等) 以下划线开头的键附加
+    def get_stats(self) -> Dict[str, Dict]:
+        stats = dict(self.client.model_stats)
+        stats['_singleflight'] = self.client.get_flight_stats()
+        stats['_packing'] = self.client.get_pack_stats()
+        stats['_rate_limit'] = {m: l.get_stats() for m, l in self.client.rate_limiters.items()}
+        stats['_concurrency'] = {m: l.get_stats() for m, l in self.client.concurrency_limiters.items()}
+        stats['_retry'] = self.client.get_retry_stats()
+        stats['_routing'] = self.client.get_routing_stats()
+        stats['_breakers'] = {m: b.get_stats() for m, b in self.client.breakers.items()}
+        if self.client.cache:
+            stats['_cache'] = self.client.cache.get_stats()
+        return stats
 
     async def close(self):
         await self.client.close()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+自适应并发控制 (AIMD)
+每个模型一个控制器：成功时加性增大并发上限，遇到 429/5xx 或延迟明显上升时乘性减小。
+用法与 asyncio.Semaphore 相同 (async with)，结果需调用 record_success / record_congestion 反馈。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 并发上限控制器"""
+
+    # 乘性减小系数
+    DECREASE_FACTOR = 0.5
+    # 两次减小之间的最小间隔 (秒)，防止同一波 429 把上限连续砍到底
+    DECREASE_COOLDOWN = 1.0
+    # 延迟 EWMA 超过基线多少倍视为拥塞
+    LATENCY_FACTOR = 3.0
+    EWMA_ALPHA = 0.2
+    HISTORY_SIZE = 50
+
+    def __init__(self, name: str, initial_limit: int, max_limit: Optional[int] = None, min_limit: int = 1):
+        self.name = name
+        self.max_limit = max(1, max_limit or initial_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = float('-inf')
+        self._latency_ewma: Optional[float] = None
+        self._latency_baseline: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+        # 上限变化记录: (时间戳, 新上限, 原因)
+        self.history: Deque[tuple] = deque(maxlen=self.HISTORY_SIZE)
+        self.history.append((time.time(), self.limit, "init"))
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def acquire(self):
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 已被唤醒但调用方取消：把名额让给下一个
+            if fut.done() and not fut.cancelled():
+                self._inflight -= 1
+                self._wake_waiters()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        self._inflight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self._inflight < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._inflight += 1
+                fut.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def record_success(self, latency: float):
+        """请求成功：加性增大 (约每完成 limit 个请求 +1)，延迟显著上升时按拥塞处理"""
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * self._latency_ewma
+        if self._latency_baseline is None or self._latency_ewma < self._latency_baseline:
+            self._latency_baseline = self._latency_ewma
+
+        if self._latency_ewma > self.LATENCY_FACTOR * self._latency_baseline:
+            if self._decrease("latency"):
+                # 以当前延迟作为新基线，只对"持续上升"做出反应
+                self._latency_baseline = self._latency_ewma
+            return
+
+        if self._limit < self.max_limit:
+            old = self.limit
+            self._limit = min(self.max_limit, self._limit + 1.0 / max(1.0, self._limit))
+            if self.limit > old:
+                self.increases += 1
+                self.history.append((time.time(), self.limit, "increase"))
+                self._wake_waiters()
+
+    def record_congestion(self, reason: str = "throttled"):
+        """收到 429 / 5xx：乘性减小"""
+        self._decrease(reason)
+
+    def _decrease(self, reason: str) -> bool:
+        now = time.monotonic()
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return False
+        self._last_decrease = now
+        new_limit = max(float(self.min_limit), self._limit * self.DECREASE_FACTOR)
+        if int(new_limit) == self.limit:
+            return False
+        self._limit = new_limit
+        self.decreases += 1
+        self.history.append((time.time(), self.limit, reason))
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'max_limit': self.max_limit,
+            'min_limit': self.min_limit,
+            'inflight': self._inflight,
+            'waiting': len(self._waiters),
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'latency_ewma': round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            'history': [
+                {'time': round(t, 3), 'limit': limit, 'reason': reason}
+                for t, limit, reason in self.history
+            ],
+        }
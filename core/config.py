@@ -5,9 +5,10 @@
 """
 
 import os
+import re
 import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -21,8 +22,10 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 # 常量
-DOUBAO_TRANSLATION_URL = "https://ark.cn-beijing.volces.com/api/v3/responses"
-DOUBAO_CHAT_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+# 接口地址：ARK_BASE_URL 整体切换 (如本地 mock 服务器 tools/mock_ark_server.py)，也可分别覆盖
+ARK_BASE_URL = os.getenv("ARK_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3").rstrip("/")
+DOUBAO_TRANSLATION_URL = os.getenv("DOUBAO_TRANSLATION_URL", f"{ARK_BASE_URL}/responses")
+DOUBAO_CHAT_URL = os.getenv("DOUBAO_CHAT_URL", f"{ARK_BASE_URL}/chat/completions")
 DOUBAO_API_KEY_ENV = "ARK_API_KEY"
 
 # 并发控制参数（优化为快慢双车道策略）
@@ -33,8 +36,36 @@ DEFAULT_MAX_REQUESTS_PER_SECOND = 500.0  # 接近RPM=30000/60的理论上限
 DEFAULT_TIMEOUT = 60.0             
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_MAX_INPUT_TOKENS = 900    # 低于模型限制1k，留安全边距
+CHAT_MAX_INPUT_TOKENS = 28_000    # 通用 Chat 模型 (≥64k 上下文)，需为同等长度的译文留出空间
+
+# 服务商限流 (每个模型独立计算)
+# 慢车道 (seed-translation, kimi-k2): RPM=5000, TPM=500k
+# 快车道 (DeepSeek, Doubao Pro等): RPM=30000, TPM=5M
+SLOW_LANE_RPM = 5000
+SLOW_LANE_TPM = 500_000
+FAST_LANE_RPM = 30000
+FAST_LANE_TPM = 5_000_000
+RATE_LIMIT_HEADROOM = 0.95        # 稳态速率保持在上限的 95%，避免 429
+
+# 每个模型的自适应并发上限 (AIMD 控制器从该值起步，遇到 429/5xx 减半后再逐步恢复)
+SLOW_LANE_CONCURRENCY = 80        # RPM=5000/60≈83
+FAST_LANE_CONCURRENCY = 500       # RPM=30000/60=500
 DEFAULT_MODEL_LIST = ["doubao-seed-translation-250915"]
 
+# 模型熔断器：连续失败达到阈值后熔断，超时后放行一个探测请求 (探测失败则退避时间翻倍)
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RECOVERY_TIMEOUT = 30.0
+BREAKER_MAX_RECOVERY_TIMEOUT = 600.0
+QUOTA_PROBE_INTERVAL = 600.0      # 额度用尽后最长熔断时间 (到配额重置前也会定时探测一次)
+
+# 多段打包 (仅 Chat 模型)：每个打包请求的输入 Token 预算与最大段数
+DEFAULT_PACK_TOKEN_BUDGET = 1500
+DEFAULT_PACK_MAX_SEGMENTS = 40
+
+# 翻译记忆缓存
+DEFAULT_CACHE_PATH = ".translation_cache.db"
+DEFAULT_CACHE_MAX_ENTRIES = 200_000
+
 # 支持语言 (略，保持不变)
 SUPPORTED_LANGUAGES = {
     "zh": "中文（简体）",
@@ -52,10 +83,23 @@ class TranslatorConfig:
     max_concurrent: int = 500         # 快车道默认值 (内部会根据模型自动选择慢/快车道)
     max_requests_per_second: float = 500.0  # 接近快车道理论上限
     timeout: float = 60.0
-    max_retries: int = 3
+    max_retries: int = DEFAULT_MAX_RETRIES   # 429 重试预算 (超时/网络/5xx 最多 2 次)
     api_url: str = DOUBAO_TRANSLATION_URL
     source_language: str = ""
     target_language: str = "zh"
+    cache_enabled: bool = True
+    cache_path: str = DEFAULT_CACHE_PATH
+    cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES
+    # False 时只写缓存不读缓存 (补漏轮次用，避免命中上一轮的未翻译结果)
+    cache_read: bool = True
+    pack_enabled: bool = True
+    pack_token_budget: int = DEFAULT_PACK_TOKEN_BUDGET
+    pack_max_segments: int = DEFAULT_PACK_MAX_SEGMENTS
+    # 按模型覆盖 RPM/TPM，如 {"deepseek-v3-250324": 10000}
+    model_rpm_overrides: Dict[str, int] = field(default_factory=dict)
+    model_tpm_overrides: Dict[str, int] = field(default_factory=dict)
+    # 按模型覆盖最大输入 Token (长度预路由)
+    model_max_input_overrides: Dict[str, int] = field(default_factory=dict)
     
     @property
     def model(self) -> str:
@@ -108,6 +152,9 @@ class TranslatorConfig:
         else:
             max_rps = float(os.getenv('MAX_REQUESTS_PER_SECOND', "20.0"))
 
+        # 翻译记忆缓存：TRANSLATION_CACHE=0/false/off 可关闭
+        cache_enabled = _env_flag('TRANSLATION_CACHE', True)
+
         return cls(
             api_key=api_key if api_key else "",
             models=models,
@@ -115,6 +162,16 @@ class TranslatorConfig:
             max_requests_per_second=max_rps,
             source_language=os.getenv('SOURCE_LANGUAGE', ""),
             target_language=os.getenv('TARGET_LANGUAGE', "zh"),
+            cache_enabled=cache_enabled,
+            cache_path=os.getenv('TRANSLATION_CACHE_PATH', DEFAULT_CACHE_PATH),
+            cache_max_entries=int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES)),
+            model_rpm_overrides=_parse_model_overrides(os.getenv('MODEL_RPM_OVERRIDES', "")),
+            model_tpm_overrides=_parse_model_overrides(os.getenv('MODEL_TPM_OVERRIDES', "")),
+            pack_enabled=_env_flag('PACK_SEGMENTS', True),
+            pack_token_budget=int(os.getenv('PACK_TOKEN_BUDGET', DEFAULT_PACK_TOKEN_BUDGET)),
+            pack_max_segments=int(os.getenv('PACK_MAX_SEGMENTS', DEFAULT_PACK_MAX_SEGMENTS)),
+            max_retries=int(os.getenv('MAX_RETRIES', DEFAULT_MAX_RETRIES)),
+            model_max_input_overrides=_parse_model_overrides(os.getenv('MODEL_MAX_INPUT_TOKENS', "")),
         )
     
     @classmethod 
@@ -128,6 +185,64 @@ class TranslatorConfig:
             raise ValueError(f"未找到API密钥。请设置{DOUBAO_API_KEY_ENV}环境变量")
         return config
 
+def _env_flag(name: str, default: bool) -> bool:
+    """读取布尔型环境变量 (0/false/off/no 视为关闭)"""
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() not in ("0", "false", "off", "no")
+
+
+def _parse_model_overrides(raw: str) -> Dict[str, int]:
+    """解析 "model1=10000,model2=5000" 格式的按模型覆盖配置"""
+    overrides = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        model, _, value = item.partition("=")
+        try:
+            overrides[model.strip()] = int(float(value))
+        except ValueError:
+            logger.warning(f"忽略无效的限流覆盖配置: {item}")
+    return overrides
+
+
+def is_slow_lane_model(model: str) -> bool:
+    """慢车道模型: seed-translation (RPM=5000), kimi-k2 (RPM=5000)"""
+    model_lower = model.lower()
+    return "seed-translation" in model_lower or "kimi-k2" in model_lower
+
+
+def get_model_concurrency(model: str) -> int:
+    """返回模型所在车道的并发上限"""
+    return SLOW_LANE_CONCURRENCY if is_slow_lane_model(model) else FAST_LANE_CONCURRENCY
+
+
+def get_model_rate_limits(model: str, rpm_overrides: Optional[Dict[str, int]] = None,
+                          tpm_overrides: Optional[Dict[str, int]] = None) -> Tuple[int, int]:
+    """返回模型的 (RPM, TPM) 上限，覆盖配置优先"""
+    if is_slow_lane_model(model):
+        rpm, tpm = SLOW_LANE_RPM, SLOW_LANE_TPM
+    else:
+        rpm, tpm = FAST_LANE_RPM, FAST_LANE_TPM
+    rpm = (rpm_overrides or {}).get(model, rpm)
+    tpm = (tpm_overrides or {}).get(model, tpm)
+    return rpm, tpm
+
+
+def get_model_max_input_tokens(model: str, overrides: Optional[Dict[str, int]] = None) -> int:
+    """返回模型单次请求可接受的最大输入 Token (按估算值比较，已留安全边距)"""
+    if overrides and model in overrides:
+        return overrides[model]
+    if "seed-translation" in model.lower():
+        return DEFAULT_MAX_INPUT_TOKENS
+    # 名称中带上下文长度的模型，如 doubao-1-5-vision-pro-32k-250115: 一半留给输出，再留 10% 余量
+    match = re.search(r'-(\d+)k(?:-|$)', model.lower())
+    if match:
+        return int(int(match.group(1)) * 1000 / 2 * 0.9)
+    return CHAT_MAX_INPUT_TOKENS
+
+
 def validate_language_code(lang_code: str) -> bool:
     return lang_code in SUPPORTED_LANGUAGES
 
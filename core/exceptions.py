@@ -17,9 +17,28 @@ class APIError(TranslatorError):
         self.status_code = status_code
         self.response = response
 
+    @property
+    def retryable(self) -> bool:
+        """5xx 等服务端错误可重试，4xx 请求错误重试也不会成功"""
+        return self.status_code is None or self.status_code >= 500
+
+
+class InputTooLongError(APIError):
+    """输入超过模型上下文/长度限制 (换用下一个模型，不重试)"""
+    pass
+
 
 class RateLimitError(TranslatorError):
     """频率限制异常"""
+    def __init__(self, message: str, retry_after: float = None, status_code: int = 429, response: str = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+        self.response = response
+
+
+class QuotaExceededError(RateLimitError):
+    """额度用尽 (如 SetLimitExceeded)，重试无效，需等到配额重置"""
     pass
 
 
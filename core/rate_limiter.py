@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+令牌桶限流器
+按模型分别限制 RPM (每分钟请求数) 与 TPM (每分钟 Token 数)，把突发流量摊平到
+略低于服务商上限的稳定速率，而不是让信号量在第一秒内一次性放出全部请求。
+"""
+
+import asyncio
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """异步令牌桶
+
+    - rate: 每秒补充的令牌数
+    - capacity: 桶容量 (允许的最大突发量)
+
+    单次申请量超过容量时只需等到桶满即可放行，多出的部分记为欠账 (令牌数为负)，
+    由后续请求等待偿还，保证长期平均速率不超过 rate。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0:
+            raise ValueError("令牌桶速率必须大于 0")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # 锁保证等待者按 FIFO 顺序获取令牌
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """申请 amount 个令牌，返回实际等待的秒数"""
+        need = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            if self._tokens < need:
+                self.throttled += 1
+            while self._tokens < need:
+                delay = (need - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= amount
+        self.acquired += 1
+        self.wait_seconds += waited
+        return waited
+
+    def adjust(self, delta: float):
+        """事后修正消耗量：delta > 0 追加扣除，delta < 0 退还"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class ModelRateLimiter:
+    """单个模型的 RPM + TPM 双桶限流"""
+
+    # 突发容量 = 多少秒的配额。越小越平滑
+    BURST_SECONDS = 0.25
+
+    def __init__(self, rpm: float, tpm: float, headroom: float = 0.95):
+        self.rpm = rpm * headroom
+        self.tpm = tpm * headroom
+        self.request_bucket = TokenBucket(self.rpm / 60.0, self.rpm / 60.0 * self.BURST_SECONDS)
+        self.token_bucket = TokenBucket(self.tpm / 60.0, self.tpm / 60.0 * self.BURST_SECONDS)
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        waited = await self.request_bucket.acquire(1)
+        waited += await self.token_bucket.acquire(max(1, estimated_tokens))
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """用真实 Token 用量修正 TPM 桶 (仅在接口返回 usage 时有意义)"""
+        if actual_tokens > 0:
+            self.token_bucket.adjust(actual_tokens - max(1, estimated_tokens))
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'rpm_limit': round(self.rpm),
+            'tpm_limit': round(self.tpm),
+            'requests': self.request_bucket.acquired,
+            'throttled': self.request_bucket.throttled + self.token_bucket.throttled,
+            'wait_seconds': round(self.request_bucket.wait_seconds + self.token_bucket.wait_seconds, 3),
+        }
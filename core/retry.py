@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+重试策略：指数退避 + 抖动 + 按错误类型的重试预算
+- 429: 优先遵循服务端 Retry-After，否则指数退避；抖动避免大量协程同时重试
+- 超时 / 网络错误 / 5xx: 各自独立的少量重试预算
+- 额度用尽、输入过长、认证失败、其他 4xx: 不重试 (换下一个模型)
+"""
+
+import random
+from typing import Dict, Optional
+
+from core.exceptions import (
+    APIError, NetworkError, QuotaExceededError, RateLimitError,
+    TimeoutError as RequestTimeoutError,
+)
+
+
+class RetryPolicy:
+    """重试预算与退避时间计算"""
+
+    BASE_DELAY = 0.5
+    MAX_DELAY = 30.0
+
+    def __init__(self, max_retries: int = 3, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+                 budgets: Optional[Dict[str, int]] = None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # 每种错误类型在同一模型上的最多重试次数
+        self.budgets = budgets or {
+            'rate_limit': max_retries,
+            'timeout': min(2, max_retries),
+            'network': min(2, max_retries),
+            'server_error': min(2, max_retries),
+        }
+
+    @staticmethod
+    def classify(error: Exception) -> Optional[str]:
+        """返回错误类别；不可重试的错误返回 None"""
+        if isinstance(error, QuotaExceededError):
+            return None
+        if isinstance(error, RateLimitError):
+            return 'rate_limit'
+        if isinstance(error, RequestTimeoutError):
+            return 'timeout'
+        if isinstance(error, NetworkError):
+            return 'network'
+        if isinstance(error, APIError) and error.retryable:
+            return 'server_error'
+        return None
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试 (从 0 开始) 的退避时间：full jitter"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def new_state(self, max_total: Optional[int] = None) -> 'RetryState':
+        return RetryState(self, max_total)
+
+
+class RetryState:
+    """单个请求在单个模型上的重试计数"""
+
+    def __init__(self, policy: RetryPolicy, max_total: Optional[int] = None):
+        self.policy = policy
+        self.max_total = max_total
+        self.used: Dict[str, int] = {}
+        self.total = 0
+
+    def next_delay(self, error: Exception) -> Optional[float]:
+        """返回下次重试前的等待秒数；预算用完或不可重试时返回 None"""
+        category = self.policy.classify(error)
+        if category is None:
+            return None
+        if self.max_total is not None and self.total >= self.max_total:
+            return None
+        attempt = self.used.get(category, 0)
+        if attempt >= self.policy.budgets.get(category, 0):
+            return None
+        self.used[category] = attempt + 1
+        self.total += 1
+
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            # Retry-After 是服务端给出的下限，再加少量抖动错开重试时刻
+            return retry_after + random.uniform(0, self.policy.base_delay)
+        return self.policy.backoff(attempt)
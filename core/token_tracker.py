@@ -44,7 +44,15 @@ class DailyQuota:
         """获取今日开始时间（北京时间）"""
         now = datetime.utcnow() + timedelta(hours=self.RESET_TIMEZONE_OFFSET)
         return now.replace(hour=self.RESET_HOUR, minute=0, second=0, microsecond=0)
-        
+
+    def seconds_until_reset(self) -> float:
+        """距离下一次配额重置的秒数（北京时间 RESET_HOUR 点）"""
+        now = datetime.utcnow() + timedelta(hours=self.RESET_TIMEZONE_OFFSET)
+        next_reset = self._get_today_start()
+        if next_reset <= now:
+            next_reset += timedelta(days=1)
+        return (next_reset - now).total_seconds()
+
     def reset_if_needed(self):
         """检查是否需要重置配额"""
         now = datetime.utcnow() + timedelta(hours=self.RESET_TIMEZONE_OFFSET)
@@ -9,9 +9,6 @@ import asyncio
 import logging
 import sys
 import os
-import tempfile
-import zipfile
-import shutil
 from pathlib import Path
 from typing import Optional, Dict, List
 
@@ -21,8 +18,14 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from core.config import TranslatorConfig
 from core.client import AsyncTranslator
 from processors.json_worker import JSONProcessor
-from processors.html_worker import HTMLProcessor
-from processors.epub_worker import EpubProcessor
+from processors.html_worker import HTMLProcessor, worker_peak_rss_mb
+from processors.epub_worker import EpubProcessor, patch_untranslated
+from processors.block_ledger import BlockLedger
+from processors.epub_container import EpubContainer
+from processors.epub_workspace import WORKSPACE_SUFFIX, EpubWorkspace, book_exists, open_epub, workspace_enabled
+from processors.epub_checkpoint import EpubCheckpoint
+from processors.epub_library import BookJob, EpubLibrary
+from processors.memory_budget import peak_rss_mb
 from processors.md_worker import MarkdownProcessor
 from server.api import run_server
 
@@ -87,6 +90,7 @@ class MainCLI:
         parser.add_argument("--verbose", "-v", action="store_true", help="启用详细日志")
         parser.add_argument("--max-concurrent", type=int, help="最大并发请求数 (建议: 30-100)")
         parser.add_argument("--max-rps", type=float, help="每秒最大请求数 (建议: 20.0)")
+        parser.add_argument("--no-cache", action="store_true", help="禁用翻译记忆缓存 (强制重新请求API)")
         
         # 子命令
         subparsers = parser.add_subparsers(dest="command", help="可用命令")
@@ -121,6 +125,10 @@ class MainCLI:
         epub_parser.add_argument("--target-lang", "-t", default="zh", help="目标语言")
         # [修改] 将 auto-approve 移到这里，作为 epub 子命令的参数
         epub_parser.add_argument("--auto-approve", action="store_true", help="自动同意质检修复，无需人工确认")
+        epub_parser.add_argument("--no-resume", action="store_true", help="忽略断点日志，从头翻译")
+        epub_parser.add_argument("--concurrent-books", type=int, help="目录模式下同时翻译 / 质检修复的书数 (默认: 4)")
+        epub_parser.add_argument("--workspace", action="store_true",
+                                 help="结果保存在 <输出>.workspace/ 工作区，修补与回填不再重新打包，用 export 生成 ePub (也可设 EPUB_WORKSPACE=1)")
         
         # Server命令
         server_parser = subparsers.add_parser("server", help="启动HTTP API服务器")
@@ -136,6 +144,12 @@ class MainCLI:
         genjson_parser = subparsers.add_parser("generate-json", help="扫描已翻译EPUB并生成人工翻译JSON")
         genjson_parser.add_argument("--dir", "-d", required=True, help="已翻译EPUB所在目录")
         
+        # 从工作区导出最终的 ePub
+        export_parser = subparsers.add_parser("export", help="将工作区打包为最终的ePub")
+        export_parser.add_argument("--file", "-f", required=True, help="已翻译EPUB路径 (工作区为 <路径>.workspace) 或其所在目录")
+        export_parser.add_argument("--output", "-o", help="输出文件 (仅单本；默认覆盖原路径)")
+        export_parser.add_argument("--clean", action="store_true", help="导出后删除工作区")
+        
         return parser
     
     def _get_config(self, args) -> TranslatorConfig:
@@ -145,6 +159,8 @@ class MainCLI:
             config_kwargs['max_concurrent'] = args.max_concurrent
         if hasattr(args, 'max_rps') and args.max_rps:
             config_kwargs['max_requests_per_second'] = args.max_rps
+        if getattr(args, 'no_cache', False):
+            config_kwargs['cache_enabled'] = False
             
         try:
             return TranslatorConfig.from_args(
@@ -164,7 +180,10 @@ class MainCLI:
         if not hasattr(translator, 'get_stats'):
             return
 
-        stats = translator.get_stats()
+        all_stats = translator.get_stats()
+        # 下划线开头的键是运行时指标 (缓存等)，不属于模型统计
+        stats = {k: v for k, v in all_stats.items() if not k.startswith('_')}
+        self._print_runtime_stats(all_stats)
         total_requests = 0
         total_in = 0
         total_out = 0
@@ -197,18 +216,39 @@ class MainCLI:
         print(f"{'总计':<35} | {total_requests:<6} | 100%   | {total_in:<12,} | {total_out:<12,}")
         print("="*85 + "\n")
 
-    def _repack_epub(self, source_dir: str, output_path: str):
-        """重新打包 ePub 工具函数"""
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            mimetype_path = os.path.join(source_dir, 'mimetype')
-            if os.path.exists(mimetype_path):
-                zf.write(mimetype_path, 'mimetype', compress_type=zipfile.ZIP_STORED)
-            for root, _, files in os.walk(source_dir):
-                for f in files:
-                    if f == 'mimetype': continue
-                    full_path = os.path.join(root, f)
-                    arc_name = os.path.relpath(full_path, source_dir)
-                    zf.write(full_path, arc_name)
+    def _print_runtime_stats(self, all_stats: Dict):
+        """打印缓存等运行时指标"""
+        flight = all_stats.get('_singleflight')
+        if flight and flight['deduplicated']:
+            print(f"🔗 请求去重: {flight['deduplicated']}/{flight['requests']} 个请求复用了进行中的调用 "
+                  f"(去重率 {flight['dedup_ratio'] * 100:.1f}%)")
+        for model, limit in (all_stats.get('_rate_limit') or {}).items():
+            if limit['throttled']:
+                print(f"⏳ 限流 [{model}]: {limit['throttled']} 次排队，累计等待 {limit['wait_seconds']:.1f}s "
+                      f"(RPM≤{limit['rpm_limit']}, TPM≤{limit['tpm_limit']})")
+        for model, conc in (all_stats.get('_concurrency') or {}).items():
+            if conc['decreases']:
+                print(f"📉 自适应并发 [{model}]: 当前上限 {conc['limit']}/{conc['max_limit']}，"
+                      f"降档 {conc['decreases']} 次 / 升档 {conc['increases']} 次")
+        retry = all_stats.get('_retry')
+        if retry and (retry['retries'] or retry['gave_up']):
+            print(f"🔁 重试: {retry['retries']} 次 (累计退避 {retry['backoff_seconds']:.1f}s)，放弃 {retry['gave_up']} 次")
+        routing = all_stats.get('_routing')
+        if routing and routing['skipped_calls']:
+            print(f"📏 长度预路由: {routing['routed']} 段超长文本直接发往可容纳的模型，"
+                  f"避免 {routing['skipped_calls']} 次必然失败的调用 {routing['skipped_by_model']}")
+        for model, breaker in (all_stats.get('_breakers') or {}).items():
+            if breaker['open_count']:
+                retry = f"，{breaker['retry_in_seconds']:.0f}s 后探测" if breaker['retry_in_seconds'] is not None else ""
+                print(f"🔌 熔断 [{model}]: 当前 {breaker['state']}，熔断 {breaker['open_count']} 次{retry}")
+        packing = all_stats.get('_packing')
+        if packing and packing['packs']:
+            print(f"📦 多段打包: {packing['packed_segments']} 段合并为 {packing['packs']} 个请求 "
+                  f"(平均 {packing['avg_segments_per_pack']} 段/请求, 降级 {packing['fallbacks']} 次, 失败 {packing['failed']} 个)")
+        cache = all_stats.get('_cache')
+        if cache and (cache['hits'] or cache['misses']):
+            print(f"💾 翻译记忆: 命中 {cache['hits']} / 未命中 {cache['misses']} "
+                  f"(命中率 {cache['hit_rate'] * 100:.1f}%, 写入 {cache['writes']}, 淘汰 {cache['evictions']})")
 
     async def _run_interactive_patch_loop(self, epub_path: str, config: TranslatorConfig, target_lang: str, auto_approve: bool = False):
         """交互式质检与修复闭环"""
@@ -229,9 +269,11 @@ class MainCLI:
             
             print(f"\n🔍 [第 {round_count} 轮质检] 正在扫描漏译段落...")
             try:
-                # 捕获检查过程中的 print，只显示结果
-                report = checker.check_epub(epub_path)
+                # 有翻译台账时，内容未变的章节直接读台账，不再解析
+                ledger = BlockLedger.load(epub_path)
+                report = checker.check_epub(epub_path, ledger=ledger)
                 untranslated_count = report['untranslated_count']
+                print(self._qa_summary([report]))
                 
                 if untranslated_count == 0:
                     print("\n🎉 完美！检测结果显示没有漏译。")
@@ -256,53 +298,22 @@ class MainCLI:
                 
                 # 开始修复
                 print(f"\n💉 [修复模式] 正在启动...")
-                files_to_fix = set(item['file'] for item in report['details'])
                 
                 # [修复] 使用 dataclasses.replace 创建副本，避免污染原始 config
                 from dataclasses import replace
-                patch_config = replace(config, max_concurrent=50)
+                patch_config = replace(config, max_concurrent=50, cache_read=False)
                 
                 async with self._create_translator(patch_config) as patch_translator:
-                    patch_processor = HTMLProcessor(patch_translator)
-                    
-                    # [修复] 临时禁用过滤器 (Monkey Patch) - 包括 URL 过滤和中文检测
-                    original_url_filter = patch_processor._is_url_or_code
-                    original_chinese_filter = patch_processor._is_chinese_text
-                    patch_processor._is_url_or_code = lambda text: False 
-                    patch_processor._is_chinese_text = lambda text: False  # [新增] 强制翻译所有内容
-                    
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        # 1. 解压
-                        with zipfile.ZipFile(epub_path, 'r') as zf:
-                            zf.extractall(temp_dir)
-                        
-                        # 2. 修复 (带进度条)
-                        total_files = len(files_to_fix)
-                        completed = [0]  # 使用列表以便在闭包中修改
-                        
-                        async def process_with_progress(rel_path: str):
-                            full_path = os.path.join(temp_dir, rel_path)
-                            if os.path.exists(full_path):
-                                logger.info(f"   正在修补: {rel_path}")
-                                await patch_processor.process_file(full_path, full_path, target_lang=target_lang)
-                            completed[0] += 1
-                            # 实时进度条
-                            progress = completed[0] / total_files
-                            bar_length = 30
-                            block = int(round(bar_length * progress))
-                            sys.stdout.write(f"\r修复进度: [{'#' * block}{'-' * (bar_length - block)}] {progress * 100:.1f}% ({completed[0]}/{total_files})")
-                            sys.stdout.flush()
-                        
-                        tasks = [process_with_progress(rel_path) for rel_path in files_to_fix]
-                        await asyncio.gather(*tasks)
-                        print()  # 进度条结束后换行
-                        
-                        # 3. 打包
-                        self._repack_epub(temp_dir, epub_path)
+                    def show_progress(done: int, total: int):
+                        # 实时进度条
+                        progress = done / total
+                        bar_length = 30
+                        block = int(round(bar_length * progress))
+                        sys.stdout.write(f"\r修复进度: [{'#' * block}{'-' * (bar_length - block)}] {progress * 100:.1f}% ({done}/{total})")
+                        sys.stdout.flush()
                     
-                    # 恢复过滤器
-                    patch_processor._is_url_or_code = original_url_filter
-                    patch_processor._is_chinese_text = original_chinese_filter
+                    await self._patch_epub(epub_path, report, patch_translator, target_lang, ledger, show_progress)
+                    print()  # 进度条结束后换行
                     
                     print(f"✅ 修复完成，已更新文件: {epub_path}")
                     self._print_stats(patch_translator)
@@ -320,9 +331,11 @@ class MainCLI:
         print(f"\n📘 正在处理: {os.path.basename(input_path)}")
         print(f"   输出至: {output_path}")
         
-        # 1. 检查是否存在，决定是否跳过第一阶段
+        # 1. 检查是否存在，决定是否跳过第一阶段 (有断点日志说明上次未完成，直接续译)
         skip_main = False
-        if os.path.exists(output_path):
+        if EpubCheckpoint.exists_for(output_path) and not args.no_resume:
+            print(f"⏯️  发现未完成的翻译进度，只翻译剩余章节...")
+        elif book_exists(output_path):
             if args.auto_approve:
                 print(f"⏩ 输出文件已存在，自动跳过全量翻译，进入质检...")
                 skip_main = True
@@ -342,28 +355,43 @@ class MainCLI:
             async with self._create_translator(config) as translator:
                 processor = EpubProcessor(translator)
                 try:
-                    await processor.translate_epub(
+                    result = await processor.translate_epub(
                         input_path=input_path,
                         output_path=output_path,
                         source_lang=args.source_lang,
                         target_lang=args.target_lang,
-                        progress_callback=progress_callback
+                        progress_callback=progress_callback,
+                        resume=not args.no_resume,
+                        workspace=args.workspace
                     )
                     print("\n")
+                    if result.get('resumed_count'):
+                        print(f"⏯️  断点续译: {result['resumed_count']} 个条目直接取用上次完成的译文")
+                    if result.get('peak_rss_mb'):
+                        workers_rss = result.get('peak_worker_rss_mb')
+                        print(f"🧠 内存: 进程峰值 RSS {result['peak_rss_mb']:.0f} MB"
+                              + (f" (HTML 工作进程合计 {workers_rss:.0f} MB)" if workers_rss else "")
+                              + f"，在途数据估算峰值 {result['peak_payload_mb']:.0f} MB ({result['admission_waves']} 批准入)")
                     self._print_stats(translator)
                 except Exception as e:
                     print("\n")
                     logger.error(f"ePub翻译中断: {e}")
                     self._print_stats(translator)
-                    if not os.path.exists(output_path):
+                    if not book_exists(output_path):
                         return
+        elif args.workspace:
+            # 已有的 ePub 以自身为底本建立工作区，之后的修补轮次不再重新打包
+            open_epub(output_path, create=True).close()
 
         # 3. 质检与修复阶段
-        if os.path.exists(output_path):
+        if book_exists(output_path):
             await self._run_interactive_patch_loop(output_path, config, args.target_lang, auto_approve=args.auto_approve)
+            if EpubWorkspace.exists_for(output_path):
+                self._print_export_hint(output_path)
 
     async def _handle_epub_command(self, args):
         config = self._get_config(args)
+        args.workspace = args.workspace or workspace_enabled()
         
         if config.models:
             print(f"🚀 模型池已加载: {len(config.models)} 个模型")
@@ -414,21 +442,8 @@ class MainCLI:
             print("📖 [阶段1] 全量翻译")
             print(f"{'='*60}")
             
-            translated_files = []  # 收集已翻译的文件
-            
-            for idx, file in enumerate(epub_files, 1):
-                print(f"\n📦 [{idx}/{len(epub_files)}] {file.name}")
-                
-                output_filename = f"{file.stem}_translated{file.suffix}"
-                output_path = output_dir / output_filename
-                
-                try:
-                    await self._translate_epub_only(str(file), str(output_path), config, args)
-                    if output_path.exists():
-                        translated_files.append(output_path)
-                except Exception as e:
-                    logger.error(f"翻译 {file.name} 失败: {e}")
-                    continue
+            # 所有书共用一个翻译客户端并发翻译 (已完成的书直接跳过)
+            translated_files = await self._translate_library(epub_files, output_dir, config, args)
             
             print(f"\n✅ 阶段1完成: {len(translated_files)}/{len(epub_files)} 本书已翻译")
             
@@ -438,11 +453,14 @@ class MainCLI:
                 print("🔍 [阶段2] 统一质检与修复")
                 print(f"{'='*60}")
                 
-                final_report = await self._batch_patch_all(translated_files, config, args.target_lang)
+                final_report = await self._batch_patch_all(translated_files, config, args.target_lang,
+                                                           max_books=args.concurrent_books)
                 
                 # ========== 阶段3: 生成报告 ==========
                 if final_report:
                     self._generate_final_report(final_report, output_dir)
+                if args.workspace:
+                    self._print_export_hint(output_dir)
             else:
                 print("\n⏭️  跳过质检阶段 (无已翻译文件或缺少质检工具)")
                 
@@ -450,121 +468,192 @@ class MainCLI:
             logger.error(f"输入路径不存在: {args.file}")
             sys.exit(1)
     
-    async def _translate_epub_only(self, input_path: str, output_path: str, config: TranslatorConfig, args):
-        """仅执行翻译，不进行质检（用于批量处理阶段1）"""
-        print(f"   输出至: {output_path}")
-        
-        # 检查是否已存在
-        if os.path.exists(output_path):
-            print(f"   ⏩ 输出文件已存在，跳过翻译")
-            return
-        
-        def progress_callback(progress: float, message: str):
-            bar_length = 30
-            block = int(round(bar_length * progress))
-            sys.stdout.write(f"\r   进度: [{'#' * block}{'-' * (bar_length - block)}] {progress * 100:.1f}% - {message}")
-            sys.stdout.flush()
+    async def _translate_library(self, epub_files: List[Path], output_dir: Path,
+                                 config: TranslatorConfig, args) -> List[Path]:
+        """仅执行翻译，不进行质检（用于批量处理阶段1）：多本书共用一个翻译客户端并发翻译"""
+        jobs = []
+        translated_files = []  # 收集已翻译的文件
+        for file in epub_files:
+            output_path = output_dir / f"{file.stem}_translated{file.suffix}"
+            # 有断点日志说明上次未完成，继续翻译剩余章节
+            if EpubCheckpoint.exists_for(str(output_path)) and not args.no_resume:
+                print(f"   ⏯️  {file.name}: 发现未完成的翻译进度，续译剩余章节")
+            elif book_exists(output_path):
+                print(f"   ⏩ {file.name}: 输出文件已存在，跳过翻译")
+                if args.workspace:
+                    open_epub(output_path, create=True).close()
+                translated_files.append(output_path)
+                continue
+            jobs.append(BookJob(str(file), str(output_path), resume=not args.no_resume, workspace=args.workspace))
+
+        if not jobs:
+            return translated_files
 
         async with self._create_translator(config) as translator:
-            processor = EpubProcessor(translator)
+            library = EpubLibrary(translator, max_books=args.concurrent_books)
+            print(f"\n🚚 并发翻译 {len(jobs)} 本书 (同时在途 ≤{library.max_books} 本，共用一个翻译客户端)")
+
+            progress = {job.output_path: 0.0 for job in jobs}
+            finished = [0]
+
+            def draw():
+                overall = sum(progress.values()) / len(progress)
+                bar_length = 30
+                block = int(round(bar_length * overall))
+                active = sum(1 for p in progress.values() if 0 < p < 1)
+                sys.stdout.write(f"\r   进度: [{'#' * block}{'-' * (bar_length - block)}] {overall * 100:.1f}% "
+                                 f"- 完成 {finished[0]}/{len(jobs)} 本, 进行中 {active} 本")
+                sys.stdout.flush()
+
+            def progress_callback(output_path: str, value: float, message: str):
+                progress[output_path] = value
+                draw()
+
+            def on_book_done(job: BookJob, result: Dict):
+                finished[0] += 1
+                progress[job.output_path] = 1.0
+                name = Path(job.input_path).name
+                sys.stdout.write("\r" + " " * 100 + "\r")
+                if result.get('success'):
+                    resumed = f", 续译 {result['resumed_count']}" if result.get('resumed_count') else ""
+                    print(f"   ✅ {name}: {result['success_count']}/{result['total_files']} 个章节 "
+                          f"({result['segment_count']} 段), 失败 {result['failed_count']}{resumed}, "
+                          f"用时 {result['elapsed']:.1f}s")
+                else:
+                    print(f"   ❌ {name}: {result.get('error')}")
+                draw()
+
             try:
-                await processor.translate_epub(
-                    input_path=input_path,
-                    output_path=output_path,
-                    source_lang=args.source_lang,
-                    target_lang=args.target_lang,
-                    progress_callback=progress_callback
-                )
-                print("\n")
-                self._print_stats(translator)
-            except Exception as e:
+                await library.translate_all(jobs, args.source_lang, args.target_lang,
+                                            progress_callback=progress_callback, on_book_done=on_book_done)
+            finally:
                 print("\n")
-                logger.error(f"ePub翻译中断: {e}")
+                budget = library.budget.get_stats()
+                rss, workers_rss = peak_rss_mb(), worker_peak_rss_mb()
+                print(f"🧠 内存: 在途数据估算峰值 {budget['peak_mb']:.0f}/{budget['limit_mb']:.0f} MB"
+                      + (f"，进程峰值 RSS {rss:.0f} MB" if rss else "")
+                      + (f" (HTML 工作进程合计 {workers_rss:.0f} MB)" if workers_rss else "")
+                      + (f"，{budget['waits']} 次等待预算" if budget['waits'] else ""))
                 self._print_stats(translator)
+
+        translated_files.extend(Path(job.output_path) for job in jobs if book_exists(job.output_path))
+        return translated_files
     
-    async def _batch_patch_all(self, epub_files: List[Path], config: TranslatorConfig, target_lang: str) -> Dict:
-        """统一对所有已翻译文件进行质检和修复"""
+    async def _batch_patch_all(self, epub_files: List[Path], config: TranslatorConfig, target_lang: str,
+                               max_books: Optional[int] = None) -> Dict:
+        """
+        统一对所有已翻译文件进行质检和修复
+        第一轮质检用 check_epubs 一次检查所有书：各书的章节连续送入同一个质检进程池，书与书之间不等待，
+        每本书的报告一出来就开始修复 (A 在修复时 B 还在检查)；
+        之后每本书各自走 修复 -> 复检 的轮次，多本书并发 (A 在修复时 B 在复检)，共用一个翻译客户端；
+        同时处理的书数与阶段1相同 (--concurrent-books / EPUB_MAX_CONCURRENT_BOOKS)
+        """
         MAX_PATCH_ROUNDS = 3  # 批量模式下减少修复轮次
         checker = EPUBTranslationChecker()
+        max_books = max_books or int(os.getenv('EPUB_MAX_CONCURRENT_BOOKS', EpubLibrary.DEFAULT_MAX_BOOKS))
+        book_slots = asyncio.Semaphore(max(1, max_books))
         
         # 收集所有漏译报告
         all_reports = {}  # {文件路径: 最终漏译详情}
+        checks = []  # 所有质检报告 (统计章节来源)
         
-        for round_count in range(1, MAX_PATCH_ROUNDS + 1):
-            print(f"\n🔄 [修复轮次 {round_count}/{MAX_PATCH_ROUNDS}]")
-            
-            files_need_fix = []  # 本轮需要修复的文件
+        async def check(epub_path: Path):
+            ledger = BlockLedger.load(str(epub_path))
+            # 质检是同步的 CPU 任务，放到线程中执行，不阻塞其他书的修复请求
+            report = await asyncio.to_thread(checker.check_epub, str(epub_path), ledger)
+            checks.append(report)
+            return report, ledger
+        
+        async def qa_book(epub_path: Path, report: Dict, ledger: Optional[BlockLedger], translator):
+            for round_count in range(1, MAX_PATCH_ROUNDS + 1):
+                if round_count > 1:
+                    report, ledger = await check(epub_path)
+                if report['untranslated_count'] == 0:
+                    print(f"   ✅ {epub_path.name}: 无漏译")
+                    return
+                print(f"   ⚠️  {epub_path.name}: {report['untranslated_count']} 处漏译 "
+                      f"[修复轮次 {round_count}/{MAX_PATCH_ROUNDS}]")
+                try:
+                    await self._patch_single_epub(epub_path, report, translator, target_lang, ledger)
+                except Exception as e:
+                    logger.error(f"修复 {epub_path.name} 失败: {e}")
             
-            # 扫描所有文件
-            for epub_path in epub_files:
+            # 最终检查，收集剩余漏译
+            report, _ = await check(epub_path)
+            if report['untranslated_count'] > 0:
+                all_reports[str(epub_path)] = report['details']
+                print(f"   ⚠️  {epub_path.name}: 仍有 {report['untranslated_count']} 处漏译")
+            else:
+                print(f"   ✅ {epub_path.name}: 完美")
+        
+        async def run(epub_path: Path, report: Dict, ledger: Optional[BlockLedger], translator):
+            async with book_slots:
                 try:
-                    report = checker.check_epub(str(epub_path))
-                    if report['untranslated_count'] > 0:
-                        files_need_fix.append((epub_path, report))
-                        print(f"   ⚠️  {epub_path.name}: {report['untranslated_count']} 处漏译")
-                    else:
-                        print(f"   ✅ {epub_path.name}: 无漏译")
+                    await qa_book(epub_path, report, ledger, translator)
                 except Exception as e:
                     logger.warning(f"检查 {epub_path.name} 失败: {e}")
+        
+        print(f"\n🔄 并发质检与修复 {len(epub_files)} 本书 (同时 ≤{max_books} 本，每本最多 {MAX_PATCH_ROUNDS} 轮)")
+        from dataclasses import replace
+        patch_config = replace(config, max_concurrent=50, cache_read=False)
+        
+        async with self._create_translator(patch_config) as patch_translator:
+            # 第一轮：所有书的章节一起流式送检 (此时还没有上一轮结果可以复用，是最重的一次检查)；
+            # 哪本书先检查完就先开始修复，不等其他书
+            ledgers = {str(epub_path): BlockLedger.load(str(epub_path)) for epub_path in epub_files}
+            loop = asyncio.get_running_loop()
+            tasks = []
             
-            if not files_need_fix:
-                print("\n🎉 所有文件均无漏译!")
-                break
-            
-            print(f"\n   📝 本轮需修复: {len(files_need_fix)} 个文件")
-            
-            # 批量修复
-            from dataclasses import replace
-            patch_config = replace(config, max_concurrent=50)
+            def start(path: str, report: Dict):
+                checks.append(report)
+                if 'error' in report:
+                    logger.warning(f"检查 {Path(path).name} 失败: {report['error']}")
+                else:
+                    tasks.append(asyncio.create_task(run(Path(path), report, ledgers[path], patch_translator)))
             
-            async with self._create_translator(patch_config) as patch_translator:
-                for epub_path, report in files_need_fix:
-                    try:
-                        await self._patch_single_epub(epub_path, report, patch_translator, target_lang)
-                    except Exception as e:
-                        logger.error(f"修复 {epub_path.name} 失败: {e}")
-                
-                self._print_stats(patch_translator)
-        
-        # 最终扫描，收集剩余漏译
-        print(f"\n📋 最终检查...")
-        for epub_path in epub_files:
             try:
-                report = checker.check_epub(str(epub_path))
-                if report['untranslated_count'] > 0:
-                    all_reports[str(epub_path)] = report['details']
-                    print(f"   ⚠️  {epub_path.name}: 仍有 {report['untranslated_count']} 处漏译")
-                else:
-                    print(f"   ✅ {epub_path.name}: 完美")
-            except Exception as e:
-                logger.warning(f"最终检查 {epub_path.name} 失败: {e}")
+                # 回调与线程结束的通知按顺序送回事件循环：返回时所有书都已开始
+                await asyncio.to_thread(checker.check_epubs, list(ledgers), ledgers,
+                                        on_report=lambda path, report: loop.call_soon_threadsafe(start, path, report))
+            finally:
+                await asyncio.gather(*tasks)
+            print(self._qa_summary(checks))
+            self._print_stats(patch_translator)
         
+        if not all_reports:
+            print("\n🎉 所有文件均无漏译!")
         return all_reports
     
-    async def _patch_single_epub(self, epub_path: Path, report: Dict, translator, target_lang: str):
+    @staticmethod
+    def _qa_summary(reports) -> str:
+        """质检的章节来源：重新扫描 / 台账 / 复用上一轮结果"""
+        reports = list(reports)
+        ledger = sum(r['ledger_files'] for r in reports)
+        cached = sum(r['cached_files'] for r in reports)
+        scanned = sum(r['total_files'] for r in reports) - ledger - cached
+        return f"   🔎 扫描 {scanned} 个章节 (台账 {ledger} 个，复用上轮结果 {cached} 个)"
+    
+    async def _patch_single_epub(self, epub_path: Path, report: Dict, translator, target_lang: str,
+                                 ledger: Optional[BlockLedger] = None):
         """修复单个 epub 文件的漏译"""
-        files_to_fix = set(item['file'] for item in report['details'])
-        
-        patch_processor = HTMLProcessor(translator)
-        # 禁用过滤器
-        patch_processor._is_url_or_code = lambda text: False
-        patch_processor._is_chinese_text = lambda text: False
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with zipfile.ZipFile(str(epub_path), 'r') as zf:
-                zf.extractall(temp_dir)
-            
-            tasks = []
-            for rel_path in files_to_fix:
-                full_path = os.path.join(temp_dir, rel_path)
-                if os.path.exists(full_path):
-                    tasks.append(patch_processor.process_file(full_path, full_path, target_lang=target_lang))
-            
-            await asyncio.gather(*tasks)
-            self._repack_epub(temp_dir, str(epub_path))
-        
+        await self._patch_epub(str(epub_path), report, translator, target_lang, ledger)
         print(f"   ✅ 已修复: {epub_path.name}")
     
+    async def _patch_epub(self, epub_path: str, report: Dict, translator, target_lang: str,
+                          ledger: Optional[BlockLedger] = None, progress_callback=None):
+        """
+        按质检报告修补并原地写回：有台账的章节只重译漏译块，其余章节强制整章重译。
+        未改动的条目原样复制，台账随 ePub 一起更新；有工作区时只把改动的章节写入工作区，不重新打包。
+        """
+        with open_epub(epub_path) as container:
+            stats = await patch_untranslated(container, report['details'], translator, target_lang,
+                                             ledger=ledger, progress_callback=progress_callback)
+            # 写回在线程中执行，其他书的修复请求继续发送
+            await asyncio.to_thread(container.save)
+        if ledger is not None:
+            ledger.save()
+        logger.info(f"修补 {os.path.basename(epub_path)}: 块级 {stats['blocks']} 处，整章 {stats['files']} 个")
+    
     def _generate_final_report(self, reports: Dict, output_dir: Path):
         """生成最终漏译报告 (含人工翻译用的 JSON)"""
         import json
@@ -639,6 +728,10 @@ class MainCLI:
                     "original": item.get('full_text', item['text']),  # 完整原文
                     "translation": ""  # <-- 用户在这里填写译文
                 }
+                if item.get('block_id') is not None:
+                    # 来自翻译台账：apply-fix 按块 ID 直接定位 (原文哈希一致时)
+                    segment["block_id"] = item['block_id']
+                    segment["block_hash"] = item['block_hash']
                 book_entry["segments"].append(segment)
             
             json_data["books"].append(book_entry)
@@ -784,10 +877,9 @@ class MainCLI:
     def _handle_server_command(self, args):
         run_server(host=args.host, port=args.port, api_key=args.api_key, debug=args.debug)
 
-    def _handle_applyfix_command(self, args):
-        """读取人工翻译 JSON 并回填到 ePub"""
+    async def _handle_applyfix_command(self, args):
+        """读取人工翻译 JSON 并回填到 ePub (多本书并发，每个章节只解析、写回一次，每本书只重新打包一次)"""
         import json
-        from bs4 import BeautifulSoup
         
         json_path = Path(args.json)
         if not json_path.exists():
@@ -804,14 +896,32 @@ class MainCLI:
             print("⚠️  JSON 中没有需要处理的内容")
             return
         
-        total_applied = 0
-        total_skipped = 0
+        processor = HTMLProcessor(translator=None)
+        book_slots = asyncio.Semaphore(max(1, int(os.getenv('EPUB_MAX_CONCURRENT_BOOKS', EpubLibrary.DEFAULT_MAX_BOOKS))))
+        totals = {'applied': 0, 'skipped': 0}
+        
+        async def apply_file(container: EpubContainer, html_file: str, segs: List[Dict]):
+            if not container.exists(html_file):
+                logger.warning(f"   文件不存在: {html_file}")
+                totals['skipped'] += len(segs)
+                return
+            # 一次解析建立索引，定位本章节所有条目后写回一次
+            output, applied = await processor.apply_fixes_content(container.read_text(html_file), segs)
+            for seg, ok in zip(segs, applied):
+                if ok:
+                    totals['applied'] += 1
+                    logger.info(f"   ✅ 已替换: {seg['original'][:30]}... → {seg['translation'][:30]}...")
+                else:
+                    totals['skipped'] += 1
+                    logger.warning(f"   ⚠️  未找到匹配: {seg['original'][:50]}...")
+            if any(applied):
+                container.write(html_file, output)
         
-        for book in books:
+        async def apply_book(book: Dict):
             epub_path = Path(book['epub_file'])
-            if not epub_path.exists():
+            if not book_exists(epub_path):
                 logger.warning(f"⚠️  跳过 (文件不存在): {epub_path}")
-                continue
+                return
             
             segments = book.get('segments', [])
             # 过滤出有译文的条目
@@ -819,69 +929,29 @@ class MainCLI:
             
             if not segments_with_trans:
                 print(f"⏭️  {book['epub_name']}: 无需回填 (没有填写译文)")
-                continue
-            
-            print(f"\n📘 处理: {book['epub_name']} ({len(segments_with_trans)} 处译文)")
+                return
             
             # 按 html_file 分组
-            by_file = {}
+            by_file: Dict[str, List[Dict]] = {}
             for seg in segments_with_trans:
-                html_file = seg['html_file']
-                if html_file not in by_file:
-                    by_file[html_file] = []
-                by_file[html_file].append(seg)
+                by_file.setdefault(seg['html_file'], []).append(seg)
             
-            # 解压 -> 修改 -> 打包
-            with tempfile.TemporaryDirectory() as temp_dir:
-                with zipfile.ZipFile(epub_path, 'r') as zf:
-                    zf.extractall(temp_dir)
-                
-                for html_file, segs in by_file.items():
-                    full_path = os.path.join(temp_dir, html_file)
-                    if not os.path.exists(full_path):
-                        logger.warning(f"   文件不存在: {html_file}")
-                        continue
-                    
-                    # 读取并解析 HTML
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    soup = BeautifulSoup(content, 'html.parser')
-                    modified = False
-                    
-                    for seg in segs:
-                        original = seg['original']
-                        translation = seg['translation']
-                        tag_name = seg['tag']
-                        
-                        # 查找匹配的元素
-                        for elem in soup.find_all(tag_name):
-                            elem_text = elem.get_text(" ", strip=True)
-                            # 精确匹配或包含匹配
-                            if elem_text == original or original in elem_text:
-                                # 替换文本内容
-                                elem.clear()
-                                elem.append(translation)
-                                modified = True
-                                total_applied += 1
-                                logger.info(f"   ✅ 已替换: {original[:30]}... → {translation[:30]}...")
-                                break
-                        else:
-                            total_skipped += 1
-                            logger.warning(f"   ⚠️  未找到匹配: {original[:50]}...")
-                    
-                    if modified:
-                        with open(full_path, 'w', encoding='utf-8') as f:
-                            f.write(str(soup))
-                
-                # 重新打包
-                self._repack_epub(temp_dir, str(epub_path))
+            async with book_slots:
+                print(f"📘 处理: {book['epub_name']} ({len(segments_with_trans)} 处译文)")
+                # 读取 -> 修改 -> 写回 (只改动涉及的章节；有工作区时写入工作区)
+                with open_epub(epub_path) as container:
+                    await asyncio.gather(*(apply_file(container, html_file, segs)
+                                           for html_file, segs in by_file.items()))
+                    # 写回在线程中执行 (重新打包或写入工作区)，其他书继续回填
+                    await asyncio.to_thread(container.save)
                 print(f"   ✅ 已更新: {epub_path}")
         
+        await asyncio.gather(*(apply_book(book) for book in books))
+        
         print(f"\n{'='*60}")
         print(f"📊 回填完成!")
-        print(f"   ✅ 成功替换: {total_applied} 处")
-        print(f"   ⚠️  未找到匹配: {total_skipped} 处")
+        print(f"   ✅ 成功替换: {totals['applied']} 处")
+        print(f"   ⚠️  未找到匹配: {totals['skipped']} 处")
         print(f"{'='*60}")
 
     def _handle_genjson_command(self, args):
@@ -898,8 +968,10 @@ class MainCLI:
             logger.error(f"目录不存在: {target_dir}")
             sys.exit(1)
         
-        # 查找所有已翻译的 EPUB
+        # 查找所有已翻译的 EPUB (包括只有工作区、尚未导出的书)
         epub_files = list(target_dir.glob("*_translated.epub"))
+        epub_files += [path for path in self._workspace_books(target_dir, "*_translated.epub")
+                       if path not in epub_files]
         if not epub_files:
             print(f"⚠️  在 {target_dir} 中没有找到 *_translated.epub 文件")
             return
@@ -911,16 +983,17 @@ class MainCLI:
         checker = EPUBTranslationChecker()
         all_reports = {}
         
+        ledgers = {str(epub_path): BlockLedger.load(str(epub_path)) for epub_path in epub_files}
+        reports = checker.check_epubs(ledgers.keys(), ledgers)
         for epub_path in epub_files:
-            try:
-                report = checker.check_epub(str(epub_path))
-                if report['untranslated_count'] > 0:
-                    all_reports[str(epub_path)] = report['details']
-                    print(f"   ⚠️  {epub_path.name}: {report['untranslated_count']} 处漏译")
-                else:
-                    print(f"   ✅ {epub_path.name}: 无漏译")
-            except Exception as e:
-                logger.warning(f"检查 {epub_path.name} 失败: {e}")
+            report = reports[str(epub_path)]
+            if 'error' in report:
+                logger.warning(f"检查 {epub_path.name} 失败: {report['error']}")
+            elif report['untranslated_count'] > 0:
+                all_reports[str(epub_path)] = report['details']
+                print(f"   ⚠️  {epub_path.name}: {report['untranslated_count']} 处漏译")
+            else:
+                print(f"   ✅ {epub_path.name}: 无漏译")
         
         if not all_reports:
             print("\n🎉 所有文件均无漏译，无需生成 JSON")
@@ -929,6 +1002,41 @@ class MainCLI:
         # 调用现有的报告生成方法
         self._generate_final_report(all_reports, target_dir)
 
+    @staticmethod
+    def _workspace_books(directory: Path, pattern: str = "*.epub") -> List[Path]:
+        """目录下有工作区的书 (按 ePub 路径返回，ePub 本身不一定存在)"""
+        return sorted(Path(str(path)[:-len(WORKSPACE_SUFFIX)])
+                      for path in directory.glob(pattern + WORKSPACE_SUFFIX) if path.is_dir())
+
+    @staticmethod
+    def _print_export_hint(path):
+        print(f"\n📦 结果保存在工作区中，生成最终的 ePub:")
+        print(f"   python3 main.py export --file \"{path}\"")
+
+    def _handle_export_command(self, args):
+        """把工作区打包为最终的 ePub (单本或目录下所有工作区)"""
+        target = Path(args.file)
+        epub_files = self._workspace_books(target) if target.is_dir() else [target]
+        if not epub_files:
+            print(f"⚠️  在 {target} 中没有找到工作区")
+            return
+        if args.output and len(epub_files) > 1:
+            logger.error("--output 只能用于单本导出")
+            sys.exit(1)
+        
+        for epub_path in epub_files:
+            workspace = EpubWorkspace.open(epub_path)
+            if workspace is None:
+                logger.warning(f"⚠️  跳过 (没有可用的工作区): {epub_path}")
+                continue
+            output_path = Path(args.output) if args.output else epub_path
+            with workspace:
+                changed = len(workspace.stored_names)
+                workspace.export(output_path)
+            if args.clean:
+                workspace.discard()
+            print(f"✅ {epub_path.name}: 已导出 {output_path} (工作区中改动的条目 {changed} 个)")
+
     def run(self):
         args = self.parser.parse_args()
         if not args.command:
@@ -943,8 +1051,9 @@ class MainCLI:
             elif args.command == "md": asyncio.run(self._handle_md_command(args))
             elif args.command == "epub": asyncio.run(self._handle_epub_command(args))
             elif args.command == "server": self._handle_server_command(args)
-            elif args.command == "apply-fix": self._handle_applyfix_command(args)
+            elif args.command == "apply-fix": asyncio.run(self._handle_applyfix_command(args))
             elif args.command == "generate-json": self._handle_genjson_command(args)
+            elif args.command == "export": self._handle_export_command(args)
         except KeyboardInterrupt:
             print("\n⚠️ 任务被用户中断")
         except Exception as e:
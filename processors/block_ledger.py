@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+块级翻译台账 (Block Ledger)
+翻译时为每个章节记录所有文本块的结果，保存在输出文件旁的 <输出路径>.ledger.json：
+- 块 ID：块在章节叶子块序列中的序号 (回填只改文本不改结构，翻译前后一致)
+- 原文哈希：修补前用于确认块内容没有被改动
+- 结果：translated / failed (翻译失败或译文与原文相同) / skipped (被过滤器跳过，附原因)
+未成功翻译的块额外记录原文，质检直接读台账判定漏译，不必重新解压、解析整本书；
+修补时只把漏译的块重新发送，修补轮次的开销与漏译数量成正比，而不是与书的大小成正比。
+非叶子块自身带有未翻译文本的章节，台账与质检扫描对"块"的定义不同，这类章节质检时仍然全量扫描。
+每个章节同时记录写出内容的 CRC32 与长度 (与 zip 中央目录一致)，章节被其他途径改动后台账自动失效，
+该章节退回全量扫描。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEDGER_SUFFIX = ".ledger.json"
+
+TRANSLATED = "translated"
+FAILED = "failed"
+SKIPPED = "skipped"
+# 修补时发现块内容与台账不一致 (章节已被改动)
+STALE = "stale"
+# 非叶子块自身的文本 (如 <div>文本<p>…</p></div> 中的"文本")：翻译只处理叶子块，这部分不会被翻译，
+# 质检的块定义却会把整个 div 判为漏译。ID 固定为 -1，附带原文
+LOOSE = "loose"
+
+# 跳过原因
+SKIP_CLASS = "class"      # class 黑名单 (no-translate / code)
+SKIP_FILTER = "filter"    # URL / 代码过滤
+SKIP_TARGET = "target"    # 已是目标语言
+
+
+def block_hash(text: str) -> str:
+    """块文本的短哈希 (空白归一化后计算，回填前后的空白差异不影响比对)"""
+    return hashlib.sha1(" ".join(text.split()).encode('utf-8')).hexdigest()[:12]
+
+
+class LedgerBlock(NamedTuple):
+    """台账中的一个块 (JSON 中保存为数组)"""
+    id: int
+    tag: str
+    hash: str
+    outcome: str
+    reason: Optional[str] = None
+    # 仅未成功翻译的块记录原文
+    text: Optional[str] = None
+
+
+class BlockLedger:
+    """单本书的块级翻译台账"""
+
+    VERSION = 2
+
+    def __init__(self, epub_path: str, source_lang: Optional[str] = None, target_lang: str = "zh"):
+        self.path = self.path_for(epub_path)
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        # {章节路径: {'crc': 写出内容的 CRC32, 'size': 长度, 'blocks': [LedgerBlock, ...]}}
+        self.chapters: Dict[str, dict] = {}
+
+    @staticmethod
+    def path_for(epub_path: str) -> str:
+        return os.fspath(epub_path) + LEDGER_SUFFIX
+
+    @classmethod
+    def load(cls, epub_path: str) -> Optional['BlockLedger']:
+        """读取已有台账；不存在或格式不符时返回 None"""
+        path = cls.path_for(epub_path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != cls.VERSION:
+                return None
+            ledger = cls(epub_path, data.get('source_lang'), data.get('target_lang', "zh"))
+            for name, chapter in data['chapters'].items():
+                ledger.chapters[name] = {
+                    'crc': chapter['crc'],
+                    'size': chapter['size'],
+                    'blocks': [LedgerBlock(*row) for row in chapter['blocks']],
+                }
+            return ledger
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"台账无法读取，忽略: {path} ({e})")
+            return None
+
+    def save(self, epub_path: Optional[str] = None):
+        """原子写入 (先写临时文件再替换)；给出 epub_path 时改为保存到该文件旁 (修补结果另存时)"""
+        if epub_path is not None:
+            self.path = self.path_for(epub_path)
+        data = {
+            'version': self.VERSION,
+            'source_lang': self.source_lang,
+            'target_lang': self.target_lang,
+            'chapters': {
+                name: {'crc': chapter['crc'], 'size': chapter['size'], 'blocks': chapter['blocks']}
+                for name, chapter in self.chapters.items() if chapter['crc'] is not None
+            },
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # 台账只用于加速质检，写入失败时退回全量扫描
+            logger.warning(f"写入台账失败: {e}")
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    # ==================== 记录 ====================
+
+    def record(self, chapter: str, blocks: List[LedgerBlock]):
+        """记录章节的块结果；写出内容确定后需调用 seal"""
+        self.chapters[chapter] = {'crc': None, 'size': None, 'blocks': blocks}
+
+    def seal(self, chapter: str, output: bytes):
+        """登记章节写出内容的指纹，之后质检据此判断台账是否仍然有效"""
+        if chapter in self.chapters:
+            self.chapters[chapter]['crc'] = zlib.crc32(output)
+            self.chapters[chapter]['size'] = len(output)
+
+    def invalidate(self, chapter: str):
+        self.chapters.pop(chapter, None)
+
+    def update(self, chapter: str, outcomes: Dict[int, Tuple[str, Optional[str]]]):
+        """
+        应用修补结果 {块 ID: (结果, 未成功时的当前文本)}；调用方随后需 seal 新内容。
+        有块的结果为 STALE 时整个章节失效，下一轮退回全量扫描。
+        """
+        if chapter not in self.chapters:
+            return
+        if any(outcome == STALE for outcome, _ in outcomes.values()):
+            self.invalidate(chapter)
+            return
+        blocks = self.chapters[chapter]['blocks']
+        for i, block in enumerate(blocks):
+            if block.id in outcomes:
+                outcome, text = outcomes[block.id]
+                blocks[i] = block._replace(
+                    outcome=outcome, reason=None,
+                    hash=block_hash(text) if text is not None else block.hash,
+                    text=text if outcome != TRANSLATED else None)
+
+    # ==================== 查询 ====================
+
+    def is_current(self, chapter: str, crc: int, size: int) -> bool:
+        """台账记录的是否就是 zip 中当前的章节内容 (CRC32 与长度取自 zip 目录，无需解压)"""
+        entry = self.chapters.get(chapter)
+        return entry is not None and entry['crc'] == crc and entry['size'] == size
+
+    def has_loose_leaks(self, chapter: str, is_untranslated: Callable[[str], bool]) -> bool:
+        """章节中是否有非叶子块自身的文本仍被判定为漏译 (此时台账不能代替质检扫描)"""
+        return any(block.outcome == LOOSE and block.text and is_untranslated(block.text)
+                   for block in self.chapters[chapter]['blocks'])
+
+    def leaks(self, chapter: str, is_untranslated: Callable[[str], bool]) -> List[LedgerBlock]:
+        """未成功翻译、且文本仍被判定为漏译的块 (class 黑名单跳过的块是有意不翻译的，不算漏译)"""
+        return [block for block in self.chapters[chapter]['blocks']
+                if block.outcome in (FAILED, SKIPPED) and block.reason != SKIP_CLASS
+                and block.text and is_untranslated(block.text)]
+
+    def count(self, outcomes: Iterable[str] = (TRANSLATED, FAILED, SKIPPED)) -> Dict[str, int]:
+        counts = {outcome: 0 for outcome in outcomes}
+        for chapter in self.chapters.values():
+            for block in chapter['blocks']:
+                if block.outcome in counts:
+                    counts[block.outcome] += 1
+        return counts
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+整本书的段落调度器 (Book-Wide Segment Scheduler)
+不再按章节各自 gather：先提取所有待翻译章节的段落，汇入一个全局队列 (按估算 Token 从长到短排序)，
+由固定数量的工作协程按批取用并调用 translate_batch。章节按估算内存 (DOM 大小 + Token 体积) 分批准入，
+总量受 EPUB_MEMORY_BUDGET_MB 约束。空闲的车道总是领取剩余工作中最长的一批，
+超长段落最先开始，书末尾只剩短段落，不会因为某个大章节拖长整本书的尾部耗时。
+某个章节的最后一个段落返回后立即回填、序列化并交给回调写出。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Callable, List, Mapping, Optional, Set, Tuple
+
+from . import block_ledger
+from .block_ledger import BlockLedger, LedgerBlock, block_hash
+from .html_worker import HTMLProcessor
+from .memory_budget import PayloadBudget, estimate_dom_bytes, estimate_token_bytes
+
+logger = logging.getLogger(__name__)
+
+FAILED_MARKER = "[TRANSLATION_FAILED]"
+
+
+@dataclass
+class _Chapter:
+    name: str
+    html: str
+    block_chunks: List[List[str]]
+    # 每个块每个片段的译文 (失败时为原文片段)
+    results: List[List[Optional[str]]] = field(default_factory=list)
+    remaining: int = 0
+    # 在内存预算中预留的字节数
+    reserved: int = 0
+    # 台账条目 (含跳过的块) 与有片段翻译失败的待译块下标
+    blocks: List[LedgerBlock] = field(default_factory=list)
+    failed: Set[int] = field(default_factory=set)
+
+
+@dataclass
+class _Segment:
+    chapter: _Chapter
+    block: int
+    chunk: int
+    text: str
+    tokens: int
+
+
+class BookScheduler:
+    """把多个章节的段落放进同一个队列调度翻译"""
+
+    # 每次 translate_batch 的段落数 (短段落在客户端内还会按 Token 预算打包)
+    DEFAULT_BATCH_SEGMENTS = 40
+    # 同时在途的段落上限，略高于快车道并发上限 (500)，保证各车道始终有活干
+    DEFAULT_MAX_INFLIGHT = 600
+
+    def __init__(self, html_processor: HTMLProcessor, source_lang: Optional[str] = None, target_lang: str = "zh",
+                 batch_segments: Optional[int] = None, max_inflight: Optional[int] = None,
+                 gate: Optional[asyncio.Semaphore] = None, budget: Optional[PayloadBudget] = None,
+                 ledger: Optional[BlockLedger] = None):
+        self.html_processor = html_processor
+        self.translator = html_processor.translator
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.batch_segments = max(1, batch_segments or int(os.getenv('EPUB_BATCH_SEGMENTS', self.DEFAULT_BATCH_SEGMENTS)))
+        self.max_inflight = max(1, max_inflight or int(os.getenv('EPUB_MAX_INFLIGHT_SEGMENTS', self.DEFAULT_MAX_INFLIGHT)))
+        # 多本书共用的在途批次闸门 (见 EpubLibrary)；为 None 时只受本书的工作协程数限制
+        self.gate = gate
+        # 内存预算 (多本书并发时由 EpubLibrary 共享)
+        self.budget = budget or PayloadBudget()
+        # 块级台账：章节回填后记录每个块的翻译结果
+        self.ledger = ledger
+        self.stats = {'chapters': 0, 'segments': 0, 'batches': 0, 'failed_segments': 0, 'admission_waves': 0}
+
+    async def run(self, chapters: Mapping[str, str],
+                  on_done: Callable[[str, str], None],
+                  on_failed: Callable[[str, Exception], None]):
+        """
+        翻译 {章节名: HTML} 中的所有章节 (可以是按需读取的映射，章节准入时才取值)。
+        每个章节完成时调用 on_done(章节名, 输出内容)，提取或回填失败时调用 on_failed(章节名, 异常)。
+        章节按内存预算分批准入：预算足够时整本书一次提取、全局按长度排序；
+        预算不足时先准入放得下的章节，之后每写出一个章节就腾出空间准入下一批。
+        """
+        finalizers: List[asyncio.Task] = []
+        # 全局优先队列：(-Token 数, 入队序号, 段落)，最长的段落最先发出，同长度保持文档顺序
+        heap: List[tuple] = []
+        seq = itertools.count()
+        wakeup = asyncio.Event()
+        admission_done = False
+        # 已准入但尚未归还预算的章节 / 正在提取的一批章节所预留的字节数
+        admitted: List[_Chapter] = []
+        extracting = 0
+
+        def finish(chapter: _Chapter):
+            finalizers.append(asyncio.create_task(self._finalize(chapter, on_done, on_failed)))
+
+        def enqueue(name: str, chapter, reserved: int):
+            if isinstance(chapter, Exception):
+                self.budget.release(reserved)
+                on_failed(name, chapter)
+                return
+            self.stats['chapters'] += 1
+            chapter.reserved = reserved
+            admitted.append(chapter)
+            if not chapter.remaining:
+                finish(chapter)
+                return
+            tokens = 0
+            for block, chunks in enumerate(chapter.block_chunks):
+                for idx, text in enumerate(chunks):
+                    segment = _Segment(chapter, block, idx, text,
+                                       self.html_processor.token_tracker.estimate_tokens(text))
+                    tokens += segment.tokens
+                    heapq.heappush(heap, (-segment.tokens, next(seq), segment))
+            # 段落原文与译文的体积提取后才知道，追加计入预算
+            chapter.reserved += estimate_token_bytes(tokens)
+            self.budget.charge(estimate_token_bytes(tokens))
+            self.stats['segments'] += chapter.remaining
+
+        async def admit():
+            """1. 按预算分批准入并提取章节 (进程池)；章节内容在准入时才读取"""
+            nonlocal admission_done, extracting
+            names = list(chapters)
+            i = 0
+            while i < len(names):
+                # 每批至少一个章节 (必要时等待预算)，然后尽量多放入放得下的章节
+                html = chapters[names[i]]
+                cost = estimate_dom_bytes(len(html))
+                await self.budget.acquire(cost)
+                wave, costs = [(names[i], html)], [cost]
+                while i + len(wave) < len(names):
+                    name = names[i + len(wave)]
+                    html = chapters[name]
+                    cost = estimate_dom_bytes(len(html))
+                    if not self.budget.try_acquire(cost):
+                        break
+                    wave.append((name, html))
+                    costs.append(cost)
+                del html
+                i += len(wave)
+                self.stats['admission_waves'] += 1
+                extracting = sum(costs)
+                loaded = await asyncio.gather(*(self._extract(name, html) for name, html in wave),
+                                              return_exceptions=True)
+                extracting = 0
+                for (name, _), chapter, reserved in zip(wave, loaded, costs):
+                    enqueue(name, chapter, reserved)
+                wakeup.set()
+            admission_done = True
+            wakeup.set()
+
+        async def worker():
+            """2. 工作协程：从全局队列取最长的一批段落翻译"""
+            while True:
+                if not heap:
+                    if admission_done:
+                        return
+                    wakeup.clear()
+                    await wakeup.wait()
+                    continue
+                batch = [heapq.heappop(heap)[2] for _ in range(min(self.batch_segments, len(heap)))]
+                self.stats['batches'] += 1
+                if self.gate is None:
+                    results = await self._translate(batch)
+                else:
+                    async with self.gate:
+                        results = await self._translate(batch)
+                for segment, (result, ok) in zip(batch, results):
+                    chapter = segment.chapter
+                    chapter.results[segment.block][segment.chunk] = result
+                    if not ok:
+                        chapter.failed.add(segment.block)
+                    chapter.remaining -= 1
+                    if chapter.remaining == 0:
+                        finish(chapter)
+
+        # 3. 固定数量的工作协程领取批次，直到所有章节准入完毕且队列清空
+        workers = max(1, math.ceil(self.max_inflight / self.batch_segments))
+        tasks = [asyncio.create_task(admit())] + [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # 中断时先让已完成章节的回填跑完，它们的结果随后会被保存
+            await asyncio.gather(*finalizers, return_exceptions=True)
+            # 归还未完成章节的预算，共享预算的其他书不会因此卡住
+            self.budget.release(extracting + sum(chapter.reserved for chapter in admitted))
+            for chapter in admitted:
+                chapter.reserved = 0
+            raise
+        await asyncio.gather(*finalizers)
+
+    async def _extract(self, name: str, html: str) -> _Chapter:
+        block_chunks, blocks = await self.html_processor.extract_content_blocks(html, self.target_lang)
+        return _Chapter(name, html, block_chunks,
+                        results=[[None] * len(chunks) for chunks in block_chunks],
+                        remaining=sum(len(chunks) for chunks in block_chunks),
+                        blocks=blocks)
+
+    async def _translate(self, batch: List[_Segment]) -> List[Tuple[str, bool]]:
+        """翻译一批段落，返回 [(译文, 是否成功)]；失败的段落退回原文"""
+        texts = [segment.text for segment in batch]
+        try:
+            results = await self.translator.translate_batch(texts, source_lang=self.source_lang,
+                                                            target_lang=self.target_lang)
+        except Exception as e:
+            logger.error(f"API 请求严重错误: {e}")
+            results = [FAILED_MARKER] * len(texts)
+
+        output = []
+        for text, result in zip(texts, results):
+            if result == FAILED_MARKER or isinstance(result, Exception):
+                logger.warning(f"段落翻译失败: {text[:30]}...")
+                self.stats['failed_segments'] += 1
+                output.append((text, False))
+            else:
+                output.append((result, True))
+        return output
+
+    async def _finalize(self, chapter: _Chapter, on_done, on_failed):
+        """回填并序列化一个已完成的章节，写出后归还它占用的预算"""
+        translations = [" ".join(chunks) if chunks else None for chunks in chapter.results]
+        try:
+            output, _ = await self.html_processor.refill_content(chapter.html, self.target_lang, translations)
+            if self.ledger is not None:
+                self.ledger.record(chapter.name, self._ledger_blocks(chapter, translations))
+        except Exception as e:
+            on_failed(chapter.name, e)
+            return
+        finally:
+            self.budget.release(chapter.reserved)
+            chapter.reserved = 0
+            # 章节写出后只保留空壳，HTML 与段落随即释放
+            chapter.html, chapter.block_chunks, chapter.results, chapter.blocks = "", [], [], []
+        on_done(chapter.name, output)
+
+    @staticmethod
+    def _ledger_blocks(chapter: _Chapter, translations: List[Optional[str]]) -> List[LedgerBlock]:
+        """按实际翻译结果修正待译块的台账条目：有片段失败或译文与原文相同的块记为 FAILED 并附当前文本"""
+        blocks = []
+        target = 0
+        for block in chapter.blocks:
+            if block.outcome == block_ledger.TRANSLATED:
+                source = " ".join(chapter.block_chunks[target])
+                translation = translations[target]
+                if target in chapter.failed or not translation or translation == source:
+                    # 回填时译文与原文相同则 DOM 不变，块内仍是原文
+                    current = translation if translation and translation != source else source
+                    block = block._replace(outcome=block_ledger.FAILED, hash=block_hash(current), text=current)
+                target += 1
+            blocks.append(block)
+        return blocks
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+EPUB 章节级断点续译 (Checkpoint Journal)
+在输出文件旁放一个 SQLite 日志 (<输出路径>.checkpoint.db)，每完成一个章节就把译文字节持久化，
+键为 (章节路径, 源内容哈希)。中断后重新运行时，源内容未变的章节直接取用已完成的译文，
+只翻译尚未完成的章节；整本书成功完成后删除日志。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".checkpoint.db"
+
+
+class EpubCheckpoint:
+    """单本书的章节完成日志"""
+
+    def __init__(self, output_path: str, source_lang: Optional[str] = None, target_lang: str = "zh"):
+        self.path = self.path_for(output_path)
+        # 语言对参与源哈希：换了目标语言的旧日志不会被误用
+        self._lang_key = f"{source_lang or ''}\x1f{target_lang or ''}"
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {'resumed': 0, 'saved': 0}
+
+    @staticmethod
+    def path_for(output_path: str) -> str:
+        return os.fspath(output_path) + CHECKPOINT_SUFFIX
+
+    @classmethod
+    def exists_for(cls, output_path: str) -> bool:
+        """输出文件对应的书是否有未完成的翻译进度"""
+        return os.path.exists(cls.path_for(output_path))
+
+    def _connect(self) -> sqlite3.Connection:
+        """延迟打开连接，没有任何章节完成时不创建日志文件"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 每个章节提交后都落盘，进程崩溃或断电也不丢已完成的章节
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chapters ("
+                " path TEXT NOT NULL,"
+                " source_hash TEXT NOT NULL,"
+                " content BLOB NOT NULL,"
+                " created REAL NOT NULL,"
+                " PRIMARY KEY (path, source_hash))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def source_hash(self, source: bytes) -> str:
+        return hashlib.sha256(self._lang_key.encode('utf-8') + b"\x1e" + source).hexdigest()
+
+    def get(self, path: str, source: bytes) -> Optional[bytes]:
+        """取出已完成章节的译文；源内容变化或未完成时返回 None"""
+        if self._conn is None and not os.path.exists(self.path):
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT content FROM chapters WHERE path = ? AND source_hash = ?", (path, self.source_hash(source))
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取断点日志失败: {e}")
+            return None
+        if row is None:
+            return None
+        self.stats['resumed'] += 1
+        return bytes(row[0])
+
+    def put(self, path: str, source: bytes, content: bytes):
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO chapters (path, source_hash, content, created) VALUES (?, ?, ?, ?)",
+                (path, self.source_hash(source), content, time.time())
+            )
+            self.stats['saved'] += 1
+        except sqlite3.Error as e:
+            # 日志写入失败只影响续译，不影响本次翻译
+            logger.warning(f"写入断点日志失败 ({path}): {e}")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def discard(self):
+        """整本书完成后删除日志 (含 WAL / SHM 文件)"""
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
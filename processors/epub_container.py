@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+EPUB 容器 (zip 到 zip 流式读写)
+按需从源 zip 读取需要的条目，修改结果暂存在内存中，保存时直接写出新的 zip：
+- 未修改的条目 (图片、字体等) 原样复制压缩字节，不解压也不重新压缩
+- 需要压缩的条目在线程池中并行 deflate (zlib 压缩时释放 GIL)，再按固定顺序写入，输出可复现
+- 已压缩格式的媒体 (jpg/png/woff/mp3 等) 直接存储 (STORED)，不再重复压缩
+- mimetype 始终作为第一个条目且不压缩 (STORED)
+- 直接追加压缩字节依赖 zipfile 内部状态，首次使用时自检，不支持时退回 writestr (解压后重新压缩)
+- 先写临时文件再原子替换，支持原地更新 (输出路径与输入相同)
+"""
+
+import functools
+import io
+import logging
+import os
+import posixpath
+import struct
+import sys
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE = "mimetype"
+
+_COPY_CHUNK = 1024 * 1024
+# 通用标志位 bit 3：CRC/长度写在数据之后的 data descriptor 中
+_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+
+# 本身已压缩的格式，deflate 几乎没有收益，直接存储
+PRECOMPRESSED_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif',
+    '.woff', '.woff2',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.mp4', '.m4v', '.webm',
+    '.zip', '.gz', '.epub',
+})
+# 小于该大小的条目在当前线程直接压缩 (交给线程池的开销比压缩本身还大)
+_PARALLEL_MIN_SIZE = 64 * 1024
+
+
+def resolve_href(base_dir: str, href: str) -> str:
+    """把 OPF / NCX 中的相对 href 解析为 zip 内的条目名 (去掉锚点与 URL 转义)"""
+    href = unquote(href.split('#', 1)[0])
+    return posixpath.normpath(posixpath.join(base_dir, href)) if base_dir else posixpath.normpath(href)
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """移除 zip64 扩展字段 (写本地文件头时会按实际大小重新生成)"""
+    kept = []
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack('<HH', extra[pos:pos + 4])
+        if field_id != _ZIP64_EXTRA_ID:
+            kept.append(extra[pos:pos + 4 + size])
+        pos += 4 + size
+    return b''.join(kept)
+
+
+def is_precompressed(name: str) -> bool:
+    return posixpath.splitext(name)[1].lower() in PRECOMPRESSED_EXTENSIONS
+
+
+@dataclass
+class PackedEntry:
+    """压缩好的条目数据 (可直接写入 zip)"""
+    compress_type: int
+    crc: int
+    file_size: int
+    payload: bytes
+
+
+def pack_entry(name: str, data: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION) -> PackedEntry:
+    """按 zip 的 raw deflate 格式压缩单个条目；已压缩的媒体或压缩后不变小的数据直接存储"""
+    crc = zlib.crc32(data)
+    if not is_precompressed(name) and data:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        payload = compressor.compress(data) + compressor.flush()
+        if len(payload) < len(data):
+            return PackedEntry(zipfile.ZIP_DEFLATED, crc, len(data), payload)
+    return PackedEntry(zipfile.ZIP_STORED, crc, len(data), data)
+
+
+def pack_entries(entries: Sequence[Tuple[str, bytes]], workers: Optional[int] = None) -> List[PackedEntry]:
+    """并行压缩多个条目，返回顺序与输入一致"""
+    if workers is None:
+        workers = int(os.getenv('EPUB_PACK_WORKERS', 0)) or os.cpu_count() or 1
+    large = [i for i, (_, data) in enumerate(entries) if len(data) >= _PARALLEL_MIN_SIZE]
+    packed: List[Optional[PackedEntry]] = [None] * len(entries)
+    if workers > 1 and len(large) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(large))) as pool:
+            for i, entry in zip(large, pool.map(lambda i: pack_entry(*entries[i]), large)):
+                packed[i] = entry
+    for i, (name, data) in enumerate(entries):
+        if packed[i] is None:
+            packed[i] = pack_entry(name, data)
+    return packed
+
+
+# 本地文件头 (zip 规范 4.3.7)：签名、版本、标志、压缩方式、时间、日期、CRC、压缩后/原始大小、文件名长度、扩展字段长度
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+
+@functools.lru_cache(maxsize=None)
+def raw_append_supported() -> bool:
+    """
+    当前 Python 的 zipfile 能否直接追加已压缩的字节。
+    _append_raw 依赖 ZipFile 的内部状态 (fp / start_dir / _didModify)，它们不属于公开接口：
+    首次使用时在内存中写一个 zip 自检，通不过 (或属性缺失) 时所有条目退回 writestr。
+    """
+    with zipfile.ZipFile(io.BytesIO(), 'w') as probe:
+        attrs_present = all(hasattr(probe, attr) for attr in ('fp', 'start_dir', '_didModify', 'filelist', 'NameToInfo'))
+    if not attrs_present:
+        logger.warning(f"zipfile (Python {sys.version.split()[0]}) 内部结构已变化，改用 writestr 写入 ePub")
+        return False
+    try:
+        data = b"raw append self-test " * 8
+        packed = pack_entry("probe.txt", data)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as out:
+            out.writestr("first.txt", b"first")
+            _write_raw(out, _packed_info(zipfile.ZipInfo("probe.txt"), packed), (packed.payload,))
+        with zipfile.ZipFile(buffer) as zf:
+            ok = zf.testzip() is None and zf.read("probe.txt") == data and zf.read("first.txt") == b"first"
+    except Exception as e:
+        logger.debug(f"直接追加压缩字节自检失败: {e}")
+        ok = False
+    if not ok:
+        logger.warning(f"zipfile (Python {sys.version.split()[0]}) 不支持直接追加压缩字节，改用 writestr 写入 ePub")
+    return ok
+
+
+def _raw_chunks(src, info: zipfile.ZipInfo):
+    """按块读出源条目的压缩字节 (src 为源 zip 的文件对象)"""
+    src.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+    # 本地文件头中的文件名 / 扩展字段长度可能与中央目录不同，以本地头为准定位数据
+    src.seek(header[-2] + header[-1], os.SEEK_CUR)
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.read(min(_COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"条目数据不完整: {info.filename}")
+        yield chunk
+        remaining -= len(chunk)
+
+
+def _write_raw(out: zipfile.ZipFile, info: zipfile.ZipInfo, chunks):
+    """写入本地文件头与已压缩数据，并登记到中央目录 (info 需已填好 CRC 与大小)"""
+    info.header_offset = out.fp.tell()
+    out.fp.write(info.FileHeader())
+    for chunk in chunks:
+        out.fp.write(chunk)
+    out.filelist.append(info)
+    out.NameToInfo[info.filename] = info
+    out.start_dir = out.fp.tell()
+    out._didModify = True
+
+
+def _append_raw(out: zipfile.ZipFile, info: zipfile.ZipInfo, chunks, load):
+    """
+    追加一个已压缩的条目；不支持直接追加时 (见 raw_append_supported)
+    用 load() 取得未压缩的内容，按 info 的压缩方式交给 writestr 重新压缩。
+    """
+    if raw_append_supported():
+        _write_raw(out, info, chunks)
+    else:
+        out.writestr(info, load(), compress_type=info.compress_type)
+
+
+def _packed_info(info: zipfile.ZipInfo, packed: PackedEntry) -> zipfile.ZipInfo:
+    info.compress_type = packed.compress_type
+    info.CRC = packed.crc
+    info.file_size = packed.file_size
+    info.compress_size = len(packed.payload)
+    return info
+
+
+def _append_packed(out: zipfile.ZipFile, info: zipfile.ZipInfo, packed: PackedEntry):
+    def load() -> bytes:
+        if packed.compress_type == zipfile.ZIP_STORED:
+            return packed.payload
+        return zlib.decompress(packed.payload, -15)
+
+    _append_raw(out, _packed_info(info, packed), (packed.payload,), load)
+
+
+def _write_mimetype(out: zipfile.ZipFile, data: bytes, date_time=None):
+    mimetype = zipfile.ZipInfo(MIMETYPE, date_time) if date_time else zipfile.ZipInfo(MIMETYPE)
+    out.writestr(mimetype, data, compress_type=zipfile.ZIP_STORED)
+
+
+def pack_directory(source_dir: Union[str, os.PathLike], output_path: Union[str, os.PathLike],
+                   workers: Optional[int] = None):
+    """
+    把解压后的 EPUB 目录重新打包：mimetype 首位不压缩，其余条目按路径排序、并行压缩。
+    相同的目录内容 (含修改时间) 总是得到相同的字节。
+    """
+    source_dir = os.fspath(source_dir)
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        for name in names:
+            full_path = os.path.join(root, name)
+            files.append((os.path.relpath(full_path, source_dir).replace(os.sep, '/'), full_path))
+    files.sort()
+
+    mimetype_path = os.path.join(source_dir, MIMETYPE)
+    if not os.path.exists(mimetype_path):
+        logger.warning("警告: 未找到 mimetype 文件，生成的 epub 可能不标准")
+    entries, infos = [], []
+    for arcname, full_path in files:
+        if arcname == MIMETYPE:
+            continue
+        with open(full_path, 'rb') as f:
+            entries.append((arcname, f.read()))
+        infos.append(zipfile.ZipInfo.from_file(full_path, arcname, strict_timestamps=False))
+    packed = pack_entries(entries, workers)
+
+    with zipfile.ZipFile(os.fspath(output_path), 'w', zipfile.ZIP_DEFLATED) as out:
+        if os.path.exists(mimetype_path):
+            with open(mimetype_path, 'rb') as f:
+                _write_mimetype(out, f.read())
+        for info, entry in zip(infos, packed):
+            _append_packed(out, info, entry)
+
+
+class EpubContainer:
+    """以 zip 为单位读写 EPUB，不解压到临时目录"""
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self._open()
+        self._modified: Dict[str, bytes] = {}
+        if MIMETYPE not in self._infos:
+            logger.warning("警告: 未找到 mimetype 文件，此 ePub 可能不标准")
+
+    def _open(self):
+        self._zip = zipfile.ZipFile(self.path, 'r')
+        # 保持源文件中的条目顺序
+        self._infos: Dict[str, zipfile.ZipInfo] = {info.filename: info for info in self._zip.infolist()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    # ==================== 读取 / 修改 ====================
+
+    def namelist(self) -> List[str]:
+        names = [name for name in self._infos if not name.endswith('/')]
+        return names + [name for name in self._modified if name not in self._infos]
+
+    def exists(self, name: str) -> bool:
+        return name in self._modified or name in self._infos
+
+    def read(self, name: str) -> bytes:
+        if name in self._modified:
+            return self._modified[name]
+        return self._zip.read(name)
+
+    def read_original(self, name: str) -> bytes:
+        """读取源 zip 中的内容 (忽略暂存的修改)"""
+        return self._zip.read(name)
+
+    def read_text(self, name: str, encoding: str = 'utf-8') -> str:
+        return self.read(name).decode(encoding)
+
+    def write(self, name: str, data: Union[str, bytes]):
+        """暂存修改后的条目内容，保存时写入"""
+        self._modified[name] = data.encode('utf-8') if isinstance(data, str) else data
+
+    def entry_fingerprint(self, name: str) -> Tuple[int, int]:
+        """条目当前内容的 (CRC32, 长度)；未修改的条目取自 zip 目录，不解压"""
+        if name in self._modified:
+            data = self._modified[name]
+            return zlib.crc32(data), len(data)
+        info = self._infos[name]
+        return info.CRC, info.file_size
+
+    @property
+    def modified_names(self) -> List[str]:
+        return list(self._modified)
+
+    # ==================== 保存 ====================
+
+    def save(self, output_path: Optional[Union[str, os.PathLike]] = None):
+        """写出新的 EPUB；output_path 省略时原地更新源文件"""
+        target = os.fspath(output_path) if output_path is not None else self.path
+        fd, tmp_path = tempfile.mkstemp(prefix='.epub-', suffix='.tmp', dir=os.path.dirname(os.path.abspath(target)))
+        os.close(fd)
+        try:
+            # 修改过与新增的条目先并行压缩，再按源文件中的顺序写出
+            new_names = [name for name in self._modified if name not in self._infos and name != MIMETYPE]
+            names = [name for name in self._infos if name in self._modified and name != MIMETYPE] + new_names
+            packed = dict(zip(names, pack_entries([(name, self._modified[name]) for name in names])))
+
+            with open(self.path, 'rb') as src, zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as out:
+                if self.exists(MIMETYPE):
+                    info = self._infos.get(MIMETYPE)
+                    _write_mimetype(out, self.read(MIMETYPE), info.date_time if info else None)
+
+                for name, info in self._infos.items():
+                    if name == MIMETYPE:
+                        continue
+                    if name in packed:
+                        _append_packed(out, self._new_info(name, info), packed[name])
+                    else:
+                        self._copy_raw(src, info, out)
+
+                for name in new_names:
+                    _append_packed(out, self._new_info(name), packed[name])
+            in_place = os.path.abspath(target) == os.path.abspath(self.path)
+            if in_place:
+                # 源文件即将被替换：先关闭旧句柄 (Windows 不能替换打开中的文件)
+                self._zip.close()
+            try:
+                os.replace(tmp_path, target)
+            finally:
+                if in_place:
+                    # 重新读取目录：旧的条目偏移属于被替换掉的文件，再次保存时不能再用
+                    self._open()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if in_place:
+            self._modified = {}
+
+    @staticmethod
+    def _new_info(name: str, original: Optional[zipfile.ZipInfo] = None) -> zipfile.ZipInfo:
+        if original is None:
+            return zipfile.ZipInfo(name)
+        info = zipfile.ZipInfo(name, original.date_time)
+        info.external_attr = original.external_attr
+        info.create_system = original.create_system
+        return info
+
+    def _copy_raw(self, src, info: zipfile.ZipInfo, out: zipfile.ZipFile):
+        """把源条目的压缩字节原样写入输出 zip (重建本地文件头，登记到中央目录)"""
+        copied = zipfile.ZipInfo(info.filename, info.date_time)
+        copied.compress_type = info.compress_type
+        copied.CRC = info.CRC
+        copied.compress_size = info.compress_size
+        copied.file_size = info.file_size
+        copied.flag_bits = info.flag_bits & ~_FLAG_DATA_DESCRIPTOR
+        copied.extra = _strip_zip64_extra(info.extra)
+        copied.comment = info.comment
+        copied.internal_attr = info.internal_attr
+        copied.external_attr = info.external_attr
+        copied.create_system = info.create_system
+        copied.extract_version = info.extract_version
+        _append_raw(out, copied, _raw_chunks(src, info), lambda: self._zip.read(info.filename))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+多本书并发翻译 (Library Pipeline)
+目录模式下不再逐本创建 AsyncTranslator、逐本排空流水线：所有书共用同一个翻译客户端
+(同一套连接池、车道并发限制、限流器和翻译记忆)，多本书同时在途，车道在书与书的交界处不会空转。
+三道全局闸门:
+- 同时打开的书数上限
+- 内存预算：所有书的章节共用一个按估算字节计量的预算 (EPUB_MEMORY_BUDGET_MB)
+- 在途批次上限：所有书的调度器共用一个信号量，合计在途段落不超过 EPUB_MAX_INFLIGHT_SEGMENTS
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from .book_scheduler import BookScheduler
+from .epub_worker import EpubProcessor
+from .memory_budget import PayloadBudget
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BookJob:
+    """一本待翻译的书"""
+    input_path: str
+    output_path: str
+    resume: bool = True
+    # 结果写入工作区，不打包 ePub (见 EpubWorkspace)
+    workspace: bool = False
+
+
+class EpubLibrary:
+    """共用一个翻译客户端并发翻译多本 ePub"""
+
+    # 同时打开的书数
+    DEFAULT_MAX_BOOKS = 4
+
+    def __init__(self, translator, max_books: Optional[int] = None, max_inflight_segments: Optional[int] = None,
+                 budget: Optional[PayloadBudget] = None):
+        self.translator = translator
+        self.max_books = max(1, max_books or int(os.getenv('EPUB_MAX_CONCURRENT_BOOKS', self.DEFAULT_MAX_BOOKS)))
+        batch_segments = max(1, int(os.getenv('EPUB_BATCH_SEGMENTS', BookScheduler.DEFAULT_BATCH_SEGMENTS)))
+        max_inflight = max_inflight_segments or int(
+            os.getenv('EPUB_MAX_INFLIGHT_SEGMENTS', BookScheduler.DEFAULT_MAX_INFLIGHT))
+        # 单本书独占时仍能用满全部在途额度，多本书同时在途时按先到先得分享
+        self.segment_gate = asyncio.Semaphore(max(1, math.ceil(max_inflight / batch_segments)))
+        self._book_slots = asyncio.Semaphore(self.max_books)
+        self.budget = budget or PayloadBudget()
+        self.stats = {'books': 0, 'succeeded': 0, 'failed': 0, 'peak_open_books': 0}
+        self._open_books = 0
+
+    async def translate_all(
+        self,
+        jobs: List[BookJob],
+        source_lang: Optional[str] = None,
+        target_lang: str = "zh",
+        progress_callback: Optional[Callable[[str, float, str], None]] = None,
+        on_book_done: Optional[Callable[[BookJob, Dict], None]] = None
+    ) -> Dict[str, Dict]:
+        """
+        并发翻译所有书，返回 {输出路径: 结果}。
+        progress_callback(输出路径, 进度, 消息) 汇报单本书的进度；on_book_done(任务, 结果) 在每本书结束时调用。
+        单本书失败不影响其他书，结果中 success=False 并附带 error。
+        """
+        results: Dict[str, Dict] = {}
+
+        async def run(job: BookJob):
+            async with self._book_slots:
+                self._open_books += 1
+                self.stats['peak_open_books'] = max(self.stats['peak_open_books'], self._open_books)
+                try:
+                    result = await self._translate_book(job, source_lang, target_lang, progress_callback)
+                finally:
+                    self._open_books -= 1
+            results[job.output_path] = result
+            if on_book_done:
+                on_book_done(job, result)
+
+        self.stats['books'] += len(jobs)
+        await asyncio.gather(*(run(job) for job in jobs))
+        return results
+
+    async def _translate_book(self, job: BookJob, source_lang, target_lang, progress_callback) -> Dict:
+        start = time.perf_counter()
+
+        def book_progress(progress: float, message: str):
+            if progress_callback:
+                progress_callback(job.output_path, progress, message)
+
+        processor = EpubProcessor(self.translator, segment_gate=self.segment_gate, budget=self.budget)
+        try:
+            result = await processor.translate_epub(
+                input_path=job.input_path,
+                output_path=job.output_path,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                progress_callback=book_progress,
+                resume=job.resume,
+                workspace=job.workspace
+            )
+        except Exception as e:
+            logger.error(f"翻译 {os.path.basename(job.input_path)} 失败: {e}")
+            self.stats['failed'] += 1
+            return {'success': False, 'error': str(e), 'output_file': job.output_path,
+                    'elapsed': time.perf_counter() - start}
+        self.stats['succeeded'] += 1
+        result['elapsed'] = time.perf_counter() - start
+        return result
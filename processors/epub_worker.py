@@ -4,18 +4,21 @@ ePub 电子书翻译处理器 (增强版)
 修复 container.xml 命名空间解析问题，支持中断保存
 """
 
-import zipfile
-import tempfile
-import os
 import logging
 import asyncio
-import shutil
-from pathlib import Path
-from typing import Optional, Dict, Any, List
+import posixpath
+from collections.abc import Mapping
+from typing import Optional, Dict, Any, Callable, List
 from xml.etree import ElementTree as ET
 from dataclasses import dataclass
 
-from .html_worker import HTMLProcessor
+from .block_ledger import BlockLedger
+from .book_scheduler import BookScheduler
+from .epub_checkpoint import EpubCheckpoint
+from .epub_container import EpubContainer, resolve_href
+from .epub_workspace import EpubWorkspace
+from .html_worker import HTMLProcessor, worker_peak_rss_mb
+from .memory_budget import PayloadBudget, peak_rss_mb
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +38,23 @@ class EpubInfo:
             self.metadata = {}
 
 
+class _ChapterTexts(Mapping):
+    """按需从容器读取章节 HTML 的只读映射，避免整本书的内容同时驻留内存"""
+
+    def __init__(self, container: EpubContainer, names: List[str]):
+        self._container = container
+        self._names = names
+
+    def __getitem__(self, name: str) -> str:
+        return self._container.read_text(name)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
 class EpubProcessor:
     """ePub 电子书翻译处理器"""
     
@@ -43,11 +63,13 @@ class EpubProcessor:
     OPF_NS = {'opf': 'http://www.idpf.org/2007/opf'}
     DC_NS = 'http://purl.org/dc/elements/1.1/'
     
-    def __init__(self, translator):
+    def __init__(self, translator, segment_gate: Optional[asyncio.Semaphore] = None,
+                 budget: Optional[PayloadBudget] = None):
         self.translator = translator
         self.html_processor = HTMLProcessor(translator)
-        # 限制文件并发数，防止打开过多文件句柄
-        self.file_semaphore = asyncio.Semaphore(50) 
+        # 多本书并发时共用的在途批次闸门与内存预算 (EpubLibrary 传入)
+        self.segment_gate = segment_gate
+        self.budget = budget
     
     async def translate_epub(
         self, 
@@ -55,69 +77,108 @@ class EpubProcessor:
         output_path: str,
         source_lang: Optional[str] = None,
         target_lang: str = "zh",
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        resume: bool = True,
+        workspace: bool = False
     ) -> Dict[str, Any]:
-        """翻译 ePub 文件 (支持中断保存)"""
+        """
+        翻译 ePub 文件 (支持中断保存)
+        resume=True 时每完成一个章节就写入断点日志，重新运行会跳过已完成的章节；
+        resume=False 丢弃已有日志并从头翻译 (不记录断点)。
+        workspace=True 时结果写入 <输出路径>.workspace/ (以源文件为底本，只保存改动的章节)，
+        不打包 ePub，之后的质检、修补与 apply-fix 直接读写工作区，由 export 生成最终的 ePub。
+        """
         logger.info(f"开始翻译 ePub 文件: {input_path}")
         
         if progress_callback:
             progress_callback(0.0, "准备处理...")
         
-        # 使用临时目录
-        with tempfile.TemporaryDirectory() as temp_dir:
+        checkpoint = EpubCheckpoint(output_path, source_lang, target_lang)
+        if not resume:
+            checkpoint.discard()
+            checkpoint = None
+        elif EpubCheckpoint.exists_for(output_path):
+            logger.info(f"发现断点日志，继续未完成的翻译: {checkpoint.path}")
+        # 块级台账：续译时沿用上次的记录 (续译章节内容不变，台账仍然有效)
+        ledger = (resume and checkpoint is not None and EpubCheckpoint.exists_for(output_path)
+                  and BlockLedger.load(output_path)) or BlockLedger(output_path, source_lang, target_lang)
+        
+        # 直接读写 zip：只读取需要翻译的条目，未改动的条目原样复制
+        container = EpubWorkspace.create(output_path, input_path) if workspace else EpubContainer(input_path)
+        with container:
             try:
-                # 1. 解压
-                if progress_callback: progress_callback(0.05, "解压 ePub 文件...")
-                self._extract_epub(input_path, temp_dir)
-                
-                # 2. 解析
+                # 1. 解析
                 if progress_callback: progress_callback(0.1, "解析 ePub 结构...")
-                epub_info = self._parse_opf(temp_dir)
+                epub_info = self._parse_opf(container)
                 logger.info(f"发现 {len(epub_info.content_files)} 个内容文件")
                 
-                # 3. 翻译元数据
+                # 2. 翻译元数据
                 if progress_callback: progress_callback(0.15, "翻译书籍元数据...")
-                await self._translate_metadata(epub_info, source_lang, target_lang)
+                await self._run_checkpointed(
+                    container, checkpoint, epub_info.opf_path,
+                    lambda: self._translate_metadata(container, epub_info, source_lang, target_lang))
                 
-                # 4. 翻译目录
+                # 3. 翻译目录
                 if epub_info.toc_file:
                     if progress_callback: progress_callback(0.2, "翻译目录...")
-                    await self._translate_toc(epub_info, source_lang, target_lang)
+                    await self._run_checkpointed(
+                        container, checkpoint, epub_info.toc_file,
+                        lambda: self._translate_toc(container, epub_info, source_lang, target_lang))
                 
-                # 5. 翻译内容文件 (核心循环)
+                # 4. 翻译内容文件 (整本书统一调度，章节完成即写回)
                 total_files = len(epub_info.content_files)
                 completed_files = 0
                 stats = {'success': 0, 'failed': 0}
                 
-                async def process_single_file(file_path):
+                def report_progress():
                     nonlocal completed_files
-                    async with self.file_semaphore:
-                        try:
-                            await self.html_processor.process_file(
-                                input_file=file_path,
-                                output_file=file_path,
-                                source_lang=source_lang,
-                                target_lang=target_lang
-                            )
-                            stats['success'] += 1
-                        except Exception as e:
-                            logger.warning(f"翻译文件失败 {os.path.basename(file_path)}: {e}")
-                            stats['failed'] += 1
-                        finally:
-                            completed_files += 1
-                            if progress_callback:
-                                # 进度条范围 0.25 -> 0.95
-                                current_progress = 0.25 + (0.7 * (completed_files / total_files))
-                                progress_callback(current_progress, f"翻译进度 {completed_files}/{total_files}")
-
-                tasks = [process_single_file(f) for f in epub_info.content_files]
-                
-                # 等待所有任务完成
-                await asyncio.gather(*tasks)
+                    completed_files += 1
+                    if progress_callback:
+                        # 进度条范围 0.25 -> 0.95
+                        current_progress = 0.25 + (0.7 * (completed_files / total_files))
+                        progress_callback(current_progress, f"翻译进度 {completed_files}/{total_files}")
+
+                # 断点日志中已完成的章节直接取用，其余交给调度器 (调度器准入章节时才读取内容)
+                pending: List[str] = []
+                for file_path in epub_info.content_files:
+                    done = checkpoint.get(file_path, container.read(file_path)) if checkpoint else None
+                    if done is not None:
+                        container.write(file_path, done)
+                        stats['success'] += 1
+                        report_progress()
+                    else:
+                        pending.append(file_path)
+
+                def on_chapter_done(file_path: str, output_content: str):
+                    container.write(file_path, output_content)
+                    ledger.seal(file_path, container.read(file_path))
+                    if checkpoint:
+                        source, output = container.read_original(file_path), container.read(file_path)
+                        if output != source:
+                            checkpoint.put(file_path, source, output)
+                    stats['success'] += 1
+                    report_progress()
+
+                def on_chapter_failed(file_path: str, error: Exception):
+                    logger.warning(f"翻译文件失败 {posixpath.basename(file_path)}: {error}")
+                    stats['failed'] += 1
+                    report_progress()
+
+                scheduler = BookScheduler(self.html_processor, source_lang, target_lang,
+                                          gate=self.segment_gate, budget=self.budget, ledger=ledger)
+                await scheduler.run(_ChapterTexts(container, pending), on_chapter_done, on_chapter_failed)
                 
-                # 6. 正常打包
+                # 5. 正常打包
                 if progress_callback: progress_callback(0.98, "重新打包 ePub...")
-                self._repack_epub(temp_dir, output_path)
+                self._save(container, output_path, ledger)
+                
+                resumed = checkpoint.stats['resumed'] if checkpoint else 0
+                if checkpoint:
+                    if stats['failed']:
+                        # 保留日志：下次运行只重试失败的章节
+                        checkpoint.close()
+                    else:
+                        checkpoint.discard()
                 
                 if progress_callback: progress_callback(1.0, "完成!")
                 
@@ -126,45 +187,84 @@ class EpubProcessor:
                     'total_files': total_files,
                     'success_count': stats['success'],
                     'failed_count': stats['failed'],
-                    'output_file': output_path
+                    'resumed_count': resumed,
+                    'segment_count': scheduler.stats['segments'],
+                    # 内存：预算内的估算峰值 (多本书共享预算时为全体合计) 与进程峰值 RSS
+                    'peak_payload_mb': scheduler.budget.get_stats()['peak_mb'],
+                    'admission_waves': scheduler.stats['admission_waves'],
+                    'peak_rss_mb': peak_rss_mb(),
+                    # HTML 解析在进程池中进行，工作进程的峰值 RSS 单独统计 (各进程之和)
+                    'peak_worker_rss_mb': worker_peak_rss_mb(),
+                    'ledger': ledger.count(),
+                    'output_file': output_path,
+                    'workspace': workspace
                 }
 
             except asyncio.CancelledError:
                 logger.warning("\n⚠️ 任务被取消！正在保存已完成的进度...")
-                self._repack_epub(temp_dir, output_path)
+                self._save(container, output_path, ledger)
                 logger.info(f"✅ 半成品已保存至: {output_path}")
                 raise
 
             except KeyboardInterrupt:
                 logger.warning("\n⚠️ 检测到用户中断 (Ctrl+C)！正在抢救已翻译的内容...")
-                self._repack_epub(temp_dir, output_path)
+                self._save(container, output_path, ledger)
                 logger.info(f"✅ 半成品已保存至: {output_path}")
                 raise
 
             except Exception as e:
                 logger.error(f"发生错误: {e}，尝试保存现有进度...")
                 try:
-                    self._repack_epub(temp_dir, output_path)
+                    self._save(container, output_path, ledger)
                     logger.info(f"✅ 现有进度已保存至: {output_path}")
                 except:
                     pass
                 raise e
+
+            finally:
+                if checkpoint:
+                    checkpoint.close()
+
+    @staticmethod
+    def _save(container: EpubContainer, output_path: str, ledger: BlockLedger):
+        """写出 ePub (工作区模式下只把改动的条目写入工作区)，并保存与之对应的块级台账"""
+        container.save(output_path)
+        ledger.save()
+
+    async def _run_checkpointed(self, container: EpubContainer, checkpoint: Optional[EpubCheckpoint],
+                                name: str, translate):
+        """
+        执行会改写条目 name 的翻译步骤；断点日志中已有该条目 (源内容相同) 的译文时直接取用，
+        否则执行 translate() 并在条目被改写后立即记录
+        """
+        if checkpoint is None:
+            await self._gated(translate)
+            return
+        source = container.read(name)
+        done = checkpoint.get(name, source)
+        if done is not None:
+            container.write(name, done)
+            return
+        await self._gated(translate)
+        output = container.read(name)
+        if output != source:
+            checkpoint.put(name, source, output)
     
-    def _extract_epub(self, epub_path: str, dest_dir: str):
-        with zipfile.ZipFile(epub_path, 'r') as zip_ref:
-            zip_ref.extractall(dest_dir)
-        if not os.path.exists(os.path.join(dest_dir, 'mimetype')):
-            logger.warning("警告: 未找到 mimetype 文件，此 ePub 可能不标准")
+    async def _gated(self, translate):
+        """元数据 / 目录的请求也占用共享的在途批次额度"""
+        if self.segment_gate is None:
+            return await translate()
+        async with self.segment_gate:
+            return await translate()
     
-    def _parse_opf(self, epub_dir: str) -> EpubInfo:
+    def _parse_opf(self, container: EpubContainer) -> EpubInfo:
         """
         解析 OPF 文件 (增强鲁棒性版本)
-        不再依赖严格的 namespace 匹配，而是搜索标签名
+        不再依赖严格的 namespace 匹配，而是搜索标签名。
+        返回的路径均为 zip 内的条目名。
         """
-        container_path = os.path.join(epub_dir, 'META-INF', 'container.xml')
         try:
-            tree = ET.parse(container_path)
-            root = tree.getroot()
+            root = ET.fromstring(container.read('META-INF/container.xml'))
             
             # [关键修复] 暴力搜索 rootfile 标签，忽略命名空间
             rootfile_elem = None
@@ -183,23 +283,17 @@ class EpubProcessor:
             if not opf_rel_path:
                 raise ValueError("rootfile 标签缺少 full-path 属性")
                 
-            opf_path = os.path.join(epub_dir, opf_rel_path)
-            opf_dir = os.path.dirname(opf_path)
+            opf_path = resolve_href('', opf_rel_path)
+            opf_dir = posixpath.dirname(opf_path)
             
         except Exception as e:
             raise Exception(f"解析 container.xml 失败: {e}")
 
         # 解析 OPF
-        if not os.path.exists(opf_path):
+        if not container.exists(opf_path):
              raise FileNotFoundError(f"找不到 OPF 文件: {opf_path}")
 
-        opf_tree = ET.parse(opf_path)
-        opf_root = opf_tree.getroot()
-        
-        # 不再使用严格的 namespace map
-        # root_tag = opf_root.tag
-        # ns_url = root_tag.split('}')[0].strip('{') if '}' in root_tag else ''
-        # ns_map = {'opf': ns_url} if ns_url else {}
+        opf_root = ET.fromstring(container.read(opf_path))
         
         content_files = []
         toc_file = None
@@ -215,7 +309,7 @@ class EpubProcessor:
                 
                 if not href: continue
                 
-                full_path = os.path.join(opf_dir, href)
+                full_path = resolve_href(opf_dir, href)
                 
                 # 识别 HTML/XHTML 文本
                 if 'html' in media_type.lower() or 'xhtml' in media_type.lower():
@@ -227,6 +321,8 @@ class EpubProcessor:
                     toc_type = 'nav' if properties == 'nav' else 'ncx'
                 
         metadata = self._extract_metadata(opf_root)
+        # 去重 (同一文件在 manifest 中重复登记时只翻译一次)
+        content_files = list(dict.fromkeys(content_files))
         return EpubInfo(opf_path, opf_dir, content_files, toc_file, toc_type, metadata)
     
     def _extract_metadata(self, opf_root) -> Dict[str, str]:
@@ -242,7 +338,8 @@ class EpubProcessor:
                 metadata['description'] = elem.text.strip() if elem.text else ""
         return metadata
     
-    async def _translate_metadata(self, epub_info: EpubInfo, source_lang: str, target_lang: str):
+    async def _translate_metadata(self, container: EpubContainer, epub_info: EpubInfo,
+                                  source_lang: str, target_lang: str):
         if not epub_info.metadata: return
         
         texts_to_trans = []
@@ -258,8 +355,7 @@ class EpubProcessor:
             results = await self.translator.translate_batch(texts_to_trans, source_lang, target_lang)
             
             # 回写需要重新 parse
-            tree = ET.parse(epub_info.opf_path)
-            root = tree.getroot()
+            root = ET.fromstring(container.read(epub_info.opf_path))
             
             # 使用简单的迭代查找来回写，不依赖 namespace
             result_map = dict(zip(keys, results))
@@ -277,23 +373,24 @@ class EpubProcessor:
             ET.register_namespace('dc', "http://purl.org/dc/elements/1.1/")
             ET.register_namespace('opf', "http://www.idpf.org/2007/opf")
                 
-            tree.write(epub_info.opf_path, encoding='utf-8', xml_declaration=True)
+            container.write(epub_info.opf_path, ET.tostring(root, encoding='utf-8', xml_declaration=True))
             
         except Exception as e:
             logger.warning(f"元数据翻译失败: {e}")
 
-    async def _translate_toc(self, epub_info: EpubInfo, source_lang: str, target_lang: str):
+    async def _translate_toc(self, container: EpubContainer, epub_info: EpubInfo,
+                             source_lang: str, target_lang: str):
         if epub_info.toc_type == 'ncx':
-            await self._translate_ncx(epub_info.toc_file, source_lang, target_lang)
+            await self._translate_ncx(container, epub_info.toc_file, source_lang, target_lang)
         elif epub_info.toc_type == 'nav':
-            await self.html_processor.process_file(
-                epub_info.toc_file, epub_info.toc_file, source_lang, target_lang
+            output_content, _ = await self.html_processor.process_content(
+                container.read_text(epub_info.toc_file), source_lang, target_lang
             )
+            container.write(epub_info.toc_file, output_content)
 
-    async def _translate_ncx(self, ncx_path: str, source_lang: str, target_lang: str):
+    async def _translate_ncx(self, container: EpubContainer, ncx_path: str, source_lang: str, target_lang: str):
         try:
-            tree = ET.parse(ncx_path)
-            root = tree.getroot()
+            root = ET.fromstring(container.read(ncx_path))
             
             # 查找所有 navLabel 下的 text，忽略命名空间
             text_elems = []
@@ -310,21 +407,53 @@ class EpubProcessor:
                     if trans_text and trans_text != "[TRANSLATION_FAILED]":
                         elem.text = trans_text
                             
-                tree.write(ncx_path, encoding='utf-8', xml_declaration=True)
+                container.write(ncx_path, ET.tostring(root, encoding='utf-8', xml_declaration=True))
                 logger.info(f"NCX 目录翻译完成")
         except Exception as e:
             logger.warning(f"NCX 目录翻译失败: {e}")
 
-    def _repack_epub(self, source_dir: str, output_path: str):
-        """重新打包 ePub"""
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            mimetype_path = os.path.join(source_dir, 'mimetype')
-            if os.path.exists(mimetype_path):
-                zf.write(mimetype_path, 'mimetype', compress_type=zipfile.ZIP_STORED)
-            
-            for root, _, files in os.walk(source_dir):
-                for f in files:
-                    if f == 'mimetype': continue
-                    full_path = os.path.join(root, f)
-                    arc_name = os.path.relpath(full_path, source_dir)
-                    zf.write(full_path, arc_name)
\ No newline at end of file
+
+async def patch_untranslated(container: EpubContainer, details: List[Dict], translator,
+                             target_lang: str = "zh", ledger: Optional[BlockLedger] = None,
+                             progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """
+    修补质检报告中的漏译 (报告条目来自 EPUBTranslationChecker.check_epub)，只改写容器中的条目，由调用方写出。
+    章节的所有条目都带台账块 ID 时只重新翻译这些块，并更新台账；否则整章以强制模式 (不经过 URL/代码过滤，已是目标语言的块仍跳过) 重新翻译。
+    progress_callback(已完成章节数, 章节总数) 在每个章节完成后调用。
+    返回 {'blocks': 块级修补的块数, 'files': 整章重译的章节数}
+    """
+    by_file: Dict[str, List[Dict]] = {}
+    for item in details:
+        by_file.setdefault(item['file'], []).append(item)
+    source_lang = ledger.source_lang if ledger is not None else None
+    block_processor = HTMLProcessor(translator)
+    force_processor = HTMLProcessor(translator, force=True)
+    stats = {'blocks': 0, 'files': 0}
+
+    targets = {name: items for name, items in by_file.items() if container.exists(name)}
+    for name in by_file.keys() - targets.keys():
+        logger.warning(f"文件找不到: {name}")
+    completed = [0]
+
+    async def patch_file(rel_path: str, items: List[Dict]):
+        html = container.read_text(rel_path)
+        if ledger is not None and all(item.get('block_id') is not None for item in items):
+            output, outcomes = await block_processor.patch_blocks(
+                html, {item['block_id']: item['block_hash'] for item in items}, source_lang, target_lang)
+            container.write(rel_path, output)
+            ledger.update(rel_path, outcomes)
+            ledger.seal(rel_path, container.read(rel_path))
+            stats['blocks'] += len(items)
+        else:
+            output, _ = await force_processor.process_content(html, source_lang, target_lang)
+            container.write(rel_path, output)
+            if ledger is not None:
+                # 整章重译后块结果未知，该章节以后退回全量扫描
+                ledger.invalidate(rel_path)
+            stats['files'] += 1
+        completed[0] += 1
+        if progress_callback:
+            progress_callback(completed[0], len(targets))
+
+    await asyncio.gather(*(patch_file(name, items) for name, items in targets.items()))
+    return stats
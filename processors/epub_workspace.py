@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+EPUB 持久工作区 (Workspace，可选)
+默认每一步 (翻译、每轮修补、apply-fix) 都把整本书重新打包一次。开启工作区后，
+书的状态保存在输出文件旁的 <输出路径>.workspace/ 目录：
+- 底本：一个未改动的 zip (翻译时为源文件，导出后为导出的 ePub)，未改动的条目始终从这里读取
+- objects/：改动过的条目按内容 SHA-256 存放，相同内容只存一份，再次写入相同内容不产生磁盘写入
+- manifest.json：{条目名: [内容哈希, CRC32, 长度]}，以及底本与已导出 ePub 的指纹 (大小 + 修改时间)
+翻译、质检、修补与 apply-fix 直接读写工作区，每一步只写入改动的章节；
+最终的 .epub 只在导出 (main.py export) 时打包一次。
+ePub 在工作区之外被改动 (或底本变化) 后工作区自动失效，退回直接读写 ePub；
+ePub 尚未导出时失效的工作区不算书存在 (book_exists)，打开时报错。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from .epub_container import EpubContainer
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_SUFFIX = ".workspace"
+MANIFEST = "manifest.json"
+OBJECTS = "objects"
+
+
+def workspace_enabled() -> bool:
+    """是否为新的书创建工作区 (EPUB_WORKSPACE=1 或 --workspace)；已有的工作区总会被使用"""
+    return os.getenv('EPUB_WORKSPACE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _fingerprint(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class EpubWorkspace(EpubContainer):
+    """
+    以工作区为单位读写一本书，接口与 EpubContainer 相同：
+    save() 把暂存的修改写入工作区；save(其他路径) 导出 ePub 到该路径；export() 导出到 ePub 本身的路径。
+    """
+
+    VERSION = 1
+
+    def __init__(self, epub_path: Union[str, os.PathLike], manifest: dict):
+        self.epub_path = os.fspath(epub_path)
+        self.dir = self.path_for(self.epub_path)
+        self._manifest = manifest
+        super().__init__(self._resolve(manifest['base']['path']))
+        # 已写入工作区的条目 {条目名: (内容哈希, CRC32, 长度)}
+        self._stored: Dict[str, Tuple[str, int, int]] = {
+            name: tuple(entry) for name, entry in manifest['entries'].items()}
+        # 上一个工作区留下、尚未回收的内容对象 (见 create)
+        self._orphans = set()
+
+    @staticmethod
+    def path_for(epub_path: Union[str, os.PathLike]) -> str:
+        return os.fspath(epub_path) + WORKSPACE_SUFFIX
+
+    @classmethod
+    def exists_for(cls, epub_path: Union[str, os.PathLike]) -> bool:
+        return os.path.exists(os.path.join(cls.path_for(epub_path), MANIFEST))
+
+    @classmethod
+    def create(cls, epub_path: Union[str, os.PathLike], base_path: Union[str, os.PathLike, None] = None
+               ) -> 'EpubWorkspace':
+        """
+        以 base_path (默认为 ePub 本身) 为底本新建工作区，取代已有的清单：新工作区从底本的内容开始。
+        翻译时底本是源文件，ePub 此时可能还不存在。
+        已有的内容对象留到第一次提交时才回收：重新翻译 (断点续译) 写回与上次相同的章节时，对象已存在，不再写盘。
+        """
+        epub_path = os.fspath(epub_path)
+        base_path = os.fspath(base_path) if base_path is not None else epub_path
+        workspace_dir = cls.path_for(epub_path)
+        os.makedirs(os.path.join(workspace_dir, OBJECTS), exist_ok=True)
+        manifest = {
+            'version': cls.VERSION,
+            'base': {'path': cls._relative(workspace_dir, base_path), 'stat': _fingerprint(base_path)},
+            # 现有的 ePub 被工作区取代，记下它的指纹：之后它再被改动才说明是工作区之外的修改
+            'epub': _fingerprint(epub_path),
+            'entries': {},
+        }
+        workspace = cls(epub_path, manifest)
+        workspace._write_manifest()
+        workspace._orphans = set(os.listdir(os.path.join(workspace_dir, OBJECTS)))
+        return workspace
+
+    @classmethod
+    def _load_manifest(cls, epub_path: str) -> Optional[dict]:
+        """读取并校验工作区清单；不存在、格式不符或已失效时返回 None"""
+        manifest_path = os.path.join(cls.path_for(epub_path), MANIFEST)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != cls.VERSION:
+                return None
+            base = cls._resolve_from(cls.path_for(epub_path), manifest['base']['path'])
+            if _fingerprint(base) != manifest['base']['stat']:
+                logger.warning(f"工作区的底本已变化，忽略工作区: {base}")
+                return None
+            current = _fingerprint(epub_path)
+            if current is not None and current != manifest['epub']:
+                logger.warning(f"ePub 在工作区之外被修改，忽略工作区: {epub_path}")
+                return None
+            return manifest
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"工作区无法读取，忽略: {manifest_path} ({e})")
+            return None
+
+    @classmethod
+    def is_valid(cls, epub_path: Union[str, os.PathLike]) -> bool:
+        """工作区存在且仍然有效 (与 open 的判断相同，不打开底本)"""
+        return cls._load_manifest(os.fspath(epub_path)) is not None
+
+    @classmethod
+    def open(cls, epub_path: Union[str, os.PathLike]) -> Optional['EpubWorkspace']:
+        """打开 ePub 对应的工作区；不存在、格式不符或已失效时返回 None"""
+        epub_path = os.fspath(epub_path)
+        manifest = cls._load_manifest(epub_path)
+        return cls(epub_path, manifest) if manifest is not None else None
+
+    # ==================== 路径 ====================
+
+    @staticmethod
+    def _relative(workspace_dir: str, path: str) -> str:
+        """底本路径相对工作区保存，整个目录移动后仍然有效"""
+        try:
+            return os.path.relpath(os.path.abspath(path), os.path.abspath(workspace_dir))
+        except ValueError:  # Windows 上跨盘符
+            return os.path.abspath(path)
+
+    @staticmethod
+    def _resolve_from(workspace_dir: str, path: str) -> str:
+        return os.path.normpath(os.path.join(workspace_dir, path))
+
+    def _resolve(self, path: str) -> str:
+        return self._resolve_from(self.dir, path)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.dir, OBJECTS, digest)
+
+    # ==================== 读取 ====================
+
+    def namelist(self) -> List[str]:
+        names = super().namelist()
+        seen = set(names)
+        return names + [name for name in self._stored if name not in seen]
+
+    def exists(self, name: str) -> bool:
+        return name in self._stored or super().exists(name)
+
+    def read(self, name: str) -> bytes:
+        if name in self._modified or name not in self._stored:
+            return super().read(name)
+        with open(self._object_path(self._stored[name][0]), 'rb') as f:
+            return f.read()
+
+    def entry_fingerprint(self, name: str) -> Tuple[int, int]:
+        if name in self._stored and name not in self._modified:
+            return self._stored[name][1:]
+        return super().entry_fingerprint(name)
+
+    @property
+    def stored_names(self) -> List[str]:
+        """已写入工作区、与底本不同的条目"""
+        return list(self._stored)
+
+    # ==================== 写入 ====================
+
+    def save(self, output_path: Optional[Union[str, os.PathLike]] = None):
+        """output_path 省略或为 ePub 本身时写入工作区 (不打包)，否则导出 ePub 到该路径"""
+        if output_path is not None and os.path.abspath(output_path) != os.path.abspath(self.epub_path):
+            self.export(output_path)
+        else:
+            self.commit()
+
+    def commit(self):
+        """把暂存的修改写入工作区：每个改动的条目按内容哈希写一次，清单原子替换"""
+        if not self._modified:
+            return
+        replaced = set()
+        for name, data in self._modified.items():
+            info = self._infos.get(name)
+            crc = zlib.crc32(data)
+            if info is not None and (info.CRC, info.file_size) == (crc, len(data)) and self._zip.read(name) == data:
+                # 改回了底本的内容，不再单独保存
+                entry = self._stored.pop(name, None)
+            else:
+                digest = hashlib.sha256(data).hexdigest()
+                object_path = self._object_path(digest)
+                if not os.path.exists(object_path):
+                    tmp_path = object_path + ".tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, object_path)
+                entry = self._stored.get(name)
+                self._stored[name] = (digest, crc, len(data))
+            if entry is not None:
+                replaced.add(entry[0])
+        self._modified.clear()
+        self._write_manifest()
+        self._collect_garbage(replaced | self._orphans)
+        self._orphans = set()
+
+    def export(self, output_path: Optional[Union[str, os.PathLike]] = None):
+        """
+        打包出 ePub：未改动的条目从底本原样复制，工作区中的条目重新压缩。
+        导出到 ePub 本身时先写入暂存的修改，之后工作区改以导出的文件为底本，objects/ 清空；
+        导出到其他路径时与 EpubContainer.save 相同，暂存的修改只写入导出的文件。
+        """
+        target = os.fspath(output_path) if output_path is not None else self.epub_path
+        in_place = os.path.abspath(target) == os.path.abspath(self.epub_path)
+        if in_place:
+            self.commit()
+        pending = self._modified
+        overlay = {name: self.read(name) for name in self._stored if name not in pending}
+        self._modified = {**overlay, **pending}
+        try:
+            super().save(target)
+        finally:
+            self._modified = pending
+        if in_place:
+            self._rebase(target)
+
+    def _rebase(self, base_path: str):
+        self._zip.close()
+        replaced = {entry[0] for entry in self._stored.values()}
+        self._manifest = {
+            'version': self.VERSION,
+            'base': {'path': self._relative(self.dir, base_path), 'stat': _fingerprint(base_path)},
+            'epub': _fingerprint(self.epub_path),
+            'entries': {},
+        }
+        super().__init__(base_path)
+        self._stored = {}
+        self._write_manifest()
+        self._collect_garbage(replaced | self._orphans)
+        self._orphans = set()
+
+    def _write_manifest(self):
+        self._manifest['entries'] = {name: list(entry) for name, entry in self._stored.items()}
+        manifest_path = os.path.join(self.dir, MANIFEST)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, manifest_path)
+
+    def _collect_garbage(self, digests):
+        """删除不再被任何条目引用的内容对象"""
+        live = {entry[0] for entry in self._stored.values()}
+        for digest in set(digests) - live:
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def discard(self):
+        """删除工作区 (不影响 ePub 与底本)"""
+        self.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def book_exists(epub_path: Union[str, os.PathLike]) -> bool:
+    """ePub 文件存在，或其工作区存在且有效 (失效的工作区不能代替 ePub)"""
+    return os.path.exists(epub_path) or EpubWorkspace.is_valid(epub_path)
+
+
+def open_epub(epub_path: Union[str, os.PathLike], create: Optional[bool] = None) -> EpubContainer:
+    """
+    打开一本书用于读写：有效的工作区优先；没有工作区时，create (默认取 EPUB_WORKSPACE) 为真则以 ePub 为底本新建，
+    否则直接读写 ePub 本身 (EpubContainer)。两者的 save() 都把修改落盘。
+    ePub 不存在、只剩失效的工作区时抛出 FileNotFoundError。
+    """
+    workspace = EpubWorkspace.open(epub_path)
+    if workspace is not None:
+        return workspace
+    if not os.path.exists(epub_path) and EpubWorkspace.exists_for(epub_path):
+        raise FileNotFoundError(
+            f"ePub 尚未导出，且工作区已失效 (底本被改动或删除): {EpubWorkspace.path_for(epub_path)}")
+    if create if create is not None else workspace_enabled():
+        return EpubWorkspace.create(epub_path)
+    return EpubContainer(epub_path)
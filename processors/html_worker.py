@@ -4,23 +4,40 @@ HTML处理器 - 块级合并翻译策略 (Block-Level Collapse Strategy)
 解决 ePub 中标签(如 pagebreak)切断句子导致翻译质量差或漏译的问题。
 """
 
+import asyncio
+import atexit
+import multiprocessing
+import os
 import re
 import logging
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup, NavigableString
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PreformattedString
 
 # 适配你的项目导入路径
 from core.client import AsyncTranslator
 from core.token_tracker import TokenTracker
 from core.exceptions import FileProcessingError
+from . import block_ledger, lxml_engine
+from .block_ledger import LedgerBlock, block_hash
+from .memory_budget import peak_rss_mb
 
 logger = logging.getLogger(__name__)
 
 class HTMLProcessor:
     """HTML文件翻译处理器"""
     
-    def __init__(self, translator: AsyncTranslator):
+    def __init__(self, translator: AsyncTranslator, workers: Optional[int] = None, engine: Optional[str] = None,
+                 force: bool = False):
         self.translator = translator
+        # 强制模式 (漏译修补)：只关闭 URL/代码过滤，class 黑名单与已是目标语言的跳过仍然生效
+        self.force = force
+        # DOM 引擎: lxml (默认，单次遍历选块 + 原地回填) 或 bs4 (BeautifulSoup)，可用环境变量 HTML_ENGINE 指定
+        self.engine = lxml_engine.resolve_engine(engine)
+        # CPU 阶段 (解析/回填/序列化) 的进程数，HTML_WORKERS=0 表示不用进程池 (改用线程)
+        self.workers = workers if workers is not None else int(os.getenv('HTML_WORKERS', os.cpu_count() or 1))
         # 初始化 TokenTracker 用于估算长度
         self.token_tracker = TokenTracker()
         
@@ -44,9 +61,8 @@ class HTMLProcessor:
         """
         获取单个块的最大 Token 限制。
         
-        [优化] 现在采用"乐观尝试 + 错误降级"策略：
-        - 不再根据 seed-translation 的限制预先切分
-        - 使用宽松的限制值，如果真的超限，client.py 会自动降级到普通模型
+        [优化] 不再根据 seed-translation 的限制预先切分：
+        - 使用宽松的限制值，超过 seed-translation 上限的段落由 client.py 按长度直接路由到 Chat 模型
         - 这个值主要作为兜底，防止超级长的段落导致所有模型都失败
         """
         # 使用 8000 作为兜底值 (普通模型 128k context 绰绰有余)
@@ -116,65 +132,362 @@ class HTMLProcessor:
             
         return chunks
 
-    async def _process_blocks(self, soup: BeautifulSoup, source_lang: str, target_lang: str) -> int:
+    def _collect_leaf_blocks(self, soup: BeautifulSoup) -> List[Tag]:
         """
-        核心逻辑：提取块 -> 过滤 -> 翻译 -> 回填
+        单次线性遍历 DOM，按文档顺序返回"最底层"的块级元素 (内部不再包含块级标签)，
+        并排除位于黑名单标签 (script/pre/code...) 内部的块。
+
+        用显式栈做后序遍历：进入元素时把"是否在排除标签内"的标记传给子元素，
+        离开元素时把"子树中是否出现过块级标签"汇报给父元素。
+        每个节点只访问一次，深层嵌套的 div 也不会触发递归深度限制。
         """
-        # 1. 提取所有待翻译块
-        # 我们只提取"最底层"的块级元素，避免重复翻译 (例如 div 包含 p，只翻 p)
-        all_blocks = soup.find_all(self.block_tags)
-        target_blocks = [] # List of (tag_object, text_content)
-        
-        for block in all_blocks:
-            # 规则1: 如果这个块内部还有其他块级标签，跳过它（让子元素去处理）
-            if block.find(self.block_tags):
-                continue
-            
-            # 规则2: 排除黑名单标签的子孙
-            if any(parent.name in self.exclude_tags for parent in block.parents):
+        leaves = []
+        # 与当前路径上的元素一一对应：该元素的子树中是否已出现块级标签
+        has_block_below: List[bool] = []
+        stack = [(soup, False, False)]  # (元素, 是否在排除标签内, 是否为离开事件)
+        while stack:
+            node, excluded, leaving = stack.pop()
+            if leaving:
+                contains_block = has_block_below.pop()
+                is_block = node.name in self.block_tags
+                if is_block and not contains_block and not excluded:
+                    leaves.append(node)
+                if has_block_below and (is_block or contains_block):
+                    has_block_below[-1] = True
                 continue
-                
-            # 规则3: 检查 class 黑名单
-            if any(cls in block.get('class', []) for cls in ['no-translate', 'code']):
+
+            has_block_below.append(False)
+            stack.append((node, excluded, True))
+            child_excluded = excluded or node.name in self.exclude_tags
+            for child in reversed(node.contents):
+                if isinstance(child, Tag):
+                    stack.append((child, child_excluded, False))
+        # 叶子块互不嵌套，离开顺序即文档顺序
+        return leaves
+
+    def _iter_leaf_blocks(self, document):
+        """按文档顺序产出 (块元素, class 列表, 合并后的纯文本)，兼容 lxml 文档与 BeautifulSoup"""
+        if isinstance(document, lxml_engine.LxmlDocument):
+            for block in lxml_engine.collect_blocks(document.root, self.block_tags, self.exclude_tags):
+                yield block, lxml_engine.get_classes(block), lxml_engine.get_text(block)
+        else:
+            for block in self._collect_leaf_blocks(document):
+                # separator=' ' 避免单词粘连
+                yield block, block.get('class', []), block.get_text(" ", strip=True)
+
+    def _collect_loose_texts(self, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+        """
+        非叶子块自身直接拥有的文本 (不在子块、排除标签内)，与 lxml_engine.collect_loose_texts 相同。
+        叶子块选择不会翻译这部分文本，台账据此标记章节需要由质检全量扫描。
+        """
+        owners = []   # [标签名, 文本片段, 是否包含块]，按块的文档顺序
+        stack = [(soup, None, False)]  # (节点, 所属块记录, 是否在排除标签内)
+        while stack:
+            node, owner, excluded = stack.pop()
+            if not isinstance(node, Tag):
+                # 注释、CDATA、DOCTYPE 等不算正文
+                if owner is not None and not excluded and not isinstance(node, PreformattedString):
+                    owner[1].append(str(node))
                 continue
+            if node.name in self.block_tags:
+                if owner is not None:
+                    owner[2] = True
+                if not excluded:
+                    owner = [node.name, [], False]
+                    owners.append(owner)
+            excluded = excluded or node.name in self.exclude_tags
+            for child in reversed(node.contents):
+                stack.append((child, owner, excluded))
+        loose = []
+        for name, parts, has_block in owners:
+            text = " ".join(part.strip() for part in parts if part.strip())
+            if has_block and text:
+                loose.append((name, text))
+        return loose
 
-            # 获取合并后的纯文本 (separator=' ' 避免单词粘连)
-            full_text = block.get_text(" ", strip=True)
-            
+    def _iter_loose_texts(self, document) -> List[Tuple[str, str]]:
+        if isinstance(document, lxml_engine.LxmlDocument):
+            return lxml_engine.collect_loose_texts(document.root, self.block_tags, self.exclude_tags)
+        return self._collect_loose_texts(document)
+
+    def _scan_blocks(self, document, target_lang: str):
+        """
+        按文档顺序产出 (块 ID, 块元素, 合并后的纯文本, 跳过原因)，跳过原因为 None 表示需要翻译。
+        块 ID 是块在叶子块序列中的序号 (含空块)，回填不改变结构，翻译前后保持一致。空块不产出。
+        """
+        # 规则1/2: 只取最底层的块 (div 包含 p 时只翻 p)，并排除黑名单标签的子孙
+        for block_id, (block, classes, full_text) in enumerate(self._iter_leaf_blocks(document)):
+            # 规则3: 检查 class 黑名单
+            if any(cls in classes for cls in ['no-translate', 'code']):
+                reason = block_ledger.SKIP_CLASS
             # 规则4: 文本内容过滤
-            if not full_text: continue
-            if self._is_url_or_code(full_text): continue
-            
+            elif not full_text:
+                continue
+            elif not self.force and self._is_url_or_code(full_text):
+                reason = block_ledger.SKIP_FILTER
             # [关键] 只有当目标是中文，且文本已是中文时才跳过
             # 如果目标是英文(比如汉译英)，则不能跳过中文
-            if target_lang.startswith('zh') and self._is_chinese_text(full_text):
-                continue
+            elif target_lang.startswith('zh') and self._is_chinese_text(full_text):
+                reason = block_ledger.SKIP_TARGET
+            else:
+                reason = None
+            if full_text:
+                yield block_id, block, full_text, reason
 
-            target_blocks.append((block, full_text))
+    def _extract_target_blocks(self, document, target_lang: str) -> List[tuple]:
+        """提取待翻译块，返回 [(块元素, 合并后的纯文本)]"""
+        return [(block, text) for _, block, text, reason in self._scan_blocks(document, target_lang) if reason is None]
 
-        if not target_blocks:
-            logger.info("当前文件没有需要翻译的文本块")
-            return 0
+    @staticmethod
+    def _tag_name(block) -> str:
+        return lxml_engine.local_name(block) if not isinstance(block, Tag) else block.name
 
-        logger.info(f"提取到 {len(target_blocks)} 个文本段落，准备翻译...")
+    def _set_block_text(self, document, block, text: str):
+        """把译文写入块：第一个文本节点放译文，其余清空 (保留标签结构)"""
+        if isinstance(document, lxml_engine.LxmlDocument):
+            lxml_engine.set_text(block, text)
+            return
 
-        # 2. 准备发送给 API (处理超长拆分)
-        # map: batch_index -> (original_block_index, is_part_of_split)
-        # 这里为了简化，我们先尝试不拆分直接发，因为前面调大了 limit。
-        # 如果真的遇到超长，_split_text 会处理，但回填逻辑会变复杂。
-        # 鉴于 doubao-seed 不支持 batch，我们依靠 AsyncTranslator 的并发
+        # [核心操作] 
+        # 1. 找到块内所有文本节点
+        text_nodes = [node for node in block.descendants if isinstance(node, NavigableString)]
         
+        if not text_nodes:
+            # 如果只有空标签，直接设置 string
+            block.string = text
+        else:
+            # 2. 把翻译结果塞给第一个节点
+            text_nodes[0].replace_with(text)
+            # 3. 清空后续节点 (保留标签结构)
+            for node in text_nodes[1:]:
+                node.replace_with("")
+
+    def _serialize(self, document, html_content: str) -> str:
+        if isinstance(document, lxml_engine.LxmlDocument):
+            # 未改动的文档原样返回；XML 声明 / DOCTYPE 按原文保留
+            return document.serialize()
+
+        output_content = str(document)
+        # [修复] 提取 XML 声明，只有当输出内容不以 XML 声明开头时，才添加
+        xml_decl_match = re.match(r'^<\?xml.*?\?>', html_content)
+        if xml_decl_match and not output_content.strip().startswith('<?xml'):
+            output_content = xml_decl_match.group(0) + '\n' + output_content
+        return output_content
+
+    # ==================== CPU 阶段 (在进程池中执行) ====================
+
+    def _parse_document(self, html_content: str):
+        if self.engine == "lxml":
+            try:
+                return lxml_engine.parse_document(html_content)
+            except lxml_engine.DocumentTooDeepError:
+                # html.parser 没有嵌套深度上限，遍历也是迭代式的
+                logger.debug("文档嵌套过深，改用 BeautifulSoup (html.parser) 解析")
+                return BeautifulSoup(html_content, 'html.parser')
+        # 使用 lxml 容错能力更强，如果没有则 fallback
+        try:
+            return BeautifulSoup(html_content, 'lxml')
+        except:
+            return BeautifulSoup(html_content, 'html.parser')
+
+    def extract_segments(self, html_content: str, target_lang: str) -> List[List[str]]:
+        """
+        [提取阶段] 解析文档并返回每个待翻译块的文本片段 (超长块已拆分)。
+        只返回字符串列表，便于在进程间传递。
+        """
+        document = self._parse_document(html_content)
+        return [self._split_text(text) for _, text in self._extract_target_blocks(document, target_lang)]
+
+    def extract_blocks(self, html_content: str, target_lang: str) -> Tuple[List[List[str]], List[LedgerBlock]]:
+        """
+        [提取阶段 + 台账] 返回 (待翻译块的文本片段, 所有非空块的台账条目)。
+        待翻译块的条目结果暂记为 TRANSLATED，由调用方按实际翻译结果修正；
+        被跳过的块记录原因，URL/代码与 class 黑名单跳过的块附带原文供质检判定；
+        非叶子块 (如 <div>文本<p>…</p></div>) 自身的文本以 LOOSE 条目 (ID 为 -1) 附带原文记录。
+        """
+        document = self._parse_document(html_content)
+        block_chunks, blocks = [], []
+        for block_id, block, text, reason in self._scan_blocks(document, target_lang):
+            tag = self._tag_name(block)
+            if reason is None:
+                block_chunks.append(self._split_text(text))
+                blocks.append(LedgerBlock(block_id, tag, block_hash(text), block_ledger.TRANSLATED))
+            else:
+                keep_text = text if reason != block_ledger.SKIP_TARGET else None
+                blocks.append(LedgerBlock(block_id, tag, block_hash(text), block_ledger.SKIPPED, reason, keep_text))
+        # 非叶子块自身的文本不会被翻译：记为 LOOSE，质检据此决定是否退回全量扫描
+        for tag, text in self._iter_loose_texts(document):
+            blocks.append(LedgerBlock(-1, tag, block_hash(text), block_ledger.LOOSE, None, text))
+        return block_chunks, blocks
+
+    def refill_segments(self, html_content: str, target_lang: str,
+                        translations: List[Optional[str]]) -> Tuple[str, int]:
+        """
+        [回填阶段] 重新解析同一份文档 (块提取是确定性的，与提取阶段一一对应)，
+        把每个块的译文写回 DOM 并序列化，返回 (输出内容, 更新的块数)。
+        translations[i] 为 None 表示该块不改动。
+        """
+        document = self._parse_document(html_content)
+        target_blocks = self._extract_target_blocks(document, target_lang)
+        if translations and len(translations) != len(target_blocks):
+            raise FileProcessingError(f"回填块数不一致: 提取 {len(translations)} 个, 回填时 {len(target_blocks)} 个")
+
+        success_count = 0
+        for (block, original_text), final_translation in zip(target_blocks, translations):
+            # 简单防愚检查：如果翻译结果和原文一样，或者变为空，就不动 DOM
+            if not final_translation or final_translation == original_text:
+                continue
+
+            success_count += 1
+            self._set_block_text(document, block, final_translation)
+
+        if isinstance(document, lxml_engine.LxmlDocument):
+            document.modified = success_count > 0
+        return self._serialize(document, html_content), success_count
+
+    def collect_blocks(self, html_content: str, block_ids: List[int]) -> Dict[int, str]:
+        """[修补阶段] 按块 ID 取出块的当前文本"""
+        wanted = set(block_ids)
+        document = self._parse_document(html_content)
+        return {block_id: text for block_id, (_, _, text) in enumerate(self._iter_leaf_blocks(document))
+                if block_id in wanted}
+
+    def refill_blocks(self, html_content: str, translations: Dict[int, str]) -> str:
+        """[修补阶段] 按块 ID 写回译文并序列化"""
+        document = self._parse_document(html_content)
+        modified = False
+        for block_id, (block, _, _) in enumerate(self._iter_leaf_blocks(document)):
+            if block_id in translations:
+                self._set_block_text(document, block, translations[block_id])
+                modified = True
+        if isinstance(document, lxml_engine.LxmlDocument):
+            document.modified = modified
+        return self._serialize(document, html_content)
+
+    def apply_fixes(self, html_content: str, fixes: List[Dict[str, Any]]) -> Tuple[str, List[bool]]:
+        """
+        [人工译文回填] fixes 为 [{'tag', 'original', 'translation', 可选 'block_id' / 'block_hash'}]，
+        返回 (输出内容, 每条是否回填成功)。先一次遍历文档建立索引，再逐条定位，不再逐条搜索整个文档：
+        1. 带块 ID 且该块原文哈希一致：直接定位到该叶子块
+        2. 按 (标签, 空白归一化后的文本) 精确匹配文档顺序中第一个未用过的元素
+        3. 仍未命中时退回包含匹配 (原文是元素文本的一部分)
+        定位到的元素写入前会核对当前文本 (其子孙已被改写时不再匹配)，与逐条搜索的结果一致。
+        """
+        document = self._parse_document(html_content)
+        is_lxml = isinstance(document, lxml_engine.LxmlDocument)
+
+        def text_of(element) -> str:
+            return lxml_engine.get_text(element) if is_lxml else element.get_text(" ", strip=True)
+
+        def normalize(text: str) -> str:
+            return " ".join(text.split())
+
+        tags = {fix['tag'].lower() for fix in fixes}
+        elements = (lxml_engine.iter_tags(document, tags) if is_lxml
+                    else ((element.name, element) for element in document.find_all(list(tags))))
+        by_text: Dict[Tuple[str, str], List[Any]] = {}
+        by_tag: Dict[str, List[Tuple[Any, str]]] = {}
+        for tag, element in elements:
+            text = normalize(text_of(element))
+            by_text.setdefault((tag, text), []).append(element)
+            by_tag.setdefault(tag, []).append((element, text))
+        for candidates in by_text.values():
+            candidates.reverse()  # 从尾部弹出即文档顺序
+
+        leaf_blocks = None
+        if any(fix.get('block_id') is not None for fix in fixes):
+            leaf_blocks = [block for block, _, _ in self._iter_leaf_blocks(document)]
+
+        used = set()
+
+        def still_matches(element, original: str) -> bool:
+            text = normalize(text_of(element))
+            return text == original or original in text
+
+        def locate(fix) -> Optional[Any]:
+            tag, original = fix['tag'].lower(), normalize(fix['original'])
+            block_id = fix.get('block_id')
+            if leaf_blocks is not None and block_id is not None and 0 <= block_id < len(leaf_blocks):
+                block = leaf_blocks[block_id]
+                if id(block) not in used and block_hash(text_of(block)) == fix.get('block_hash'):
+                    return block
+            candidates = by_text.get((tag, original), [])
+            while candidates:
+                element = candidates.pop()
+                if id(element) not in used and still_matches(element, original):
+                    return element
+            for element, text in by_tag.get(tag, []):
+                if id(element) not in used and original in text and still_matches(element, original):
+                    return element
+            return None
+
+        applied = []
+        for fix in fixes:
+            element = locate(fix)
+            applied.append(element is not None)
+            if element is None:
+                continue
+            used.add(id(element))
+            if is_lxml:
+                lxml_engine.replace_content(element, fix['translation'])
+            else:
+                element.clear()
+                element.append(fix['translation'])
+
+        if not any(applied):
+            return html_content, applied
+        if is_lxml:
+            document.modified = True
+        return self._serialize(document, html_content), applied
+
+    async def apply_fixes_content(self, html_content: str, fixes: List[Dict[str, Any]]) -> Tuple[str, List[bool]]:
+        """在进程池中执行人工译文回填 (apply_fixes)"""
+        return await self._run_stage(_apply_fixes_stage, self.engine, html_content, fixes)
+
+    async def _run_stage(self, func, *args):
+        """在进程池中执行 CPU 阶段；进程池不可用时退回线程，避免阻塞事件循环"""
+        pool = _get_stage_pool(self.workers)
+        if pool is not None:
+            try:
+                result, pid, rss = await asyncio.get_running_loop().run_in_executor(pool, _tracked_stage, func, *args)
+                _worker_peaks[pid] = rss
+                return result
+            except BrokenProcessPool:
+                logger.warning("⚠️ HTML 进程池已损坏，改为线程执行")
+                _disable_stage_pool()
+        return await asyncio.to_thread(func, *args)
+
+    async def extract_content(self, html_content: str, target_lang: str) -> List[List[str]]:
+        """在进程池中执行提取阶段 (extract_segments)"""
+        return await self._run_stage(_extract_stage, self.engine, self.force, html_content, target_lang)
+
+    async def extract_content_blocks(self, html_content: str,
+                                     target_lang: str) -> Tuple[List[List[str]], List[LedgerBlock]]:
+        """在进程池中执行带台账的提取阶段 (extract_blocks)"""
+        return await self._run_stage(_extract_blocks_stage, self.engine, self.force, html_content, target_lang)
+
+    async def refill_content(self, html_content: str, target_lang: str,
+                             translations: List[Optional[str]]) -> Tuple[str, int]:
+        """在进程池中执行回填阶段 (refill_segments)"""
+        return await self._run_stage(_refill_stage, self.engine, self.force, html_content, target_lang, translations)
+
+    # ==================== 网络阶段 (事件循环) ====================
+
+    async def _translate_segments(self, block_chunks: List[List[str]], source_lang: str,
+                                  target_lang: str, failed_blocks: Optional[set] = None) -> List[Optional[str]]:
+        """
+        翻译所有块的文本片段，返回每个块合并后的译文
+        failed_blocks 不为 None 时，收集有片段翻译失败的块下标
+        """
         # 扁平化处理：如果一个块被拆分，会有多个 request
         requests_map = [] # List of (block_index, text_chunk)
-        
-        for i, (block, text) in enumerate(target_blocks):
-            chunks = self._split_text(text)
+        for i, chunks in enumerate(block_chunks):
             for chunk in chunks:
                 requests_map.append((i, chunk))
         
         texts_to_send = [item[1] for item in requests_map]
         
-        # 3. 调用 API (并发)
+        # 调用 API (并发)
         try:
             # 调用你的 client.py 里的 translate_batch (它内部实现了 semaphore 并发)
             results = await self.translator.translate_batch(
@@ -184,11 +497,12 @@ class HTMLProcessor:
             )
         except Exception as e:
             logger.error(f"API 请求严重错误: {e}")
-            return 0
+            if failed_blocks is not None:
+                failed_blocks.update(range(len(block_chunks)))
+            return [None] * len(block_chunks)
 
-        # 4. 重新组装结果并回填 (Collapse Strategy)
-        # 先把结果聚合回 block
-        block_translations = {i: [] for i in range(len(target_blocks))}
+        # 重新组装结果 (Collapse Strategy)：先把结果聚合回 block
+        block_translations = {i: [] for i in range(len(block_chunks))}
         
         for idx, result in enumerate(results):
             block_idx = requests_map[idx][0]
@@ -198,73 +512,87 @@ class HTMLProcessor:
                 logger.warning(f"段落翻译失败: {texts_to_send[idx][:30]}...")
                 # 失败时回退到原文 chunk
                 block_translations[block_idx].append(texts_to_send[idx])
+                if failed_blocks is not None:
+                    failed_blocks.add(block_idx)
             else:
                 block_translations[block_idx].append(result)
 
-        # 5. 执行回填
-        success_count = 0
-        for i, (block, original_text) in enumerate(target_blocks):
-            chunks = block_translations.get(i, [])
-            if not chunks: continue
-            
-            # 合并拆分的翻译结果
-            final_translation = " ".join(chunks)
-            
-            # 简单防愚检查：如果翻译结果和原文一样，或者变为空，就不动 DOM
-            if final_translation == original_text:
-                continue
+        # 合并拆分的翻译结果
+        return [" ".join(block_translations[i]) if block_translations[i] else None for i in range(len(block_chunks))]
 
-            # [核心操作] 
-            # 1. 找到块内所有文本节点
-            text_nodes = [node for node in block.descendants if isinstance(node, NavigableString)]
-            
-            if not text_nodes:
-                # 如果只有空标签，直接设置 string
-                block.string = final_translation
+    async def process_content(self, html_content: str, source_lang: Optional[str] = None,
+                              target_lang: str = "zh") -> Tuple[str, int]:
+        """
+        翻译内存中的 HTML 文本：提取 (进程池) -> 翻译 (事件循环) -> 回填 + 序列化 (进程池)
+        返回 (输出内容, 更新的段落数)
+        """
+        # 1. 提取待翻译块
+        block_chunks = await self.extract_content(html_content, target_lang)
+
+        # 2. 翻译
+        translations: List[Optional[str]] = []
+        if not block_chunks:
+            logger.info("当前文件没有需要翻译的文本块")
+        else:
+            logger.info(f"提取到 {len(block_chunks)} 个文本段落，准备翻译...")
+            translations = await self._translate_segments(block_chunks, source_lang, target_lang)
+
+        # 3. 回填并序列化
+        return await self.refill_content(html_content, target_lang, translations)
+
+    async def patch_blocks(self, html_content: str, block_hashes: Dict[int, str],
+                           source_lang: Optional[str] = None, target_lang: str = "zh"
+                           ) -> Tuple[str, Dict[int, Tuple[str, Optional[str]]]]:
+        """
+        [块级修补] 只重新翻译指定的块 {块 ID: 台账中的原文哈希}，不经过过滤器。
+        返回 (输出内容, {块 ID: (结果, 未成功时的当前文本)})；块内容与哈希不符时结果为 STALE，不做改动。
+        """
+        texts = await self._run_stage(_collect_stage, self.engine, html_content, list(block_hashes))
+        outcomes: Dict[int, Tuple[str, Optional[str]]] = {}
+        targets = []
+        for block_id, expected in block_hashes.items():
+            text = texts.get(block_id)
+            if text is None or block_hash(text) != expected:
+                outcomes[block_id] = (block_ledger.STALE, None)
             else:
-                # 2. 把翻译结果塞给第一个节点
-                text_nodes[0].replace_with(final_translation)
-                # 3. 清空后续节点 (保留标签结构)
-                for node in text_nodes[1:]:
-                    node.replace_with("")
-            
-            success_count += 1
+                targets.append((block_id, text))
+        if not targets:
+            return html_content, outcomes
 
-        return success_count
+        failed: set = set()
+        translations = await self._translate_segments(
+            [self._split_text(text) for _, text in targets], source_lang, target_lang, failed_blocks=failed)
+        refill = {}
+        for i, ((block_id, text), translation) in enumerate(zip(targets, translations)):
+            if translation and translation != text:
+                refill[block_id] = translation
+            if i in failed or not translation or translation == text:
+                # 部分片段失败时块内仍留有原文
+                outcomes[block_id] = (block_ledger.FAILED, translation or text)
+            else:
+                outcomes[block_id] = (block_ledger.TRANSLATED, None)
+        if not refill:
+            return html_content, outcomes
+        output = await self._run_stage(_refill_blocks_stage, self.engine, html_content, refill)
+        return output, outcomes
 
     async def process_file(self, input_file: str, output_file: str = None,
                           source_lang: Optional[str] = None, 
                           target_lang: str = "zh") -> Dict[str, Any]:
-        """入口函数"""
+        """
+        入口函数：读取文件 -> process_content -> 写回
+        """
         try:
             logger.debug(f"开始处理HTML文件: {input_file}")
             
             with open(input_file, 'r', encoding='utf-8') as f:
                 html_content = f.read()
-            
-            # [修复] 提取 XML 声明，但在保存时检查是否已存在
-            xml_decl = ""
-            xml_decl_match = re.match(r'^<\?xml.*?\?>', html_content)
-            if xml_decl_match: 
-                xml_decl = xml_decl_match.group(0)
 
-            # 使用 lxml 容错能力更强，如果没有则 fallback
-            try:
-                soup = BeautifulSoup(html_content, 'lxml')
-            except:
-                soup = BeautifulSoup(html_content, 'html.parser')
-
-            # 处理
-            count = await self._process_blocks(soup, source_lang, target_lang)
+            output_content, count = await self.process_content(html_content, source_lang, target_lang)
             
             # 保存
             output_path = output_file or input_file
-            output_content = str(soup)
-            
-            # [修复] 只有当输出内容不以 XML 声明开头时，才添加
             with open(output_path, 'w', encoding='utf-8') as f:
-                if xml_decl and not output_content.strip().startswith('<?xml'):
-                    f.write(xml_decl + '\n')
                 f.write(output_content)
             
             logger.debug(f"文件处理完成，更新了 {count} 个段落")
@@ -277,4 +605,85 @@ class HTMLProcessor:
             
         except Exception as e:
             logger.error(f"处理HTML文件失败: {e}", exc_info=True)
-            raise FileProcessingError(f"HTML处理失败: {e}")
\ No newline at end of file
+            raise FileProcessingError(f"HTML处理失败: {e}")
+
+
+# ==================== 进程池 ====================
+# 解析 / get_text / DOM 修改 / 序列化都是 CPU 密集操作，放到独立进程中执行，
+# 进程间只传递 HTML 字符串与片段列表，事件循环只负责网络 I/O。
+
+_stage_pool: Optional[ProcessPoolExecutor] = None
+_stage_pool_disabled = False
+_stage_processors: Dict[Tuple[str, bool], HTMLProcessor] = {}
+# 各工作进程报告的峰值 RSS {进程号: MB} (只在主进程中更新)
+_worker_peaks: Dict[int, Optional[float]] = {}
+
+
+def worker_peak_rss_mb() -> Optional[float]:
+    """HTML 进程池各工作进程峰值 RSS 之和 (MB)；未用过进程池或平台不支持时返回 None"""
+    peaks = [rss for rss in _worker_peaks.values() if rss is not None]
+    return round(sum(peaks), 1) if peaks else None
+
+
+def _get_stage_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """按需创建共享进程池；workers=0 或创建失败时返回 None (退回线程执行)"""
+    global _stage_pool, _stage_pool_disabled
+    if workers <= 0 or _stage_pool_disabled:
+        return None
+    if _stage_pool is None:
+        try:
+            # spawn: 不继承父进程的事件循环、线程与连接状态
+            _stage_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_stage_pool.shutdown, wait=False, cancel_futures=True)
+        except (OSError, ValueError, NotImplementedError) as e:
+            logger.warning(f"⚠️ 无法创建 HTML 进程池 ({e})，改为线程执行")
+            _stage_pool_disabled = True
+            return None
+    return _stage_pool
+
+
+def _disable_stage_pool():
+    global _stage_pool, _stage_pool_disabled
+    _stage_pool_disabled = True
+    if _stage_pool is not None:
+        _stage_pool.shutdown(wait=False, cancel_futures=True)
+        _stage_pool = None
+
+
+def _tracked_stage(func, *args):
+    """在工作进程中执行阶段函数，结果附带本进程号与峰值 RSS (解析 DOM 的内存在工作进程里)"""
+    return func(*args), os.getpid(), peak_rss_mb()
+
+
+def _get_stage_processor(engine: str, force: bool = False) -> HTMLProcessor:
+    """每个工作进程内按 (引擎, 强制模式) 复用一个不带翻译器的处理器 (只用到 DOM 相关方法)"""
+    key = (engine, force)
+    if key not in _stage_processors:
+        _stage_processors[key] = HTMLProcessor(translator=None, workers=0, engine=engine, force=force)
+    return _stage_processors[key]
+
+
+def _extract_stage(engine: str, force: bool, html_content: str, target_lang: str) -> List[List[str]]:
+    return _get_stage_processor(engine, force).extract_segments(html_content, target_lang)
+
+
+def _extract_blocks_stage(engine: str, force: bool, html_content: str,
+                          target_lang: str) -> Tuple[List[List[str]], List[LedgerBlock]]:
+    return _get_stage_processor(engine, force).extract_blocks(html_content, target_lang)
+
+
+def _refill_stage(engine: str, force: bool, html_content: str, target_lang: str,
+                  translations: List[Optional[str]]) -> Tuple[str, int]:
+    return _get_stage_processor(engine, force).refill_segments(html_content, target_lang, translations)
+
+
+def _collect_stage(engine: str, html_content: str, block_ids: List[int]) -> Dict[int, str]:
+    return _get_stage_processor(engine).collect_blocks(html_content, block_ids)
+
+
+def _refill_blocks_stage(engine: str, html_content: str, translations: Dict[int, str]) -> str:
+    return _get_stage_processor(engine).refill_blocks(html_content, translations)
+
+
+def _apply_fixes_stage(engine: str, html_content: str, fixes: List[Dict[str, Any]]) -> Tuple[str, List[bool]]:
+    return _get_stage_processor(engine).apply_fixes(html_content, fixes)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+lxml 原生 HTML/XHTML 引擎
+直接基于 lxml.etree / lxml.html 完成解析、单次遍历块选择、原地回填与序列化，
+替代 BeautifulSoup (更快、更省内存)。
+
+- XHTML (带 XML 声明或 XHTML 命名空间) 用 XML 解析器，原样保留 XML 声明 / DOCTYPE，
+  不会再出现 <!--?xml ...?--> 这类被注释化的声明 (tools/clean_xml.py 因此不再需要)
+- 普通 HTML 用 lxml.html 解析与序列化
+- 未改动的文档原样返回 (逐字节一致)
+- 嵌套超过 libxml2 上限 (2048 层) 的文档抛出 DocumentTooDeepError，由调用方改用 BeautifulSoup
+"""
+
+import html
+import logging
+import os
+import re
+from typing import Iterable, List, Optional
+
+from lxml import etree
+from lxml import html as lxml_html
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("lxml", "bs4")
+DEFAULT_ENGINE = "lxml"
+
+XHTML_NAMESPACE = "http://www.w3.org/1999/xhtml"
+
+# 根元素之前的内容 (XML 声明 / DOCTYPE / 注释) 原样保留
+_ROOT_START = re.compile(r'<(?![?!/])')
+_XML_DECL = re.compile(r'^\ufeff?\s*<\?xml[^>]*\?>')
+
+
+class DocumentTooDeepError(ValueError):
+    """文档嵌套过深，libxml2 无法完整解析 (调用方改用 BeautifulSoup + html.parser)"""
+
+
+def resolve_engine(engine: Optional[str] = None) -> str:
+    """确定使用的引擎：显式参数 > 环境变量 HTML_ENGINE > 默认 lxml"""
+    name = (engine or os.getenv('HTML_ENGINE') or DEFAULT_ENGINE).strip().lower()
+    if name not in ENGINES:
+        logger.warning(f"⚠️ 未知的 HTML 引擎 '{name}'，改用 {DEFAULT_ENGINE}")
+        return DEFAULT_ENGINE
+    return name
+
+
+class LxmlDocument:
+    """解析后的文档：根元素 + 根元素前后的原始文本"""
+
+    def __init__(self, source: str, root, is_xml: bool, header: str, trailer: str):
+        self.source = source
+        self.root = root
+        self.is_xml = is_xml
+        self.header = header
+        self.trailer = trailer
+        self.modified = False
+
+    def serialize(self) -> str:
+        """序列化；文档未被修改时直接返回原文"""
+        if not self.modified:
+            return self.source
+        if self.is_xml:
+            body = etree.tostring(self.root, encoding='unicode', with_tail=False)
+        else:
+            body = lxml_html.tostring(self.root, encoding='unicode', method='html', with_tail=False)
+        return self.header + body + self.trailer
+
+
+def _is_xhtml(content: str) -> bool:
+    return bool(_XML_DECL.match(content)) or XHTML_NAMESPACE in content[:2048]
+
+
+def _split_prolog(content: str, root_tag: str):
+    """切出根元素之前 / 之后的原始文本，找不到根元素起始标签时返回空串"""
+    match = _ROOT_START.search(content)
+    header = ''
+    if match and content[match.end():match.end() + len(root_tag)].lower() == root_tag.lower():
+        header = content[:match.start()]
+    stripped = content.rstrip()
+    trailer = content[len(stripped):] if stripped.endswith('>') else ''
+    return header, trailer
+
+
+def parse_document(content: str) -> LxmlDocument:
+    """解析 HTML/XHTML 文本；XHTML 解析失败时退回 HTML 解析器"""
+    if _is_xhtml(content):
+        # recover: 未声明的实体 (如 &nbsp;) 保留为实体引用而不是报错
+        parser = etree.XMLParser(encoding='utf-8', recover=True, resolve_entities=False,
+                                 huge_tree=True, remove_blank_text=False)
+        try:
+            root = etree.fromstring(content.encode('utf-8'), parser)
+        except etree.XMLSyntaxError:
+            root = None
+        # recover 模式下其他语法错误 (裸 &、未闭合标签) 会悄悄丢内容，此时改用 HTML 解析器
+        fatal = [e for e in parser.error_log if e.type_name != 'ERR_UNDECLARED_ENTITY'
+                 and e.level >= etree.ErrorLevels.ERROR]
+        if root is not None and not fatal:
+            header, trailer = _split_prolog(content, etree.QName(root).localname)
+            return LxmlDocument(content, root, True, header, trailer)
+        logger.debug("XHTML 解析失败，改用 HTML 解析器")
+
+    parser = lxml_html.HTMLParser(encoding='utf-8', huge_tree=True)
+    root = lxml_html.document_fromstring(content.encode('utf-8'), parser=parser)
+    if any(e.type_name == 'ERR_RESOURCE_LIMIT' for e in parser.error_log):
+        # libxml2 嵌套超过 2048 层时截断文档 (huge_tree 也无效)，继续处理会丢失内容
+        raise DocumentTooDeepError("文档嵌套层数超过 libxml2 上限")
+    header, trailer = _split_prolog(content, root.tag)
+    return LxmlDocument(content, root, False, header, trailer)
+
+
+def _local(tag: str) -> str:
+    """去掉命名空间的小写标签名 ('{ns}p' -> 'p')"""
+    return tag.rpartition('}')[2].lower()
+
+
+def collect_blocks(root, block_tags: Iterable[str], exclude_tags: Iterable[str],
+                   leaf_only: bool = True) -> list:
+    """
+    单次遍历 (etree.iterwalk) 按文档顺序返回不在排除标签内的块级元素；
+    leaf_only=True 时只取内部不再包含块级元素的"最底层"块 (排除标签内的块同样使父块不再是叶子)。
+    与 HTMLProcessor._collect_leaf_blocks 相同：进入元素时累计"所在排除标签层数"，
+    离开元素时把"子树中是否出现过块级标签"汇报给父元素。每个节点只访问一次，不受嵌套深度影响。
+    按名称匹配 (忽略命名空间)，XHTML 与普通 HTML 通用。
+    """
+    block_tags, exclude_tags = frozenset(block_tags), frozenset(exclude_tags)
+    blocks = []
+    excluded = 0
+    # 与当前路径上的元素一一对应：该元素的子树中是否已出现块级标签
+    has_block_below: List[bool] = []
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        tag = element.tag
+        if not isinstance(tag, str):  # 注释 / 处理指令 / 实体
+            continue
+        name = _local(tag)
+        if event == 'start':
+            has_block_below.append(False)
+            if name in block_tags and not excluded and not leaf_only:
+                blocks.append(element)
+            if name in exclude_tags:
+                excluded += 1
+            continue
+        if name in exclude_tags:
+            excluded -= 1
+        contains_block = has_block_below.pop()
+        is_block = name in block_tags
+        if leaf_only and is_block and not contains_block and not excluded:
+            blocks.append(element)
+        if has_block_below and (is_block or contains_block):
+            has_block_below[-1] = True
+    # 叶子块互不嵌套，离开顺序即文档顺序
+    return blocks
+
+
+def collect_loose_texts(root, block_tags: Iterable[str], exclude_tags: Iterable[str]) -> List[tuple]:
+    """
+    非叶子块自身直接拥有的文本 (不在子块内，也不在排除标签内)，按块的文档顺序返回 [(标签名, 文本)]。
+    翻译只处理叶子块，这部分文本 (如 <div>正文<p>…</p></div> 中的"正文") 不会被翻译。
+    """
+    block_tags, exclude_tags = frozenset(block_tags), frozenset(exclude_tags)
+    owners = []   # [标签名, 文本片段, 是否包含块]，按块的开始顺序
+    path = []     # 当前路径上各元素所属的块记录 (None 表示不属于任何块)
+    excluded = 0
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        tag = element.tag
+        owner = path[-1] if path else None
+        if not isinstance(tag, str):
+            if event == 'end' and not excluded and owner is not None:
+                if tag is etree.Entity:
+                    owner[1].append(html.unescape(element.text))
+                if element.tail:
+                    owner[1].append(element.tail)
+            continue
+        name = _local(tag)
+        if event == 'start':
+            if name in block_tags:
+                if owner is not None:
+                    owner[2] = True
+                if not excluded:
+                    owner = [name, [], False]
+                    owners.append(owner)
+            if name in exclude_tags:
+                excluded += 1
+            path.append(owner)
+            if element.text and not excluded and owner is not None:
+                owner[1].append(element.text)
+            continue
+        path.pop()
+        if name in exclude_tags:
+            excluded -= 1
+        parent_owner = path[-1] if path else None
+        if element.tail and not excluded and parent_owner is not None:
+            parent_owner[1].append(element.tail)
+    loose = []
+    for name, parts, has_block in owners:
+        text = " ".join(part.strip() for part in parts if part.strip())
+        if has_block and text:
+            loose.append((name, text))
+    return loose
+
+
+def local_name(element) -> str:
+    return etree.QName(element).localname.lower()
+
+
+def get_classes(element) -> List[str]:
+    return (element.get('class') or '').split()
+
+
+def _iter_strings(element):
+    """按文档顺序产出块内文本 (跳过注释 / 处理指令，实体引用还原为对应字符)"""
+    if element.text:
+        yield element.text
+    for node in element.iterdescendants():
+        if node.tag is etree.Entity:
+            yield html.unescape(node.text)
+        elif isinstance(node.tag, str) and node.text:
+            yield node.text
+        if node.tail:
+            yield node.tail
+
+
+def get_text(element) -> str:
+    """等价于 BeautifulSoup 的 get_text(" ", strip=True)：各文本节点去空白后用空格连接"""
+    parts = (text.strip() for text in _iter_strings(element))
+    return " ".join(part for part in parts if part)
+
+
+def _text_slots(element):
+    """按文档顺序列出块内的所有文本节点 (元素的 text 与子节点的 tail)"""
+    if element.text is not None:
+        yield element, 'text'
+    for node in element.iterdescendants():
+        # 注释 / 实体 / 处理指令只有 tail 属于块文本
+        if isinstance(node.tag, str) and node.text is not None:
+            yield node, 'text'
+        if node.tail is not None:
+            yield node, 'tail'
+
+
+def set_text(element, text: str):
+    """原地回填：译文写入第一个文本节点，清空其余文本节点 (保留标签结构)"""
+    # 实体引用 (如 &nbsp;) 也是原文的一部分，回填时一并移除 (tail 交给前一个节点)
+    for entity in list(element.iter(etree.Entity)):
+        _remove_keep_tail(entity)
+    slots = list(_text_slots(element))
+    if not slots:
+        element.text = text
+        return
+    node, attr = slots[0]
+    setattr(node, attr, text)
+    for node, attr in slots[1:]:
+        setattr(node, attr, None)
+
+
+def _remove_keep_tail(node):
+    parent = node.getparent()
+    if node.tail:
+        previous = node.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + node.tail
+        else:
+            parent.text = (parent.text or '') + node.tail
+    parent.remove(node)
+
+
+def replace_content(element, text: str):
+    """替换元素的全部内容为纯文本 (保留元素自身属性与 tail)"""
+    for child in list(element):
+        element.remove(child)
+    element.text = text
+
+
+def previous_element(element):
+    node = element.getprevious()
+    while node is not None and not isinstance(node.tag, str):
+        node = node.getprevious()
+    return node
+
+
+def next_element(element):
+    node = element.getnext()
+    while node is not None and not isinstance(node.tag, str):
+        node = node.getnext()
+    return node
+
+
+def iter_tag(document: LxmlDocument, tag: str):
+    """按文档顺序遍历指定名称的元素 (忽略命名空间)"""
+    tag = tag.lower()
+    for element in document.root.iter(etree.Element):
+        if local_name(element) == tag:
+            yield element
+
+
+def iter_tags(document: LxmlDocument, tags: Iterable[str]):
+    """一次遍历产出名称在 tags 中的所有元素 (名称, 元素)，按文档顺序"""
+    tags = {tag.lower() for tag in tags}
+    for element in document.root.iter(etree.Element):
+        name = local_name(element)
+        if name in tags:
+            yield name, element
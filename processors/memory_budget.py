@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+在途数据量预算 (Payload Budget)
+按估算字节数而不是文件数做准入控制：章节进入调度前先预留 DOM 估算大小，提取出段落后再追加 Token 体积，
+章节写出后全部归还。总量超过上限时新章节排队等待，超大章节在预算空闲时单独放行，不会永远饿死。
+用法与 asyncio.Semaphore 类似，但每次获取/归还的是字节数。
+"""
+
+import asyncio
+import os
+import sys
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+# 章节在提取 / 回填期间的 DOM、序列化缓冲与进程间传输副本约为源 HTML 大小的倍数
+DOM_BYTES_FACTOR = 4
+# 每个 Token 在段落原文、译文与结果列表中的大致占用
+BYTES_PER_TOKEN = 12
+
+
+def estimate_dom_bytes(source_size: int) -> int:
+    """章节 DOM 及其 HTML 字符串的估算内存"""
+    return source_size * (DOM_BYTES_FACTOR + 1)
+
+
+def estimate_token_bytes(tokens: int) -> int:
+    """段落原文与译文的估算内存"""
+    return tokens * BYTES_PER_TOKEN
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    当前进程的峰值常驻内存 (MB)；平台不支持时返回 None。
+    只含本进程：进程池工作进程常驻到退出，RUSAGE_CHILDREN 在运行期间看不到它们，
+    工作进程的峰值由各进程自行测量后随任务结果带回 (见 html_worker.worker_peak_rss_mb)。
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (MB if sys.platform == 'darwin' else 1024), 1)
+
+
+class PayloadBudget:
+    """按字节计量的异步准入闸门"""
+
+    DEFAULT_LIMIT_MB = 1024
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        if limit_bytes is None:
+            limit_bytes = int(float(os.getenv('EPUB_MEMORY_BUDGET_MB', self.DEFAULT_LIMIT_MB)) * MB)
+        self.limit = max(1, limit_bytes)
+        self._used = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self.peak = 0
+        self.waits = 0
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def _fits(self, size: int) -> bool:
+        # 预算空闲时放行超大请求，避免单个大章节永远等不到
+        return self._used == 0 or self._used + size <= self.limit
+
+    def _take(self, size: int):
+        self._used += size
+        self.peak = max(self.peak, self._used)
+
+    def try_acquire(self, size: int) -> bool:
+        """不等待地预留 size 字节，成功返回 True (有人排队时不插队)"""
+        if self._waiters or not self._fits(size):
+            return False
+        self._take(size)
+        return True
+
+    async def acquire(self, size: int):
+        if self.try_acquire(size):
+            return
+        self.waits += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((size, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 已被唤醒但调用方取消：把预留的字节还回去
+            if fut.done() and not fut.cancelled():
+                self.release(size)
+            else:
+                try:
+                    self._waiters.remove((size, fut))
+                except ValueError:
+                    pass
+            raise
+
+    def charge(self, size: int):
+        """追加不可拒绝的占用 (如提取后才知道的 Token 体积)，只会推迟后续的准入"""
+        self._take(size)
+
+    def release(self, size: int):
+        self._used = max(0, self._used - size)
+        # 先到先得，队首放不下时后面的也不越过它
+        while self._waiters and self._fits(self._waiters[0][0]):
+            size, fut = self._waiters.popleft()
+            if not fut.done():
+                self._take(size)
+                fut.set_result(None)
+
+    def get_stats(self) -> dict:
+        return {
+            'limit_mb': round(self.limit / MB, 1),
+            'peak_mb': round(self.peak / MB, 1),
+            'waits': self.waits,
+        }
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试共用的辅助函数 (测试文件通过 from conftest import ... 使用)
+- make_book: 生成最小的标准 ePub (container.xml + content.opf + 章节)
+- StubTranslator: 不发请求的翻译器，记录请求的原文与同时在途的批次数
+- chat_response / make_client: 用 httpx 的 Mock / ASGI 传输构造不联网的客户端
+"""
+import asyncio
+import sys
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.client import AsyncDoubaoClient
+from core.retry import RetryPolicy
+
+# StubTranslator 的默认译文 (质检判定为已翻译)
+TRANSLATED = "这是翻译之后的中文段落内容"
+
+
+def make_book(path: Path, chapters: Dict[str, str], media: Optional[Dict[str, bytes]] = None):
+    """
+    chapters 为 {OEBPS 下的章节文件名: <body> 内的 HTML}，按顺序登记到 OPF 清单；
+    media 为 {OEBPS 下的文件名: 内容}，写在章节之前。
+    """
+    items = "".join(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>'
+                    for i, name in enumerate(chapters, 1))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml",
+                    '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+                    '<rootfile full-path="OEBPS/content.opf"/></rootfiles></container>')
+        zf.writestr("OEBPS/content.opf",
+                    f'<package xmlns="http://www.idpf.org/2007/opf"><manifest>{items}</manifest></package>')
+        for name, data in (media or {}).items():
+            zf.writestr(f"OEBPS/{name}", data)
+        for name, body in chapters.items():
+            zf.writestr(f"OEBPS/{name}", f"<html><body>{body}</body></html>")
+
+
+def prefixed(text: str) -> str:
+    return f"译{text}"
+
+
+def upper(text: str) -> str:
+    return f"译{text.upper()}"
+
+
+class StubTranslator:
+    """
+    测试用翻译器：reply 把原文映射为译文 (默认返回固定的中文)；
+    fail 中的原文返回失败标记；批次中出现 crash_on 时模拟进程被中断；delay 为每个批次的耗时。
+    """
+
+    def __init__(self, reply=lambda text: TRANSLATED, fail=(), crash_on: Optional[str] = None, delay: float = 0.0):
+        self.reply = reply
+        self.fail = set(fail)
+        self.crash_on = crash_on
+        self.delay = delay
+        self.requested = []
+        self.inflight = 0
+        self.peak_inflight = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def translate_batch(self, texts, source_lang=None, target_lang=None):
+        if self.crash_on and self.crash_on in texts:
+            await asyncio.sleep(0.2)  # 让其他章节先完成
+            raise asyncio.CancelledError()
+        self.requested.extend(texts)
+        self.inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.inflight -= 1
+        return ["[TRANSLATION_FAILED]" if t in self.fail else self.reply(t) for t in texts]
+
+
+def chat_response(content: str) -> httpx.Response:
+    """Chat 接口的成功响应"""
+    return httpx.Response(200, json={
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10},
+    })
+
+
+def make_client(transport: httpx.AsyncBaseTransport, models: Sequence[str] = ("deepseek-v3-250324",),
+                retry_policy: Optional[RetryPolicy] = None, **kwargs) -> AsyncDoubaoClient:
+    """请求经 transport (httpx.MockTransport(handler) 或 httpx.ASGITransport(app=...)) 处理的客户端"""
+    client = AsyncDoubaoClient(api_key="test-key", models=list(models), target_language="zh", **kwargs)
+    client.client = httpx.AsyncClient(transport=transport, headers={"Authorization": "Bearer test-key"})
+    if retry_policy is not None:
+        client.retry_policy = retry_policy
+    return client
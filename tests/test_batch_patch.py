@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import sys
+import threading
+import zipfile
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.config import TranslatorConfig
+from main import MainCLI
+from tools.check_untranslated import EPUBTranslationChecker
+from processors.epub_worker import EpubProcessor
+from conftest import TRANSLATED, StubTranslator, make_book
+
+LEAKS = {
+    "alpha": "Alpha has one paragraph that the first pass failed to translate.",
+    "beta": "Beta has a stubborn paragraph that no patch round can ever translate.",
+}
+
+
+class _BookTranslator(StubTranslator):
+    """按书统计同时在途的修补请求"""
+
+    def __init__(self, **kwargs):
+        super().__init__(delay=0.05, **kwargs)
+        self.books = Counter()
+        self.peak_books = 0
+        self.started = threading.Event()
+
+    async def translate_batch(self, texts, source_lang=None, target_lang=None):
+        self.started.set()
+        books = {name for name in LEAKS for t in texts if t.startswith(name.capitalize())}
+        self.books.update(books)
+        self.peak_books = max(self.peak_books, len(+self.books))
+        try:
+            return await super().translate_batch(texts, source_lang, target_lang)
+        finally:
+            self.books.subtract(books)
+
+
+@pytest.mark.asyncio
+async def test_books_are_patched_concurrently_and_only_stubborn_leaks_are_reported(tmp_path, monkeypatch):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    monkeypatch.setenv("QA_WORKERS", "0")
+    outputs = []
+    for name in ("alpha", "beta", "gamma"):
+        src, out = tmp_path / f"{name}.epub", tmp_path / f"{name}_zh.epub"
+        paragraphs = [f"The {name} book opens with an ordinary English sentence."] + \
+            ([LEAKS[name]] if name in LEAKS else [])
+        make_book(src, {"ch1.xhtml": "".join(f"<p>{text}</p>" for text in paragraphs)})
+        # 第一遍翻译时漏译段落失败，台账记录为 FAILED
+        await EpubProcessor(StubTranslator(fail=LEAKS.values())).translate_epub(str(src), str(out))
+        outputs.append(out)
+
+    translator = _BookTranslator(fail={LEAKS["beta"]})
+    streamed = []
+    check_epubs = EPUBTranslationChecker.check_epubs
+
+    def spy(self, epub_paths, *args, **kwargs):
+        streamed.append(list(epub_paths))
+        return check_epubs(self, streamed[-1], *args, **kwargs)
+
+    monkeypatch.setattr(EPUBTranslationChecker, "check_epubs", spy)
+    # 第一轮读到最后一本书时先等修补开始：前面的书检查完就该开始修复，不等整轮结束
+    overlapped = []
+    read_chapters = EPUBTranslationChecker._read_chapters
+
+    def slow_read(self, epub_path, *args):
+        if epub_path == str(outputs[-1]) and not overlapped:
+            overlapped.append(translator.started.wait(5))
+        yield from read_chapters(self, epub_path, *args)
+
+    monkeypatch.setattr(EPUBTranslationChecker, "_read_chapters", slow_read)
+    cli = MainCLI()
+    monkeypatch.setattr(cli, "_create_translator", lambda config: translator)
+    monkeypatch.setattr(cli, "_print_stats", lambda translator: None)
+    reports = await cli._batch_patch_all(outputs, TranslatorConfig(api_key="test"), "zh", max_books=3)
+
+    # 第一轮质检一次送检所有书，最后一本书还在检查时第一本书已开始修补；之后两本书的修补请求同时在途
+    assert streamed[0] == [str(out) for out in outputs]
+    assert overlapped == [True]
+    assert translator.peak_books == 2
+    alpha, beta, gamma = outputs
+    assert list(reports) == [str(beta)]
+    assert [item['full_text'] for item in reports[str(beta)]] == [LEAKS["beta"]]
+    with zipfile.ZipFile(alpha) as zf:
+        chapter = zf.read("OEBPS/ch1.xhtml").decode("utf-8")
+    assert LEAKS["alpha"] not in chapter and TRANSLATED in chapter
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tools import benchmark
+from tools.benchmark import PROCESSORS, bench_engines, run_benchmarks
+from tools.mock_ark_server import MockArkConfig
+
+
+@pytest.mark.asyncio
+async def test_benchmark_runs_every_processor_on_a_tiny_corpus():
+    config = MockArkConfig(latency={"default": "fixed:0"}, per_token_latency=0.0)
+    results = await run_benchmarks(list(PROCESSORS), 0.02, ["deepseek-v3-250324"], config)
+    assert [r['processor'] for r in results] == list(PROCESSORS)
+    for r in results:
+        assert r['success']
+        assert r['segments'] > 0 and r['requests'] > 0
+        assert r['peak_rss_mb'] > 0
+        assert set(r['loop_lag_ms']) == {'mean', 'p99', 'max'}
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_rss_as_unavailable_without_resource(monkeypatch):
+    # 模拟 Windows：没有 resource 模块也没有 /proc
+    def no_proc(path, *args, **kwargs):
+        if str(path).startswith("/proc/"):
+            raise OSError(path)
+        return open(path, *args, **kwargs)
+
+    monkeypatch.setattr(benchmark, "resource", None)
+    monkeypatch.setattr(benchmark, "open", no_proc, raising=False)
+    config = MockArkConfig(latency={"default": "fixed:0"}, per_token_latency=0.0)
+    results = await run_benchmarks(["json"], 0.02, ["deepseek-v3-250324"], config)
+    assert results[0]['success'] and results[0]['peak_rss_mb'] is None
+    benchmark.compare({'results': results}, {'results': results})
+
+
+def test_engine_benchmark_reports_both_engines():
+    results = bench_engines(chapters=2, paragraphs=5, repeat=1)
+    assert {r['engine'] for r in results} == {"lxml", "bs4"}
+    assert all(r['seconds'] > 0 and r['speedup_vs_bs4'] > 0 for r in results)
@@ -49,8 +49,11 @@ async def test_client_uses_fast_and_seed_lanes():
         models=["doubao-seed-translation-250915", "deepseek-v3-2-251201"],
     )
     try:
-        assert client._get_semaphore("doubao-seed-translation-250915") is client.sem_seed
-        assert client._get_semaphore("deepseek-v3-2-251201") is client.sem_fast
+        seed_lane = client._get_semaphore("doubao-seed-translation-250915")
+        fast_lane = client._get_semaphore("deepseek-v3-2-251201")
+        assert seed_lane.limit == 80
+        assert fast_lane.limit == 500
+        assert client._get_semaphore("doubao-seed-translation-250915") is seed_lane
         assert client._is_translation_special_model("doubao-seed-translation-250915") is True
         assert client._is_translation_special_model("deepseek-v3-2-251201") is False
     finally:
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors.block_ledger import FAILED, SKIPPED, TRANSLATED, BlockLedger
+from processors.epub_container import EpubContainer
+from processors.epub_worker import EpubProcessor, patch_untranslated
+from tools.check_untranslated import EPUBTranslationChecker
+from conftest import StubTranslator, make_book
+
+STUBBORN = "This stubborn paragraph keeps failing to translate on the first attempt."
+
+
+CHAPTERS = {
+    "ch1.xhtml": f"<p>The first chapter begins with a quiet morning.</p><p>{STUBBORN}</p><p class=\"code\">print(x)</p>",
+    "ch2.xhtml": "<p>The second chapter is short and simple.</p>",
+}
+
+
+@pytest.mark.asyncio
+async def test_ledger_answers_qa_and_patching_resends_only_leaked_blocks(tmp_path, monkeypatch):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    make_book(src, CHAPTERS)
+    await EpubProcessor(StubTranslator(fail={STUBBORN})).translate_epub(str(src), str(out))
+
+    ledger = BlockLedger.load(str(out))
+    blocks = {b.hash: b for b in ledger.chapters["OEBPS/ch1.xhtml"]["blocks"]}
+    assert [b.outcome for b in blocks.values()] == [TRANSLATED, FAILED, SKIPPED]
+    assert ledger.count() == {TRANSLATED: 2, FAILED: 1, SKIPPED: 1}
+
+    # 质检全部由台账回答，不解析章节
+    checker = EPUBTranslationChecker()
+    monkeypatch.setattr(checker, "check_html_content", lambda *a: pytest.fail("章节不应被扫描"))
+    report = checker.check_epub(str(out), ledger=ledger)
+    assert report['ledger_files'] == 2
+    assert [item['full_text'] for item in report['details']] == [STUBBORN]
+    assert report['details'][0]['block_id'] == 1
+
+    translator = StubTranslator()
+    with EpubContainer(str(out)) as container:
+        stats = await patch_untranslated(container, report['details'], translator, ledger=ledger)
+        container.save()
+    ledger.save()
+    assert translator.requested == [STUBBORN]
+    assert stats == {'blocks': 1, 'files': 0}
+
+    # 修补后的台账仍与文件一致，质检无漏译且不扫描
+    ledger = BlockLedger.load(str(out))
+    report = checker.check_epub(str(out), ledger=ledger)
+    assert report['untranslated_count'] == 0 and report['ledger_files'] == 2
+    assert ledger.count()[FAILED] == 0
+
+
+@pytest.mark.asyncio
+async def test_chapter_changed_outside_the_ledger_falls_back_to_a_scan(tmp_path, monkeypatch):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    make_book(src, CHAPTERS)
+    await EpubProcessor(StubTranslator()).translate_epub(str(src), str(out))
+
+    # 人工改动了第二章：台账对它失效
+    leaked = "A sentence that somebody pasted back in English by hand."
+    link = "www.example.com/chapter-two"
+    with EpubContainer(str(out)) as container:
+        translated = container.read_text("OEBPS/ch2.xhtml").split("<body>")[1].split("</body>")[0]
+        container.write("OEBPS/ch2.xhtml", f"<html><body>{translated}<p>{leaked}</p><p>{link}</p></body></html>")
+        container.save()
+
+    ledger = BlockLedger.load(str(out))
+    report = EPUBTranslationChecker().check_epub(str(out), ledger=ledger)
+    assert report['ledger_files'] == 1
+    assert [item['full_text'] for item in report['details']] == [leaked]
+    assert 'block_id' not in report['details'][0]
+
+    translator = StubTranslator()
+    with EpubContainer(str(out)) as container:
+        stats = await patch_untranslated(container, report['details'], translator, ledger=ledger)
+        assert "中文" in container.read_text("OEBPS/ch2.xhtml")
+    # 整章重译只关闭 URL/代码过滤：已经是中文的段落不再送去翻译
+    assert translator.requested == [leaked, link]
+    assert stats == {'blocks': 0, 'files': 1}
+    assert "OEBPS/ch2.xhtml" not in ledger.chapters
+
+
+@pytest.mark.asyncio
+async def test_no_translate_blocks_survive_qa_and_patching_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    kept = "Keep this English sentence exactly as the author wrote it."
+    make_book(src, {**CHAPTERS, "ch2.xhtml": "<p>The second chapter is short and simple.</p>"
+                                             f"<p class=\"no-translate\">{kept}</p>"})
+    await EpubProcessor(StubTranslator(fail={STUBBORN})).translate_epub(str(src), str(out))
+
+    ledger = BlockLedger.load(str(out))
+    report = EPUBTranslationChecker(workers=0).check_epub(str(out), ledger=ledger)
+    assert [item['full_text'] for item in report['details']] == [STUBBORN]
+
+    translator = StubTranslator()
+    with EpubContainer(str(out)) as container:
+        await patch_untranslated(container, report['details'], translator, ledger=ledger)
+        assert f'<p class="no-translate">{kept}</p>' in container.read_text("OEBPS/ch2.xhtml")
+    assert kept not in translator.requested
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["lxml", "bs4"])
+async def test_mixed_content_div_gets_the_same_verdict_from_ledger_and_scan(tmp_path, monkeypatch, engine):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    monkeypatch.setenv("HTML_ENGINE", engine)
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    loose = "Direct English text that sits in the div itself, next to its child paragraph."
+    make_book(src, {
+        "ch1.xhtml": f"<div>{loose}<p>{STUBBORN}</p></div>",
+        # 只有分隔符的 div：自身文本不是漏译，台账仍可直接回答
+        "ch2.xhtml": "<div>* * *<p>The second chapter is short and simple.</p>"
+                     "<!-- An English comment is not text --></div>",
+    })
+    await EpubProcessor(StubTranslator()).translate_epub(str(src), str(out))
+
+    ledger = BlockLedger.load(str(out))
+    assert [(b.tag, b.text) for b in ledger.chapters["OEBPS/ch1.xhtml"]["blocks"] if b.id == -1] == [("div", loose)]
+    assert ledger.leaks("OEBPS/ch1.xhtml", EPUBTranslationChecker().is_untranslated) == []
+
+    def verdict(report):
+        return [(item['file'], item['full_text']) for item in report['details']]
+
+    scanned = EPUBTranslationChecker(workers=0).check_epub(str(out))
+    judged = EPUBTranslationChecker(workers=0).check_epub(str(out), ledger=ledger)
+    assert any(loose in text for _, text in verdict(scanned))
+    assert verdict(judged) == verdict(scanned)
+    # 带未翻译自身文本的章节退回扫描，另一章仍由台账回答
+    assert judged['ledger_files'] == 1
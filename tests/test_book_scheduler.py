@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors.book_scheduler import BookScheduler
+from processors.html_worker import HTMLProcessor
+from processors.memory_budget import PayloadBudget, estimate_dom_bytes
+
+
+class _RecordingTranslator:
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    async def translate_batch(self, texts, source_lang=None, target_lang=None):
+        self.batches.append(list(texts))
+        await asyncio.sleep(0)
+        return ["[TRANSLATION_FAILED]" if t in self.fail else f"译{t}" for t in texts]
+
+
+def _chapter(*paragraphs: str) -> str:
+    return "<html><body>" + "".join(f"<p>{p}</p>" for p in paragraphs) + "</body></html>"
+
+
+@pytest.mark.asyncio
+async def test_segments_from_all_chapters_are_sent_longest_first():
+    translator = _RecordingTranslator()
+    scheduler = BookScheduler(HTMLProcessor(translator, workers=0), batch_segments=2, max_inflight=2)
+    long_text = "word " * 50
+    chapters = {
+        "a.xhtml": _chapter("Short one.", long_text.strip()),
+        "b.xhtml": _chapter("Medium sized sentence here.", "Tiny."),
+        "empty.xhtml": "<html><body><pre>code</pre></body></html>",
+    }
+    done = {}
+
+    await scheduler.run(chapters, lambda name, out: done.setdefault(name, out),
+                        lambda name, e: pytest.fail(f"{name}: {e}"))
+
+    assert translator.batches == [[long_text.strip(), "Medium sized sentence here."], ["Short one.", "Tiny."]]
+    assert set(done) == set(chapters)
+    assert f"<p>译{long_text.strip()}</p>" in done["a.xhtml"]
+    assert "<p>译Tiny.</p>" in done["b.xhtml"]
+    assert done["empty.xhtml"] == chapters["empty.xhtml"]
+    assert scheduler.stats == {'chapters': 3, 'segments': 4, 'batches': 2, 'failed_segments': 0,
+                               'admission_waves': 1}
+    assert scheduler.budget.used == 0
+
+
+@pytest.mark.asyncio
+async def test_chapter_is_written_as_soon_as_its_last_segment_lands():
+    completed = []
+
+    class SlowShortTranslator(_RecordingTranslator):
+        async def translate_batch(self, texts, source_lang=None, target_lang=None):
+            await asyncio.sleep(0.05 if texts == ["Hi."] else 0)
+            completed.extend(texts)
+            return [f"译{t}" for t in texts]
+
+    scheduler = BookScheduler(HTMLProcessor(SlowShortTranslator(), workers=0), batch_segments=1, max_inflight=1)
+    written = []
+    await scheduler.run({"big.xhtml": _chapter("A much longer paragraph than the others.", "Second long-ish line."),
+                         "small.xhtml": _chapter("Hi.")},
+                        lambda name, out: written.append((name, list(completed))),
+                        lambda name, e: pytest.fail(f"{name}: {e}"))
+    # big 章节的段落最长、最先发出；它完成后立即写出，不等 small 章节的请求返回
+    assert [name for name, _ in written] == ["big.xhtml", "small.xhtml"]
+    assert "Hi." not in written[0][1]
+
+
+@pytest.mark.asyncio
+async def test_failed_segments_keep_original_text_and_bad_chapters_are_reported():
+    translator = _RecordingTranslator(fail={"Keep me."})
+    scheduler = BookScheduler(HTMLProcessor(translator, workers=0))
+    done, failed = {}, []
+
+    async def broken_extract(html, target_lang):
+        raise ValueError("boom")
+
+    chapters = {"ok.xhtml": _chapter("Keep me.", "Translate me.")}
+    await scheduler.run(chapters, done.__setitem__, lambda name, e: failed.append(name))
+    assert "<p>Keep me.</p>" in done["ok.xhtml"] and "<p>译Translate me.</p>" in done["ok.xhtml"]
+    assert scheduler.stats['failed_segments'] == 1
+
+    scheduler.html_processor.extract_content_blocks = broken_extract
+    await scheduler.run({"bad.xhtml": _chapter("x")}, done.__setitem__, lambda name, e: failed.append(name))
+    assert failed == ["bad.xhtml"]
+
+
+@pytest.mark.asyncio
+async def test_chapters_are_admitted_within_the_memory_budget():
+    inflight, peak = set(), [0]
+    chapters = {f"c{i}.xhtml": _chapter(f"Paragraph number {i} of the book.") for i in range(6)}
+    one_chapter = estimate_dom_bytes(len(chapters["c0.xhtml"]))
+    # 预算只够同时容纳约两个章节
+    budget = PayloadBudget(limit_bytes=one_chapter * 2 + one_chapter // 2)
+    scheduler = BookScheduler(HTMLProcessor(_RecordingTranslator(), workers=0), budget=budget)
+
+    async def extract(html, target_lang, _original=scheduler.html_processor.extract_content_blocks):
+        inflight.add(html)
+        peak[0] = max(peak[0], len(inflight))
+        return await _original(html, target_lang)
+
+    def done(name, output):
+        inflight.discard(chapters[name])
+
+    scheduler.html_processor.extract_content_blocks = extract
+    await scheduler.run(chapters, done, lambda name, e: pytest.fail(f"{name}: {e}"))
+
+    assert peak[0] == 2
+    assert scheduler.stats['chapters'] == 6 and scheduler.stats['admission_waves'] > 1
+    assert budget.used == 0 and budget.peak <= budget.limit + one_chapter
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_runs_alone_and_waiters_are_fifo():
+    budget = PayloadBudget(limit_bytes=100)
+    await budget.acquire(500)  # 预算空闲时放行超大请求
+    order = []
+
+    async def take(name, size):
+        await budget.acquire(size)
+        order.append(name)
+
+    waiters = [asyncio.create_task(take("a", 80)), asyncio.create_task(take("b", 10))]
+    await asyncio.sleep(0)
+    assert order == [] and not budget.try_acquire(1)
+    budget.release(500)
+    await asyncio.gather(*waiters)
+    assert order == ["a", "b"] and budget.used == 90
+    assert budget.get_stats() == {'limit_mb': 0.0, 'peak_mb': 0.0, 'waits': 2}
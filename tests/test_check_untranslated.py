@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tools import check_untranslated
+from tools.check_untranslated import EPUBTranslationChecker
+from conftest import make_book
+
+
+@pytest.mark.parametrize("text, leaked", [
+    ("The quick brown fox jumps over the lazy dog.", True),
+    ("这是已经翻译好的中文段落，其中夹杂 a few English words", False),
+    ("版权所有 Copyright by Some Publisher", True),
+    ("Copyright 版权所有，保留一切权利 by Some Publisher", False),
+    ("Visit www.example.com for more", False),
+    ("Contact someone@example.com about it", False),
+    ("ISBN 978-3-16-148410-0 second edition", False),
+    ("if (x) { return y; }", False),
+    ("12,345.67", False),
+    ("Two words", False),
+    ("#### ++++ ==== well then", False),
+])
+def test_classifier_rules(text, leaked):
+    assert EPUBTranslationChecker(workers=0).is_untranslated(text) is leaked
+
+
+def test_pool_and_in_process_results_match_without_console_output(tmp_path, capsys):
+    leak = "<p>This paragraph was left in English by mistake.</p>"
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"book{i}.epub"
+        make_book(path, {f"ch{j}.xhtml": "<p>已经翻译好的中文段落。</p>" + leak * (i + j) for j in range(4)})
+        paths.append(str(path))
+    broken = tmp_path / "broken.epub"
+    broken.write_bytes(b"not a zip")
+
+    serial = EPUBTranslationChecker(workers=0).check_epubs(paths + [str(broken)])
+    reported = {}
+    pooled = EPUBTranslationChecker(workers=2).check_epubs(
+        paths + [str(broken)], on_report=lambda path, report: reported.setdefault(path, dict(report)))
+
+    assert check_untranslated._check_pool is not None and not check_untranslated._check_pool_disabled
+    assert capsys.readouterr().out == ""
+    assert pooled == serial
+    # 每本书检查完时报告一次，回调拿到的已是最终结果
+    assert reported == serial
+    assert [serial[p]['untranslated_count'] for p in paths] == [6, 10, 14]
+    # 条目按书中章节顺序排列
+    assert [item['file'] for item in serial[paths[1]]['details']][:2] == ["OEBPS/ch0.xhtml", "OEBPS/ch1.xhtml"]
+    assert serial[str(broken)]['error'] and serial[str(broken)]['total_files'] == 0
+    with pytest.raises(ValueError):
+        EPUBTranslationChecker(workers=0).check_epub(str(broken))
+
+
+def test_later_rounds_rescan_only_changed_chapters(tmp_path):
+    path = tmp_path / "book.epub"
+    leak = "<p>This paragraph was left in English by mistake.</p>"
+    make_book(path, {f"ch{j}.xhtml": leak for j in range(5)})
+    checker = EPUBTranslationChecker(workers=0)
+    scanned = []
+    original = checker.check_html_content
+    checker.check_html_content = lambda html, name: scanned.append(name) or original(html, name)
+
+    first = checker.check_epub(str(path))
+    assert len(scanned) == 5 and first['untranslated_count'] == 5
+
+    # 修补了一个章节：下一轮只扫描它
+    with zipfile.ZipFile(path) as zf:
+        entries = {info.filename: zf.read(info) for info in zf.infolist()}
+    entries["OEBPS/ch2.xhtml"] = "<html><body><p>已经修补好的中文。</p></body></html>".encode("utf-8")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    scanned.clear()
+
+    second = checker.check_epub(str(path))
+    assert scanned == ["OEBPS/ch2.xhtml"]
+    assert second['cached_files'] == 4 and second['total_files'] == 5
+    assert second['untranslated_count'] == 4
+    assert "OEBPS/ch2.xhtml" not in {item['file'] for item in second['details']}
+    # 新的检查器没有索引，结果一致
+    assert EPUBTranslationChecker(workers=0).check_epub(str(path))['details'] == second['details']
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.circuit_breaker import CircuitBreaker, CircuitState
+from core.client import AsyncDoubaoClient
+from core.exceptions import QuotaExceededError
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_probe():
+    breaker = CircuitBreaker("m", failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitState.HALF_OPEN
+    # half_open 时只放行一个探测请求
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert [t['to'] for t in breaker.get_stats()['transitions']] == ["open", "half_open", "closed"]
+
+
+def test_failed_probe_doubles_recovery_timeout():
+    breaker = CircuitBreaker("m", failure_threshold=1, recovery_timeout=0.05, max_recovery_timeout=1.0)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.get_stats()['retry_in_seconds'] == pytest.approx(0.1, abs=0.05)
+    time.sleep(0.06)
+    assert not breaker.is_available()
+
+
+@pytest.mark.asyncio
+async def test_quota_exhausted_model_is_skipped_then_probed(monkeypatch):
+    client = AsyncDoubaoClient(api_key="test-key", models=["fast-model", "backup-model"], target_language="zh")
+    calls = []
+    quota_left = {'fast-model': False}
+
+    async def fake_chat(text, source, target, model):
+        calls.append(model)
+        if model == "fast-model" and not quota_left[model]:
+            raise QuotaExceededError('Chat API 429: {"error": {"code": "SetLimitExceeded"}}')
+        return f"{model}:{text}", 1, 1
+
+    monkeypatch.setattr(client, "_request_chat_endpoint", fake_chat)
+    try:
+        assert await client.async_translate("a") == "backup-model:a"
+        assert client.breakers["fast-model"].state == CircuitState.OPEN
+
+        calls.clear()
+        assert await client.async_translate("b") == "backup-model:b"
+        assert calls == ["backup-model"]
+
+        # 额度恢复 (如充值) 后，熔断到期的探测请求会让模型重新启用
+        quota_left['fast-model'] = True
+        client.breakers["fast-model"]._open_until = time.monotonic()
+        assert await client.async_translate("c") == "fast-model:c"
+        assert client.breakers["fast-model"].state == CircuitState.CLOSED
+    finally:
+        await client.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.client import AsyncDoubaoClient, AsyncTranslator
+from core.config import TranslatorConfig, get_model_max_input_tokens, get_model_rate_limits
+from core.concurrency import AdaptiveConcurrencyLimiter
+from core.rate_limiter import TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_upstream_call(monkeypatch):
+    client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"], target_language="zh")
+    calls = []
+
+    async def fake_special(text, source, target, model):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return f"译:{text}", 1, 1
+
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        results = await asyncio.gather(*[client.async_translate(t) for t in ["Chapter 1", "Chapter 1", "Note", "Chapter 1"]])
+        assert results == ["译:Chapter 1", "译:Chapter 1", "译:Note", "译:Chapter 1"]
+        assert sorted(calls) == ["Chapter 1", "Note"]
+
+        stats = client.get_flight_stats()
+        assert stats['requests'] == 4
+        assert stats['deduplicated'] == 2
+        assert stats['dedup_ratio'] == 0.5
+        assert client._inflight == {}
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call(monkeypatch):
+    client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"], target_language="zh")
+
+    async def fake_special(text, source, target, model):
+        await asyncio.sleep(0.02)
+        return "ok", 1, 1
+
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        first = asyncio.ensure_future(client.async_translate("same"))
+        second = asyncio.ensure_future(client.async_translate("same"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "ok"
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_translator_stats_expose_runtime_metrics():
+    translator = AsyncTranslator(TranslatorConfig(api_key="test-key", models=["m1"], cache_enabled=False))
+    try:
+        stats = translator.get_stats()
+        assert stats['m1']['calls'] == 0
+        assert '_singleflight' in stats
+        assert '_cache' not in stats
+    finally:
+        await translator.close()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_smooths_bursts():
+    bucket = TokenBucket(rate=100.0, capacity=5)
+    start = time.monotonic()
+    for _ in range(15):
+        await bucket.acquire(1)
+    elapsed = time.monotonic() - start
+    # 前 5 个令牌来自突发容量，其余 10 个需按 100/s 补充
+    assert elapsed >= 0.09
+    assert bucket.throttled > 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_oversized_request_goes_into_debt():
+    bucket = TokenBucket(rate=1000.0, capacity=10)
+    await bucket.acquire(50)
+    assert bucket._tokens < 0
+
+
+def test_model_rate_limits_follow_lanes_and_overrides():
+    assert get_model_rate_limits("doubao-seed-translation-250915") == (5000, 500_000)
+    assert get_model_rate_limits("deepseek-v3-250324")[0] == 30000
+    assert get_model_rate_limits("deepseek-v3-250324", {"deepseek-v3-250324": 1200})[0] == 1200
+
+
+def test_model_input_limits_follow_model_names_and_overrides():
+    assert get_model_max_input_tokens("doubao-seed-translation-250915") == 900
+    assert get_model_max_input_tokens("doubao-1-5-vision-pro-32k-250115") == 14400
+    assert get_model_max_input_tokens("kimi-k2-250905") > 900
+    assert get_model_max_input_tokens("deepseek-v3-250324", {"deepseek-v3-250324": 5000}) == 5000
+
+
+@pytest.mark.asyncio
+async def test_client_builds_per_model_limiters_from_config():
+    translator = AsyncTranslator(TranslatorConfig(
+        api_key="test-key", models=["deepseek-v3-250324"], cache_enabled=False,
+        max_requests_per_second=10.0, model_rpm_overrides={"deepseek-v3-250324": 600},
+    ))
+    try:
+        client = translator.client
+        assert client.global_bucket.rate == 10.0
+        limiter = client._get_rate_limiter("deepseek-v3-250324")
+        assert limiter.rpm == pytest.approx(600 * 0.95)
+        assert client._estimate_request_tokens("one two three", "deepseek-v3-250324", "zh") > \
+            client._estimate_request_tokens("one two three", "doubao-seed-translation-250915", "zh")
+    finally:
+        await translator.close()
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_blocks_at_limit_and_backs_off():
+    limiter = AdaptiveConcurrencyLimiter("m", initial_limit=4)
+    for _ in range(4):
+        await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    limiter.record_congestion()
+    assert limiter.limit == 2
+    # 同一冷却窗口内的第二次 429 不再减半
+    limiter.record_congestion()
+    assert limiter.limit == 2
+
+    for _ in range(4):
+        limiter.release()
+    await asyncio.sleep(0)
+    assert waiter.done()
+    assert limiter.inflight == 1
+    limiter.release()
+
+
+def test_adaptive_limiter_recovers_additively_up_to_max():
+    limiter = AdaptiveConcurrencyLimiter("m", initial_limit=8)
+    limiter.record_congestion()
+    assert limiter.limit == 4
+    for _ in range(200):
+        limiter.record_success(0.1)
+    assert limiter.limit == 8
+    assert limiter.get_stats()['history'][-1]['reason'] == "increase"
+
+
+def test_adaptive_limiter_reacts_to_rising_latency():
+    limiter = AdaptiveConcurrencyLimiter("m", initial_limit=16)
+    for _ in range(5):
+        limiter.record_success(0.1)
+    for _ in range(20):
+        limiter.record_success(2.0)
+    assert limiter.limit < 16
+    assert any(h['reason'] == "latency" for h in limiter.get_stats()['history'])
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_wait_does_not_hold_a_concurrency_slot(monkeypatch):
+    client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"], target_language="zh")
+    model = "doubao-seed-translation-250915"
+    gate = asyncio.Event()
+    rate_acquire = client._acquire_rate_limit
+
+    async def throttled(model, estimated_tokens):
+        await gate.wait()
+        await rate_acquire(model, estimated_tokens)
+
+    async def fake_special(text, source, target, model):
+        return f"译:{text}", 1, 1
+
+    monkeypatch.setattr(client, "_acquire_rate_limit", throttled)
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        task = asyncio.ensure_future(client.async_translate("Chapter 1"))
+        await asyncio.sleep(0.01)
+        # 在令牌桶排队的请求还没有占用车道的并发名额
+        assert not task.done() and client._get_semaphore(model).inflight == 0
+        gate.set()
+        assert await task == "译:Chapter 1"
+    finally:
+        await client.close()
+
+
+def test_from_env_keeps_the_20_rps_default(monkeypatch):
+    monkeypatch.delenv("REQUESTS_PER_MINUTE", raising=False)
+    monkeypatch.delenv("MAX_REQUESTS_PER_SECOND", raising=False)
+    assert TranslatorConfig.from_env().max_requests_per_second == 20.0
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import asyncio
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors.epub_checkpoint import EpubCheckpoint
+from processors.epub_worker import EpubProcessor
+from conftest import StubTranslator, make_book, prefixed
+
+
+@pytest.mark.asyncio
+async def test_restart_translates_only_unfinished_chapters(tmp_path, monkeypatch):
+    # 每批一个段落，章节之间互不牵连
+    monkeypatch.setenv("EPUB_BATCH_SEGMENTS", "1")
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    make_book(src, {f"ch{i}.xhtml": f"<p>Chapter {i} text</p>" for i in range(1, 5)})
+
+    crashing = StubTranslator(reply=prefixed, crash_on="Chapter 3 text")
+    with pytest.raises(asyncio.CancelledError):
+        await EpubProcessor(crashing).translate_epub(str(src), str(out))
+    assert EpubCheckpoint.exists_for(str(out))
+    assert set(crashing.requested) == {"Chapter 1 text", "Chapter 2 text", "Chapter 4 text"}
+
+    resumed = StubTranslator(reply=prefixed)
+    result = await EpubProcessor(resumed).translate_epub(str(src), str(out))
+
+    assert resumed.requested == ["Chapter 3 text"]
+    assert result['resumed_count'] == 3
+    assert not EpubCheckpoint.exists_for(str(out))
+    with zipfile.ZipFile(out) as zf:
+        for i in range(1, 5):
+            assert f"<p>译Chapter {i} text</p>" in zf.read(f"OEBPS/ch{i}.xhtml").decode()
+
+
+def test_changed_source_chapter_is_retranslated(tmp_path):
+    out = tmp_path / "book_zh.epub"
+    checkpoint = EpubCheckpoint(str(out), target_lang="zh")
+    checkpoint.put("OEBPS/ch1.xhtml", b"<p>old</p>", "<p>旧</p>".encode())
+    assert checkpoint.get("OEBPS/ch1.xhtml", b"<p>old</p>") == "<p>旧</p>".encode()
+    assert checkpoint.get("OEBPS/ch1.xhtml", b"<p>new</p>") is None
+    assert EpubCheckpoint(str(out), target_lang="ja").get("OEBPS/ch1.xhtml", b"<p>old</p>") is None
+    checkpoint.discard()
+    assert not EpubCheckpoint.exists_for(str(out))
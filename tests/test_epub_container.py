@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import os
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors import epub_container
+from processors.epub_container import EpubContainer, pack_directory, resolve_href
+from processors.epub_worker import EpubProcessor
+from tools.benchmark import make_epub
+from conftest import StubTranslator, upper
+
+
+def _raw_entry(path, name: str) -> bytes:
+    """读取条目的原始压缩字节 (跳过本地文件头)"""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name)
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = int.from_bytes(f.read(2), 'little'), int.from_bytes(f.read(2), 'little')
+        f.seek(name_len + extra_len, os.SEEK_CUR)
+        return f.read(info.compress_size)
+
+
+def _make_nonstandard_book(path: Path, image: bytes):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("OEBPS/cover.png", image)
+        # 不标准的书：mimetype 不在首位且被压缩
+        zf.writestr("mimetype", "application/epub+zip")
+        zf.writestr("OEBPS/ch1.xhtml", "<p>Hello</p>")
+    # 流式写入的条目带 data descriptor
+    with zipfile.ZipFile(path, "a", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("OEBPS/font.otf", "w") as f:
+            f.write(b"font" * 5000)
+
+
+def test_save_copies_untouched_entries_raw_and_puts_mimetype_first(tmp_path):
+    src, out = tmp_path / "book.epub", tmp_path / "out.epub"
+    image = os.urandom(4096) + b"\0" * 4096
+    _make_nonstandard_book(src, image)
+
+    with EpubContainer(src) as container:
+        container.write("OEBPS/ch1.xhtml", "<p>你好</p>")
+        container.save(out)
+
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        first = zf.infolist()[0]
+        assert (first.filename, first.compress_type) == ("mimetype", zipfile.ZIP_STORED)
+        assert zf.read("OEBPS/ch1.xhtml").decode() == "<p>你好</p>"
+        assert zf.read("OEBPS/cover.png") == image
+        assert zf.read("OEBPS/font.otf") == b"font" * 5000
+    for name in ("OEBPS/cover.png", "OEBPS/font.otf"):
+        assert _raw_entry(out, name) == _raw_entry(src, name)
+
+
+@pytest.mark.parametrize("raw", [True, False])
+def test_save_falls_back_to_writestr_when_raw_append_is_unsupported(tmp_path, monkeypatch, raw):
+    # 当前 Python 通过自检；False 模拟 zipfile 内部结构变化后的退回路径
+    assert epub_container.raw_append_supported()
+    monkeypatch.setattr(epub_container, "raw_append_supported", lambda: raw)
+    src, out = tmp_path / "book.epub", tmp_path / "out.epub"
+    image = os.urandom(4096)
+    _make_nonstandard_book(src, image)
+
+    with EpubContainer(src) as container:
+        container.write("OEBPS/ch1.xhtml", "<p>你好</p>" * 100)
+        container.write("OEBPS/new.xhtml", "<p>新增</p>")
+        container.save(out)
+
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["mimetype", "OEBPS/cover.png", "OEBPS/ch1.xhtml", "OEBPS/font.otf", "OEBPS/new.xhtml"]
+        assert zf.read("OEBPS/ch1.xhtml").decode() == "<p>你好</p>" * 100
+        assert zf.read("OEBPS/cover.png") == image
+        assert zf.read("OEBPS/font.otf") == b"font" * 5000
+        assert zf.getinfo("OEBPS/ch1.xhtml").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_save_without_output_updates_book_in_place(tmp_path):
+    src = tmp_path / "book.epub"
+    _make_nonstandard_book(src, b"png")
+    with EpubContainer(src) as container:
+        container.write("OEBPS/ch1.xhtml", "<p>改</p>")
+        container.save()
+    with zipfile.ZipFile(src) as zf:
+        assert zf.read("OEBPS/ch1.xhtml").decode() == "<p>改</p>"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["book.epub"]
+
+
+def test_saving_in_place_twice_rereads_the_replaced_book(tmp_path):
+    src = tmp_path / "book.epub"
+    image = os.urandom(4096)
+    _make_nonstandard_book(src, image)
+    with EpubContainer(src) as container:
+        # 第一次保存让 ch1 变长，其后条目的偏移随之改变
+        container.write("OEBPS/ch1.xhtml", "<p>第一轮</p>" + os.urandom(2048).hex())
+        container.save()
+        assert container.modified_names == []
+        container.write("OEBPS/ch1.xhtml", "<p>第二轮</p>")
+        container.save()
+        assert container.read("OEBPS/font.otf") == b"font" * 5000
+    with zipfile.ZipFile(src) as zf:
+        assert zf.testzip() is None
+        assert zf.read("OEBPS/ch1.xhtml").decode() == "<p>第二轮</p>"
+        assert zf.read("OEBPS/cover.png") == image
+        assert zf.read("OEBPS/font.otf") == b"font" * 5000
+
+
+def test_save_is_reproducible_and_stores_precompressed_media(tmp_path, monkeypatch):
+    src = tmp_path / "book.epub"
+    _make_nonstandard_book(src, b"png")
+    chapters = {f"OEBPS/ch{i}.xhtml": ("<p>第 %d 章</p>" % i) * 20000 for i in range(4)}
+    photo = os.urandom(100_000)
+
+    outputs = []
+    for workers in ("1", "4"):
+        out = tmp_path / f"out{workers}.epub"
+        monkeypatch.setenv("EPUB_PACK_WORKERS", workers)
+        with EpubContainer(src) as container:
+            for name, text in chapters.items():
+                container.write(name, text)
+            container.write("OEBPS/images/photo.JPG", photo)
+            container.save(out)
+        outputs.append(out.read_bytes())
+
+    # 串行与并行压缩得到完全相同的字节
+    assert outputs[0] == outputs[1]
+    with zipfile.ZipFile(tmp_path / "out4.epub") as zf:
+        assert zf.testzip() is None
+        assert zf.getinfo("OEBPS/images/photo.JPG").compress_type == zipfile.ZIP_STORED
+        assert zf.read("OEBPS/images/photo.JPG") == photo
+        info = zf.getinfo("OEBPS/ch2.xhtml")
+        assert info.compress_type == zipfile.ZIP_DEFLATED and info.compress_size < info.file_size
+        assert zf.read("OEBPS/ch2.xhtml").decode() == chapters["OEBPS/ch2.xhtml"]
+
+
+def test_pack_directory_puts_mimetype_first_in_sorted_order(tmp_path):
+    src = tmp_path / "book.epub"
+    make_epub(src, chapters=3, paragraphs=2)
+    work = tmp_path / "work"
+    with zipfile.ZipFile(src) as zf:
+        zf.extractall(work)
+        expected = {name: zf.read(name) for name in zf.namelist()}
+    (work / "OEBPS" / "cover.png").write_bytes(os.urandom(512))
+
+    pack_directory(work, tmp_path / "a.epub", workers=1)
+    pack_directory(work, tmp_path / "b.epub", workers=4)
+
+    assert (tmp_path / "a.epub").read_bytes() == (tmp_path / "b.epub").read_bytes()
+    with zipfile.ZipFile(tmp_path / "b.epub") as zf:
+        names = zf.namelist()
+        assert names[0] == "mimetype" and zf.infolist()[0].compress_type == zipfile.ZIP_STORED
+        assert names[1:] == sorted(names[1:])
+        assert zf.getinfo("OEBPS/cover.png").compress_type == zipfile.ZIP_STORED
+        for name, data in expected.items():
+            assert zf.read(name) == data
+
+
+def test_resolve_href_normalises_relative_and_escaped_paths():
+    assert resolve_href("OEBPS", "Text/ch%201.xhtml#p3") == "OEBPS/Text/ch 1.xhtml"
+    assert resolve_href("OEBPS/Text", "../nav.xhtml") == "OEBPS/nav.xhtml"
+    assert resolve_href("", "content.opf") == "content.opf"
+
+
+@pytest.mark.asyncio
+async def test_translate_epub_rewrites_only_text_entries(tmp_path):
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    make_epub(src, chapters=2, paragraphs=3)
+    with zipfile.ZipFile(src, "a") as zf:
+        zf.writestr("OEBPS/images/photo.jpg", os.urandom(2048), compress_type=zipfile.ZIP_DEFLATED)
+
+    result = await EpubProcessor(StubTranslator(reply=upper)).translate_epub(str(src), str(out))
+
+    assert result['success'] and result['failed_count'] == 0
+    with zipfile.ZipFile(out) as zf:
+        assert zf.namelist()[0] == "mimetype"
+        assert "译" in zf.read("OEBPS/chapter001.xhtml").decode("utf-8")
+        assert "译BENCHMARK BOOK" in zf.read("OEBPS/content.opf").decode("utf-8")
+    assert _raw_entry(out, "OEBPS/images/photo.jpg") == _raw_entry(src, "OEBPS/images/photo.jpg")
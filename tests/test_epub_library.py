@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors.epub_library import BookJob, EpubLibrary
+from tools.benchmark import make_epub
+from conftest import StubTranslator, prefixed
+
+
+@pytest.mark.asyncio
+async def test_books_share_one_translator_under_a_global_inflight_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("EPUB_BATCH_SEGMENTS", "2")
+    jobs = []
+    for i in range(3):
+        src = tmp_path / f"book{i}.epub"
+        make_epub(src, chapters=2, paragraphs=4, seed=i)
+        jobs.append(BookJob(str(src), str(tmp_path / f"book{i}_translated.epub")))
+
+    translator = StubTranslator(reply=prefixed, delay=0.01)
+    library = EpubLibrary(translator, max_books=3, max_inflight_segments=4)
+    done = []
+    results = await library.translate_all(jobs, on_book_done=lambda job, result: done.append(job.output_path))
+
+    assert sorted(done) == sorted(job.output_path for job in jobs)
+    assert all(results[job.output_path]['success'] for job in jobs)
+    assert all(results[job.output_path]['failed_count'] == 0 for job in jobs)
+    # 三本书共用 4 个在途段落 (= 2 个批次) 的额度，每本书单独时也能用满
+    assert translator.peak_inflight == 2
+    assert library.stats['peak_open_books'] == 3
+    for job in jobs:
+        with zipfile.ZipFile(job.output_path) as zf:
+            assert "译" in zf.read("OEBPS/chapter001.xhtml").decode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_a_broken_book_does_not_stop_the_others(tmp_path):
+    good, broken = tmp_path / "good.epub", tmp_path / "broken.epub"
+    make_epub(good, chapters=1, paragraphs=2)
+    broken.write_bytes(b"not a zip")
+    jobs = [BookJob(str(broken), str(tmp_path / "broken_translated.epub")),
+            BookJob(str(good), str(tmp_path / "good_translated.epub"))]
+
+    library = EpubLibrary(StubTranslator(reply=prefixed, delay=0.01), max_books=1)
+    results = await library.translate_all(jobs)
+
+    assert results[jobs[0].output_path]['success'] is False
+    assert results[jobs[1].output_path]['success'] is True
+    assert library.stats == {'books': 2, 'succeeded': 1, 'failed': 1, 'peak_open_books': 1}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import os
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from processors.block_ledger import BlockLedger
+from processors.epub_container import EpubContainer
+from processors.epub_worker import EpubProcessor, patch_untranslated
+from processors.epub_workspace import EpubWorkspace, book_exists, open_epub
+from tools.check_untranslated import EPUBTranslationChecker
+from conftest import StubTranslator, make_book
+
+STUBBORN = "This stubborn paragraph keeps failing to translate on the first attempt."
+
+
+def _make_book(path: Path):
+    make_book(path, {
+        "ch1.xhtml": f"<p>The first chapter begins with a quiet morning.</p><p>{STUBBORN}</p>",
+        "ch2.xhtml": "<p>The second chapter is short and simple.</p>",
+    }, media={"cover.png": os.urandom(2048)})
+
+
+def _objects(path: Path):
+    return sorted(os.listdir(EpubWorkspace.path_for(path) + "/objects"))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_on_the_workspace_and_exports_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("HTML_WORKERS", "0")
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    _make_book(src)
+    await EpubProcessor(StubTranslator(fail={STUBBORN})).translate_epub(str(src), str(out), workspace=True)
+
+    # 翻译只写入改动的条目，不打包 ePub
+    assert not out.exists()
+    with EpubWorkspace.open(out) as workspace:
+        assert sorted(workspace.stored_names) == ["OEBPS/ch1.xhtml", "OEBPS/ch2.xhtml"]
+        assert workspace.read("OEBPS/cover.png") == zipfile.ZipFile(src).read("OEBPS/cover.png")
+
+    # 质检与修补直接在工作区上进行：台账指纹与工作区清单一致
+    checker = EPUBTranslationChecker(workers=0)
+    ledger = BlockLedger.load(str(out))
+    report = checker.check_epub(str(out), ledger=ledger)
+    assert report['ledger_files'] == 2 and [item['full_text'] for item in report['details']] == [STUBBORN]
+    before = _objects(out)
+    with open_epub(out) as book:
+        assert isinstance(book, EpubWorkspace)
+        await patch_untranslated(book, report['details'], StubTranslator(), ledger=ledger)
+        book.save()
+    ledger.save()
+    assert not out.exists()
+    # 只有修补过的章节换了内容对象，旧对象被回收
+    assert len(set(_objects(out)) - set(before)) == 1 and len(_objects(out)) == 2
+    report = checker.check_epub(str(out), ledger=BlockLedger.load(str(out)))
+    assert report['untranslated_count'] == 0 and report['ledger_files'] == 2
+
+    with EpubWorkspace.open(out) as workspace:
+        expected = {name: workspace.read(name) for name in workspace.namelist()}
+        workspace.export()
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None and zf.namelist()[0] == "mimetype"
+        assert {name: zf.read(name) for name in zf.namelist()} == expected
+
+    # 导出后工作区以导出的 ePub 为底本，台账仍然有效
+    assert _objects(out) == []
+    with EpubWorkspace.open(out) as workspace:
+        assert workspace.stored_names == [] and workspace.path == str(out)
+    report = EPUBTranslationChecker(workers=0).check_epub(str(out), ledger=BlockLedger.load(str(out)))
+    assert report['ledger_files'] == 2 and report['untranslated_count'] == 0
+
+
+def test_workspace_is_ignored_once_the_epub_is_changed_elsewhere(tmp_path):
+    book = tmp_path / "book.epub"
+    _make_book(book)
+
+    with open_epub(book, create=True) as workspace:
+        workspace.write("OEBPS/ch2.xhtml", "<p>改过的第二章</p>")
+        workspace.write("OEBPS/ch1.xhtml", workspace.read("OEBPS/ch1.xhtml"))  # 与底本相同，不单独保存
+        workspace.save()
+        assert workspace.stored_names == ["OEBPS/ch2.xhtml"]
+        # 导出到其他路径：暂存的修改只进入导出的文件
+        workspace.write("OEBPS/ch1.xhtml", "<p>只在副本里</p>")
+        workspace.save(tmp_path / "copy.epub")
+    with zipfile.ZipFile(tmp_path / "copy.epub") as zf:
+        assert zf.read("OEBPS/ch1.xhtml").decode() == "<p>只在副本里</p>"
+        assert zf.read("OEBPS/ch2.xhtml").decode() == "<p>改过的第二章</p>"
+    with open_epub(book) as workspace:
+        assert workspace.stored_names == ["OEBPS/ch2.xhtml"]
+        assert b"quiet morning" in workspace.read("OEBPS/ch1.xhtml")
+
+    # ePub 本身被其他工具改写：工作区失效，退回直接读写 ePub
+    with EpubContainer(book) as container:
+        container.write("OEBPS/ch1.xhtml", "<p>外部修改</p>")
+        container.save()
+    assert EpubWorkspace.open(book) is None
+    with open_epub(book, create=False) as container:
+        assert not isinstance(container, EpubWorkspace)
+        assert container.read_text("OEBPS/ch2.xhtml") != "<p>改过的第二章</p>"
+
+
+def test_invalidated_workspace_is_not_a_book_and_create_reuses_stored_objects(tmp_path):
+    src, out = tmp_path / "book.epub", tmp_path / "book_zh.epub"
+    _make_book(src)
+    with EpubWorkspace.create(out, src) as workspace:
+        workspace.write("OEBPS/ch1.xhtml", "<p>第一章</p>")
+        workspace.write("OEBPS/ch2.xhtml", "<p>第二章</p>")
+        workspace.save()
+    assert book_exists(out) and not out.exists()
+    stored = {name: os.stat(EpubWorkspace.path_for(out) + "/objects/" + name).st_mtime_ns
+              for name in _objects(out)}
+
+    # 重新翻译：新工作区从底本开始，相同的章节复用已存的对象，不再引用的对象在提交时回收
+    with EpubWorkspace.create(out, src) as workspace:
+        assert workspace.stored_names == []
+        assert b"quiet morning" in workspace.read("OEBPS/ch1.xhtml")
+        assert _objects(out) == sorted(stored)
+        workspace.write("OEBPS/ch1.xhtml", "<p>第一章</p>")
+        workspace.save()
+    [kept] = _objects(out)
+    assert os.stat(EpubWorkspace.path_for(out) + "/objects/" + kept).st_mtime_ns == stored[kept]
+
+    # 源文件 (底本) 被改动：工作区失效，尚未导出的书不再存在
+    with zipfile.ZipFile(src, "a") as zf:
+        zf.writestr("OEBPS/extra.xhtml", "<p>new</p>")
+    assert EpubWorkspace.exists_for(out) and not book_exists(out)
+    with pytest.raises(FileNotFoundError, match="工作区已失效"):
+        open_epub(out)
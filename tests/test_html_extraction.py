@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+from lxml import etree
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.exceptions import FileProcessingError
+from processors import html_worker, lxml_engine
+from processors.html_worker import HTMLProcessor
+from conftest import StubTranslator, upper
+
+
+def _reference_leaf_blocks(processor: HTMLProcessor, soup: BeautifulSoup):
+    """原实现：find_all + 子树查找 + 祖先检查 (用作对照)"""
+    return [
+        block for block in soup.find_all(processor.block_tags)
+        if not block.find(processor.block_tags)
+        and not any(parent.name in processor.exclude_tags for parent in block.parents)
+    ]
+
+
+def _random_html(rng: random.Random, depth: int = 0) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        tag = rng.choice(["div", "p", "span", "li", "pre", "code", "blockquote", "em", "td"])
+        inner = _random_html(rng, depth + 1) if depth < 5 and rng.random() < 0.6 else f"text {rng.randint(0, 99)}"
+        parts.append(f"<{tag}>{inner}</{tag}>")
+    return "".join(parts)
+
+
+def test_single_pass_matches_reference_extraction():
+    processor = HTMLProcessor(translator=None)
+    rng = random.Random(7)
+    for _ in range(50):
+        soup = BeautifulSoup(f"<html><body>{_random_html(rng)}</body></html>", "html.parser")
+        assert processor._collect_leaf_blocks(soup) == _reference_leaf_blocks(processor, soup)
+
+
+def test_lxml_extraction_matches_bs4_extraction():
+    bs4_processor = HTMLProcessor(translator=None, engine="bs4")
+    lxml_processor = HTMLProcessor(translator=None, engine="lxml")
+    rng = random.Random(11)
+    for _ in range(50):
+        html = f"<html><body>{_random_html(rng)}</body></html>"
+        expected = [text for _, text in bs4_processor._extract_target_blocks(BeautifulSoup(html, "lxml"), "zh")]
+        document = lxml_engine.parse_document(html)
+        assert [text for _, text in lxml_processor._extract_target_blocks(document, "zh")] == expected
+
+
+@pytest.mark.parametrize("leaf_only", [True, False])
+def test_lxml_single_pass_walk_matches_xpath_reference(leaf_only):
+    processor = HTMLProcessor(translator=None, engine="lxml")
+    names = lambda tags: " or ".join(f"local-name()='{tag}'" for tag in sorted(tags))
+    expr = f"//*[{names(processor.block_tags)}][not(ancestor::*[{names(processor.exclude_tags)}])]"
+    reference = etree.XPath(expr + (f"[not(descendant::*[{names(processor.block_tags)}])]" if leaf_only else ""))
+    rng = random.Random(5)
+    for _ in range(50):
+        root = lxml_engine.parse_document(f"<html><body>{_random_html(rng)}</body></html>").root
+        assert lxml_engine.collect_blocks(root, processor.block_tags, processor.exclude_tags,
+                                          leaf_only=leaf_only) == reference(root)
+
+
+def test_excluded_subtrees_still_make_their_ancestors_non_leaf():
+    processor = HTMLProcessor(translator=None)
+    soup = BeautifulSoup("<div><pre><p>code</p></pre></div><div><p>Keep</p><script><p>x</p></script></div>",
+                         "html.parser")
+    assert [b.get_text() for b in processor._collect_leaf_blocks(soup)] == ["Keep"]
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_deeply_nested_divs_do_not_hit_recursion_limit(engine):
+    processor = HTMLProcessor(translator=None, workers=0, engine=engine)
+    depth = 3000
+    html = "<html><body>" + "<div>" * depth + "<p>Deep paragraph.</p>" + "</div>" * depth + "</body></html>"
+    blocks = processor._extract_target_blocks(processor._parse_document(html), "zh")
+    assert [text for _, text in blocks] == ["Deep paragraph."]
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_deeply_nested_paragraphs_all_survive_refill(engine):
+    # 超过 libxml2 的 2048 层上限：lxml 引擎改用 html.parser，不能丢段落
+    processor = HTMLProcessor(translator=None, workers=0, engine=engine)
+    depth = 3000
+    html = "<html><body>" + "".join(f"<div><p>Paragraph {i}</p>" for i in range(depth)) + "</div>" * depth + "</body></html>"
+    assert len(processor.extract_segments(html, "zh")) == depth
+    output, count = processor.refill_segments(html, "zh", [f"段落{i}" for i in range(depth)])
+    assert count == depth
+    assert all(f"段落{i}<" in output for i in range(depth))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers", [0, 1])
+@pytest.mark.parametrize("engine, refilled", [("bs4", "<p>译HELLO WORLD<b></b></p>"),
+                                              ("lxml", "<p>译HELLO WORLD<b/></p>")])
+async def test_process_file_extracts_and_refills_off_the_event_loop(tmp_path, workers, engine, refilled):
+    src = tmp_path / "chapter.xhtml"
+    src.write_text('<?xml version="1.0" encoding="utf-8"?>\n<html><body>'
+                   '<div><p>Hello <b>world</b></p><pre><p>skip</p></pre></div><p>Bye</p></body></html>',
+                   encoding="utf-8")
+    processor = HTMLProcessor(StubTranslator(reply=upper), workers=workers, engine=engine)
+    result = await processor.process_file(str(src), str(tmp_path / "out.xhtml"))
+
+    out = (tmp_path / "out.xhtml").read_text(encoding="utf-8")
+    assert result['translated_count'] == 2
+    assert out.startswith('<?xml version="1.0" encoding="utf-8"?>')
+    assert refilled in out
+    assert "<p>skip</p>" in out and "<p>译BYE</p>" in out
+    if workers:
+        # 解析在工作进程中进行，峰值 RSS 由工作进程自己测量后带回
+        assert html_worker._worker_peaks and os.getpid() not in html_worker._worker_peaks
+        assert html_worker.worker_peak_rss_mb() > 0
+
+
+def test_refill_rejects_misaligned_translations():
+    processor = HTMLProcessor(translator=None, workers=0)
+    html = "<html><body><p>One</p><p>Two</p></body></html>"
+    assert processor.extract_segments(html, "zh") == [["One"], ["Two"]]
+    with pytest.raises(FileProcessingError):
+        processor.refill_segments(html, "zh", ["一"])
+
+
+XHTML_CHAPTER = ('<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+                 '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                 '<head><title>Ch 1</title></head>\n<body>\n'
+                 '<p class="first">Fish &amp; chips&nbsp;<i>today</i></p>\n<p>Keep   <a href="#n1">spacing</a></p>\n'
+                 '</body>\n</html>\n')
+
+
+def test_lxml_engine_round_trips_untouched_xhtml_byte_for_byte():
+    processor = HTMLProcessor(translator=None, workers=0, engine="lxml")
+    assert processor.extract_segments(XHTML_CHAPTER, "zh") == [["Fish & chips today"], ["Keep spacing"]]
+    output, count = processor.refill_segments(XHTML_CHAPTER, "zh", [None, None])
+    assert count == 0 and output == XHTML_CHAPTER
+
+
+def test_lxml_engine_refills_in_place_and_keeps_xml_declaration():
+    processor = HTMLProcessor(translator=None, workers=0, engine="lxml")
+    output, count = processor.refill_segments(XHTML_CHAPTER, "zh", ["今天吃炸鱼薯条", None])
+    assert count == 1
+    assert output.startswith('<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n<html')
+    assert "<!--?xml" not in output
+    assert '<p class="first">今天吃炸鱼薯条<i/></p>' in output
+    # 未改动的块逐字节保留
+    assert '<p>Keep   <a href="#n1">spacing</a></p>' in output
+
+
+def test_lxml_engine_falls_back_to_html_parser_for_malformed_xhtml():
+    document = lxml_engine.parse_document('<?xml version="1.0"?>\n<html><body><p>Tom & Jerry<br></p></body></html>')
+    assert not document.is_xml
+    processor = HTMLProcessor(translator=None, workers=0, engine="lxml")
+    assert [text for _, text in processor._extract_target_blocks(document, "zh")] == ["Tom & Jerry"]
+    document.modified = True
+    assert document.serialize().startswith('<?xml version="1.0"?>\n<html>')
+
+
+def _reference_apply_fixes(html: str, fixes):
+    """原 apply-fix 实现：每条都 find_all 并逐个比较文本 (用作对照)"""
+    soup = BeautifulSoup(html, "html.parser")
+    applied = []
+    for fix in fixes:
+        for elem in soup.find_all(fix["tag"]):
+            text = elem.get_text(" ", strip=True)
+            if text == fix["original"] or fix["original"] in text:
+                elem.clear()
+                elem.append(fix["translation"])
+                applied.append(True)
+                break
+        else:
+            applied.append(False)
+    return str(soup), applied
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_indexed_apply_fixes_matches_per_segment_search(engine):
+    html = ("<html><body><div><p>Same line.</p><p>Same line.</p><p>Unique <b>bold</b> text.</p></div>"
+            "<li>Item with a longer tail</li><p>Outer <span>inner</span></p></body></html>")
+    fixes = [{"tag": "p", "original": "Same line.", "translation": "同一行一"},
+             {"tag": "p", "original": "Same line.", "translation": "同一行二"},
+             {"tag": "p", "original": "Same line.", "translation": "没有第三个"},
+             {"tag": "p", "original": "Unique bold text.", "translation": "唯一"},
+             {"tag": "li", "original": "longer", "translation": "包含匹配"},
+             {"tag": "div", "original": "Same line.", "translation": "子孙已改写，不再匹配"}]
+
+    output, applied = HTMLProcessor(translator=None, engine=engine).apply_fixes(html, fixes)
+    expected_output, expected = _reference_apply_fixes(html, fixes)
+
+    assert applied == expected == [True, True, False, True, True, False]
+    soup = BeautifulSoup(output, "html.parser")
+    assert [p.get_text() for p in soup.find_all("p")][:3] == ["同一行一", "同一行二", "唯一"]
+    assert soup.find("li").get_text() == "包含匹配"
+
+
+def test_apply_fixes_prefers_ledger_block_id_when_its_hash_still_matches():
+    from processors.block_ledger import block_hash
+    html = "<html><body><p>Repeated.</p><p>Repeated.</p></body></html>"
+    processor = HTMLProcessor(translator=None, engine="lxml")
+    fix = {"tag": "p", "original": "Repeated.", "translation": "第二个", "block_id": 1,
+           "block_hash": block_hash("Repeated.")}
+    output, applied = processor.apply_fixes(html, [fix])
+    assert applied == [True] and "<p>Repeated.</p><p>第二个</p>" in output
+    # 哈希不一致 (块已被改动)：退回按文本定位
+    output, applied = processor.apply_fixes(html, [dict(fix, block_hash="0" * 12)])
+    assert applied == [True] and "<p>第二个</p><p>Repeated.</p>" in output
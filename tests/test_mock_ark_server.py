@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.circuit_breaker import CircuitState
+from tools.mock_ark_server import MockArkConfig, create_app, pseudo_translate
+from conftest import make_client
+
+FAST_LATENCY = {"default": "fixed:0"}
+
+
+def test_pseudo_translation_is_deterministic():
+    assert pseudo_translate("Hello world.", "zh") == pseudo_translate("hello world.", "zh")
+    assert pseudo_translate("Hello world.", "zh").endswith(".")
+    assert pseudo_translate("Hello", "fr") == "[fr] Hello"
+
+
+@pytest.mark.asyncio
+async def test_client_round_trips_through_both_endpoints():
+    app = create_app(MockArkConfig(latency=FAST_LATENCY))
+    client = make_client(httpx.ASGITransport(app=app), ["doubao-seed-translation-250915", "deepseek-v3-250324"])
+    try:
+        short = await client.async_translate("Good morning.")
+        assert short == pseudo_translate("Good morning.", "zh")
+        # 超过 seed 输入上限的段落由客户端直接路由到 Chat 模型
+        long_text = "word " * 1000
+        assert await client.async_translate(long_text) == pseudo_translate(long_text.strip(), "zh")
+        stats = app.state.ark.stats
+        assert stats["doubao-seed-translation-250915"] == {'requests': 1, 'ok': 1}
+        assert stats["deepseek-v3-250324"] == {'requests': 1, 'ok': 1}
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_packed_requests_are_answered_per_segment():
+    app = create_app(MockArkConfig(latency=FAST_LATENCY))
+    client = make_client(httpx.ASGITransport(app=app), ["deepseek-v3-250324"])
+    try:
+        texts = ["One.", "Two.", "Three."]
+        assert await client.async_translate_many(texts) == [pseudo_translate(t, "zh") for t in texts]
+        assert client.get_pack_stats()['packs'] == 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_and_quota_produce_realistic_errors():
+    app = create_app(MockArkConfig(latency=FAST_LATENCY, rpm_overrides={"deepseek-v3-250324": 1},
+                                   quota_tokens={"kimi-k2-250905": 0}))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock",
+                                 headers={"Authorization": "Bearer k"}) as http:
+        payload = {"model": "deepseek-v3-250324", "messages": [{"role": "user", "content": "hi"}]}
+        assert (await http.post("/api/v3/chat/completions", json=payload)).status_code == 200
+        limited = await http.post("/api/v3/chat/completions", json=payload)
+        assert limited.status_code == 429
+        assert limited.json()["error"]["code"] == "RateLimitExceeded.EndpointRPMExceeded"
+        assert int(limited.headers["retry-after"]) > 0
+
+        quota = await http.post("/api/v3/chat/completions", json={**payload, "model": "kimi-k2-250905"})
+        assert quota.json()["error"]["code"] == "SetLimitExceeded"
+
+        unauthorized = await http.post("/api/v3/chat/completions", json=payload, headers={"Authorization": ""})
+        assert unauthorized.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_quota_exhaustion_fails_over_to_next_model():
+    app = create_app(MockArkConfig(latency=FAST_LATENCY, quota_tokens={"doubao-seed-translation-250915": 0}))
+    client = make_client(httpx.ASGITransport(app=app), ["doubao-seed-translation-250915", "deepseek-v3-250324"])
+    try:
+        assert await client.async_translate("Hello there.") == pseudo_translate("Hello there.", "zh")
+        assert client.breakers["doubao-seed-translation-250915"].state == CircuitState.OPEN
+    finally:
+        await client.close()
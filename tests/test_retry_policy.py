@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.client import AsyncDoubaoClient, _parse_retry_after
+from core.exceptions import (
+    APIError, InputTooLongError, QuotaExceededError, RateLimitError, TimeoutError as RequestTimeoutError,
+)
+from core.retry import RetryPolicy
+from conftest import chat_response, make_client
+
+
+FAST_RETRY = RetryPolicy(max_retries=3, base_delay=0.001, max_delay=1.0)
+
+
+def test_response_errors_are_classified_from_status_and_body():
+    def classify(status, body, headers=None):
+        return AsyncDoubaoClient._classify_response_error(httpx.Response(status, json=body, headers=headers), "Chat")
+
+    err = classify(429, {"error": {"code": "RateLimitExceeded"}}, {"Retry-After": "2"})
+    assert type(err) is RateLimitError and err.retry_after == 2.0
+    assert isinstance(classify(429, {"error": {"code": "SetLimitExceeded"}}), QuotaExceededError)
+    assert isinstance(classify(400, {"error": {"code": "InvalidParameter"}}), InputTooLongError)
+    assert classify(503, {"error": {"code": "ServiceUnavailable"}}).retryable
+    assert not classify(404, {"error": {"code": "ModelNotFound"}}).retryable
+    assert _parse_retry_after("not a date") is None
+
+
+def test_retry_budgets_are_per_error_class():
+    policy = RetryPolicy(max_retries=3, base_delay=0.01, max_delay=0.02)
+    state = policy.new_state()
+    assert [state.next_delay(RequestTimeoutError("t")) is not None for _ in range(3)] == [True, True, False]
+    # 超时预算用完不影响 429 的预算
+    assert state.next_delay(RateLimitError("r")) is not None
+    assert state.next_delay(APIError("bad request", status_code=400)) is None
+    assert state.next_delay(QuotaExceededError("q")) is None
+    assert all(0 <= policy.backoff(n) <= 0.02 for n in range(10))
+    assert policy.new_state().next_delay(RateLimitError("r", retry_after=5.0)) >= 5.0
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_request_backs_off_and_succeeds():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(1)
+        if len(attempts) < 3:
+            return httpx.Response(429, json={"error": {"code": "RateLimitExceeded"}}, headers={"Retry-After": "0"})
+        return chat_response("你好")
+
+    client = make_client(httpx.MockTransport(handler), retry_policy=FAST_RETRY)
+    try:
+        assert await client.async_translate("hello") == "你好"
+        assert len(attempts) == 3
+        assert client.get_retry_stats()['retries'] == 2
+        assert client.concurrency_limiters["deepseek-v3-250324"].decreases == 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_fall_through_without_retrying():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        seen.append(model)
+        if model == "deepseek-v3-250324":
+            return httpx.Response(400, json={"error": {"code": "InvalidParameter", "message": "input too long"}})
+        return chat_response("译文")
+
+    client = make_client(httpx.MockTransport(handler), ("deepseek-v3-250324", "doubao-pro-32k"),
+                         retry_policy=FAST_RETRY)
+    try:
+        assert await client.async_translate("long text") == "译文"
+        assert seen == ["deepseek-v3-250324", "doubao-pro-32k"]
+        assert client.get_retry_stats()['retries'] == 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_over_limit_text_skips_seed_model_without_calling_it():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen.append(body["model"])
+        if "input" in body:
+            return httpx.Response(200, json={"output": [{"content": [{"text": "短译"}]}]})
+        return chat_response("长译")
+
+    client = make_client(httpx.MockTransport(handler), ("doubao-seed-translation-250915", "deepseek-v3-250324"),
+                         retry_policy=FAST_RETRY)
+    try:
+        assert client.max_input_tokens["doubao-seed-translation-250915"] == 900
+        assert await client.async_translate("short sentence") == "短译"
+        assert await client.async_translate("word " * 1000) == "长译"
+        assert seen == ["doubao-seed-translation-250915", "deepseek-v3-250324"]
+        stats = client.get_routing_stats()
+        assert stats['skipped_calls'] == 1
+        assert stats['skipped_by_model'] == {"doubao-seed-translation-250915": 1}
+    finally:
+        await client.close()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.cache import TranslationCache
+from core.client import AsyncDoubaoClient
+from core.retry import RetryPolicy
+from core.exceptions import ValidationError
+from conftest import chat_response, make_client
+
+
+def test_parse_packed_response_validates_alignment():
+    assert AsyncDoubaoClient._parse_packed_response('```json\n{"1": "甲", "2": "乙"}\n```', 2) == ["甲", "乙"]
+    with pytest.raises(ValidationError):
+        AsyncDoubaoClient._parse_packed_response('{"1": "甲"}', 2)
+    with pytest.raises(ValidationError):
+        AsyncDoubaoClient._parse_packed_response('{"1": "甲", "2": ""}', 2)
+    with pytest.raises(ValidationError):
+        AsyncDoubaoClient._parse_packed_response('甲\n乙', 2)
+
+
+@pytest.mark.asyncio
+async def test_short_segments_are_packed_into_one_request():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        segments = json.loads(body["messages"][1]["content"])
+        requests.append(segments)
+        return chat_response(json.dumps({k: f"译:{v}" for k, v in segments.items()}, ensure_ascii=False))
+
+    client = make_client(httpx.MockTransport(handler))
+    try:
+        texts = ["Yes.", "No.", "", "Yes.", "Maybe later."]
+        results = await client.async_translate_many(texts)
+        assert results == ["译:Yes.", "译:No.", "", "译:Yes.", "译:Maybe later."]
+        assert len(requests) == 1
+        assert list(requests[0].values()) == ["Yes.", "No.", "Maybe later."]
+        assert client.get_pack_stats()['packed_segments'] == 3
+        assert client.model_stats["deepseek-v3-250324"]['calls'] == 1
+        assert (client.get_flight_stats()['requests'], client.get_flight_stats()['deduplicated']) == (4, 1)
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_misaligned_pack_falls_back_to_single_segments():
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        user = body["messages"][1]["content"]
+        if user.startswith("{"):
+            # 模型合并了两段，编号对不上
+            return chat_response('{"1": "合并后的译文"}')
+        return chat_response(f"单译:{user}")
+
+    client = make_client(httpx.MockTransport(handler))
+    try:
+        results = await client.async_translate_many(["First line.", "Second line."])
+        assert results == ["单译:First line.", "单译:Second line."]
+        assert client.get_pack_stats()['fallbacks'] == 1
+        # 退回逐段翻译的段落不重复计数
+        assert client.get_flight_stats()['requests'] == 2
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status, recovers", [(429, True), (503, True), (503, False)])
+async def test_throttled_pack_is_retried_whole_instead_of_split(status, recovers):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        user = json.loads(request.content)["messages"][1]["content"]
+        requests.append(user.startswith("{"))
+        if not recovers or len(requests) == 1:
+            return httpx.Response(status, headers={"Retry-After": "0"}, json={"error": {"message": "busy"}})
+        return chat_response(json.dumps({k: f"译:{v}" for k, v in json.loads(user).items()}, ensure_ascii=False))
+
+    policy = RetryPolicy(max_retries=2, base_delay=0.001, max_delay=1.0)
+    client = make_client(httpx.MockTransport(handler), retry_policy=policy)
+    try:
+        results = await client.async_translate_many(["First line.", "Second line.", "Third line."])
+        # 拥塞时不拆成单段请求
+        assert all(requests)
+        if recovers:
+            assert results == ["译:First line.", "译:Second line.", "译:Third line."]
+            assert len(requests) == 2 and client.get_retry_stats()['retries'] == 1
+        else:
+            assert results == ["[TRANSLATION_FAILED]"] * 3
+            assert client.get_pack_stats()['failed'] == 1
+        assert client.get_pack_stats()['fallbacks'] == 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_pack_does_not_cache_echoed_segments(tmp_path):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        user = json.loads(request.content)["messages"][1]["content"]
+        if not user.startswith("{"):
+            requests.append([user])
+            return chat_response(user)
+        segments = json.loads(user)
+        requests.append(list(segments.values()))
+        # 第 2 段被原样回显
+        return chat_response(json.dumps({"1": "是的。", "2": segments["2"]}, ensure_ascii=False))
+
+    client = make_client(httpx.MockTransport(handler), cache=TranslationCache(str(tmp_path / "tm.db")))
+    try:
+        await client.async_translate_many(["Yes.", "Lorem ipsum."])
+        # 第二次只有回显的那段需要重新请求
+        assert await client.async_translate_many(["Yes.", "Lorem ipsum."]) == ["是的。", "Lorem ipsum."]
+        assert requests == [["Yes.", "Lorem ipsum."], ["Lorem ipsum."]]
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_packs_respect_segment_limit_and_seed_models_are_not_packed():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        segments = json.loads(body["messages"][1]["content"])
+        seen.append(len(segments))
+        return chat_response(json.dumps({k: "译" for k in segments}))
+
+    client = make_client(httpx.MockTransport(handler), pack_max_segments=4)
+    try:
+        await client.async_translate_many([f"line {i}" for i in range(10)])
+        assert sorted(seen) == [2, 4, 4]
+    finally:
+        await client.close()
+
+    seed_client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"])
+    try:
+        assert seed_client._get_pack_model() is None
+    finally:
+        await seed_client.close()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.cache import TranslationCache, model_family, normalize_text
+from core.client import AsyncDoubaoClient
+
+
+def test_model_family_strips_date_suffix():
+    assert model_family("doubao-seed-translation-250915") == "doubao-seed-translation"
+    assert model_family("deepseek-v3-2-251201") == "deepseek-v3-2"
+    assert model_family("deepseek-v3-1-terminus") == "deepseek-v3-1-terminus"
+
+
+def test_cache_normalizes_whitespace_and_respects_language_pair(tmp_path):
+    cache = TranslationCache(str(tmp_path / "tm.db"))
+    try:
+        cache.put("Hello   world ", "en", "zh", "fam", "你好世界")
+        assert normalize_text("  Hello\n world") == "Hello world"
+        assert cache.get("Hello world", "en", "zh", ["fam"]) == "你好世界"
+        assert cache.get("Hello world", "en", "ja", ["fam"]) is None
+        assert cache.get("Hello world", "en", "zh", ["other", "fam"]) == "你好世界"
+
+        stats = cache.get_stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+    finally:
+        cache.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = TranslationCache(str(tmp_path / "tm.db"), max_entries=10)
+    try:
+        for i in range(30):
+            cache.put(f"text {i}", "", "zh", "fam", f"译文 {i}")
+        assert cache.get_stats()['evictions'] > 0
+        assert cache.get("text 29", "", "zh", ["fam"]) == "译文 29"
+        assert cache.get("text 0", "", "zh", ["fam"]) is None
+    finally:
+        cache.close()
+
+
+def test_cache_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "tm.db")
+    writer = TranslationCache(path)
+    reader = TranslationCache(path)
+    try:
+        writer.put("shared", "", "zh", "fam", "共享")
+        assert reader.get("shared", "", "zh", ["fam"]) == "共享"
+    finally:
+        writer.close()
+        reader.close()
+
+
+@pytest.mark.asyncio
+async def test_client_serves_repeat_text_from_cache(tmp_path, monkeypatch):
+    cache = TranslationCache(str(tmp_path / "tm.db"))
+    client = AsyncDoubaoClient(
+        api_key="test-key",
+        models=["doubao-seed-translation-250915"],
+        target_language="zh",
+        cache=cache,
+    )
+    calls = []
+
+    async def fake_special(text, source, target, model):
+        calls.append(text)
+        return f"译:{text}", 1, 1
+
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        assert await client.async_translate("Chapter One") == "译:Chapter One"
+        assert await client.async_translate("Chapter  One ") == "译:Chapter One"
+        assert calls == ["Chapter One"]
+        assert cache.get_stats()['hits'] == 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reply", [
+    lambda text: f"  {text} ",               # 模型原样回显
+    lambda text: "[TRANSLATION_FAILED]",     # 翻译失败标记
+])
+async def test_client_does_not_cache_echoes_or_failures(tmp_path, monkeypatch, reply):
+    cache = TranslationCache(str(tmp_path / "tm.db"))
+    client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"],
+                               target_language="zh", cache=cache)
+    calls = []
+
+    async def fake_special(text, source, target, model):
+        calls.append(text)
+        return reply(text), 1, 1
+
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        await client.async_translate("Chapter One")
+        await client.async_translate("Chapter One")
+        assert calls == ["Chapter One", "Chapter One"]
+        assert cache.get_stats()['writes'] == 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_client_without_cache_reads_still_writes_new_translations(tmp_path, monkeypatch):
+    path = str(tmp_path / "tm.db")
+    seeded = TranslationCache(path)
+    seeded.put("Chapter One", "", "zh", "doubao-seed-translation", "旧译文")
+    seeded.close()
+
+    cache = TranslationCache(path)
+    client = AsyncDoubaoClient(api_key="test-key", models=["doubao-seed-translation-250915"],
+                               target_language="zh", cache=cache, cache_read=False)
+
+    async def fake_special(text, source, target, model):
+        return "新译文", 1, 1
+
+    monkeypatch.setattr(client, "_request_special_endpoint", fake_special)
+    try:
+        assert await client.async_translate("Chapter One") == "新译文"
+        assert cache.get("Chapter One", "", "zh", ["doubao-seed-translation"]) == "新译文"
+    finally:
+        await client.close()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+端到端吞吐基准测试 (Benchmark Suite)
+生成可配置规模的合成 EPUB / HTML / Markdown / JSON 语料，通过本地模拟接口 (tools/mock_ark_server.py)
+跑完整处理流程，输出机器可读的 JSON 结果，便于在不同提交之间对比回归。
+
+指标：墙钟时间、段落/秒、请求/秒、峰值 RSS、事件循环延迟 (mean / p99 / max)；
+--extraction 另测 HTML 块提取耗时随 DOM 节点数的变化；--engines 对比 lxml / bs4 引擎的解析+序列化耗时
+
+用法:
+    # 进程内模拟接口 (无网络)
+    python tools/benchmark.py --scale 1 --output bench.json
+
+    # 只测 EPUB，并与上一次结果对比
+    python tools/benchmark.py --processors epub --compare bench.json
+
+    # 只测 HTML 块提取的扩展性 (节点数翻倍时耗时应随之翻倍)
+    python tools/benchmark.py --processors "" --extraction
+
+    # 对比两种 HTML 引擎 (lxml 应比 bs4 快 5 倍以上)
+    python tools/benchmark.py --processors "" --engines
+
+    # 走真实 HTTP，连接单独启动的 mock 服务器 (需先设置 ARK_BASE_URL)
+    ARK_BASE_URL=http://127.0.0.1:8900/api/v3 python tools/benchmark.py --external
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import httpx
+from bs4 import BeautifulSoup
+
+# 添加项目根目录到 sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.client import AsyncTranslator
+from core.config import TranslatorConfig
+from processors.epub_worker import EpubProcessor
+from processors.html_worker import HTMLProcessor
+from processors.json_worker import JSONProcessor
+from processors.lxml_engine import ENGINES
+from processors.md_worker import MarkdownProcessor
+from tools.mock_ark_server import MockArkConfig, create_app
+
+PROCESSORS = ("epub", "html", "md", "json")
+DEFAULT_MODELS = ["doubao-seed-translation-250915", "deepseek-v3-250324"]
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog river mountain silence morning letter window "
+    "garden memory winter harbor lantern whisper shadow journey ancient castle promise "
+    "stranger evening candle distant thunder village forest ocean kingdom secret"
+).split()
+
+
+# ==================== 合成语料 ====================
+
+def _sentence(rng: random.Random, min_words: int = 6, max_words: int = 24) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+
+def _paragraph(rng: random.Random) -> str:
+    # 约 5% 的超长段落 (超过 seed-translation 输入上限)，其余为 1-6 句的普通段落
+    sentences = rng.randint(60, 90) if rng.random() < 0.05 else rng.randint(1, 6)
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _xhtml(title: str, paragraphs: List[str]) -> str:
+    body = "\n".join(f"<p>{p}</p>" for p in paragraphs)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+        f'<head><title>{title}</title></head>\n'
+        f'<body>\n<h1>{title}</h1>\n{body}\n</body>\n</html>\n'
+    )
+
+
+def make_html(path: Path, paragraphs: int, seed: int = 0):
+    rng = random.Random(seed)
+    path.write_text(_xhtml("Chapter", [_paragraph(rng) for _ in range(paragraphs)]), encoding="utf-8")
+
+
+def make_epub(path: Path, chapters: int, paragraphs: int, seed: int = 0):
+    rng = random.Random(seed)
+    manifest, spine, nav = [], [], []
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml",
+                    '<?xml version="1.0"?>\n'
+                    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                    '</rootfiles></container>')
+        for i in range(1, chapters + 1):
+            name = f"chapter{i:03d}.xhtml"
+            title = f"Chapter {i}: {_sentence(rng, 2, 5)}"
+            zf.writestr(f"OEBPS/{name}", _xhtml(title, [_paragraph(rng) for _ in range(paragraphs)]))
+            manifest.append(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="c{i}"/>')
+            nav.append(f'<li><a href="{name}">{title}</a></li>')
+        zf.writestr("OEBPS/nav.xhtml",
+                    '<?xml version="1.0" encoding="utf-8"?>\n'
+                    '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                    f'<head><title>Contents</title></head><body><nav epub:type="toc"><ol>{"".join(nav)}</ol></nav>'
+                    '</body></html>')
+        zf.writestr("OEBPS/content.opf",
+                    '<?xml version="1.0" encoding="utf-8"?>\n'
+                    '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">'
+                    '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                    '<dc:identifier id="id">benchmark-book</dc:identifier>'
+                    '<dc:title>Benchmark Book</dc:title><dc:creator>Synthetic Author</dc:creator>'
+                    '<dc:language>en</dc:language></metadata>'
+                    f'<manifest><item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+                    f'{"".join(manifest)}</manifest><spine>{"".join(spine)}</spine></package>')
+
+
+def make_markdown(path: Path, sections: int, seed: int = 0):
+    rng = random.Random(seed)
+    parts = ["---", "title: Benchmark Document", "description: Synthetic markdown corpus", "---", ""]
+    for i in range(1, sections + 1):
+        parts.append(f"## Section {i}: {_sentence(rng, 2, 5)}\n")
+        parts.extend(f"{_paragraph(rng)}\n" for _ in range(3))
+        parts.append("".join(f"- {_sentence(rng, 3, 8)}\n" for _ in range(3)))
+        parts.append("```python\nprint('code blocks are not translated')\n```\n")
+    path.write_text("\n".join(parts), encoding="utf-8")
+
+
+def make_json(path: Path, items: int, seed: int = 0):
+    rng = random.Random(seed)
+    data = []
+    for i in range(items):
+        text = _sentence(rng, 1, 12)
+        if rng.random() < 0.2:
+            text = f"<color=#ff0000>{text}</color>"
+        data.append({"id": i, "original": text, "translated": ""})
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+# ==================== 测量 ====================
+
+def _current_rss_mb() -> Optional[float]:
+    """当前常驻内存 (Linux 读 /proc，其他平台退回进程峰值；都取不到时为 None)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return _max_rss_mb()
+
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _format_mb(value: Optional[float]) -> str:
+    return f"{value:.0f}MB" if value is not None else "不可用"
+
+
+class LoopMonitor:
+    """后台采样事件循环延迟与 RSS"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        # 取不到内存信息的平台 (Windows 且无 /proc) 为 None
+        self.peak_rss_mb: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            rss = _current_rss_mb()
+            if rss is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss)
+
+    def __enter__(self):
+        self.peak_rss_mb = _current_rss_mb()
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self) -> Dict[str, float]:
+        if not self.lags:
+            return {'mean': 0.0, 'p99': 0.0, 'max': 0.0}
+        ordered = sorted(self.lags)
+        return {
+            'mean': round(statistics.fmean(ordered) * 1000, 2),
+            'p99': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+            'max': round(ordered[-1] * 1000, 2),
+        }
+
+
+# ==================== 运行 ====================
+
+def _build_translator(models: List[str], mock_config: MockArkConfig, external: bool) -> AsyncTranslator:
+    translator = AsyncTranslator(TranslatorConfig(
+        api_key=os.getenv("ARK_API_KEY") or "benchmark", models=models, cache_enabled=False,
+        max_requests_per_second=0,
+    ))
+    if not external:
+        # 进程内模拟接口：不走网络，但保留完整的 httpx 请求/响应路径
+        translator.client.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=create_app(mock_config)),
+            headers={"Authorization": "Bearer benchmark"},
+        )
+    return translator
+
+
+def _count_requests(translator: AsyncTranslator) -> Dict[str, int]:
+    """在 httpx 层计数实际发出的请求 (含重试与失败)"""
+    counter = {'requests': 0}
+
+    async def on_request(request: httpx.Request):
+        counter['requests'] += 1
+
+    translator.client.client.event_hooks['request'] = [on_request]
+    return counter
+
+
+async def _run_case(name: str, size: int, runner: Callable, models: List[str],
+                    mock_config: MockArkConfig, external: bool) -> Dict[str, Any]:
+    translator = _build_translator(models, mock_config, external)
+    counter = _count_requests(translator)
+    try:
+        with LoopMonitor() as monitor:
+            started = time.perf_counter()
+            result = await runner(translator)
+            wall = time.perf_counter() - started
+        stats = translator.get_stats()
+        segments = stats['_singleflight']['requests']
+        requests = counter['requests']
+        return {
+            'processor': name,
+            'size': size,
+            'wall_seconds': round(wall, 3),
+            'segments': segments,
+            'segments_per_second': round(segments / wall, 1) if wall else 0.0,
+            'requests': requests,
+            'requests_per_second': round(requests / wall, 1) if wall else 0.0,
+            'peak_rss_mb': round(monitor.peak_rss_mb, 1) if monitor.peak_rss_mb is not None else None,
+            'loop_lag_ms': monitor.summary(),
+            'success': bool(result.get('success', True)) if isinstance(result, dict) else True,
+        }
+    finally:
+        await translator.close()
+
+
+async def run_benchmarks(processors: List[str], scale: float, models: List[str], mock_config: MockArkConfig,
+                         external: bool = False, seed: int = 0) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        chapters = max(1, int(20 * scale))
+        cases = {
+            'epub': (chapters * 40, lambda: make_epub(work / "book.epub", chapters, 40, seed),
+                     lambda t: EpubProcessor(t).translate_epub(str(work / "book.epub"), str(work / "book_zh.epub"))),
+            'html': (max(1, int(400 * scale)), lambda: make_html(work / "page.xhtml", max(1, int(400 * scale)), seed),
+                     lambda t: HTMLProcessor(t).process_file(str(work / "page.xhtml"), str(work / "page_zh.xhtml"))),
+            'md': (max(1, int(100 * scale)), lambda: make_markdown(work / "doc.md", max(1, int(100 * scale)), seed),
+                   lambda t: MarkdownProcessor(t).translate_file(str(work / "doc.md"), str(work / "doc_zh.md"))),
+            'json': (max(1, int(2000 * scale)), lambda: make_json(work / "items.json", max(1, int(2000 * scale)), seed),
+                     lambda t: JSONProcessor(t).translate_file(str(work / "items.json"), str(work / "items_zh.json"))),
+        }
+        for name in processors:
+            size, build, runner = cases[name]
+            build()
+            result = await _run_case(name, size, runner, models, mock_config, external)
+            print(f"⏱️  {name:<5} size={size:<6} {result['wall_seconds']:>8.2f}s  "
+                  f"{result['segments_per_second']:>8.1f} seg/s  {result['requests_per_second']:>8.1f} req/s  "
+                  f"RSS {_format_mb(result['peak_rss_mb'])}  lag p99 {result['loop_lag_ms']['p99']}ms", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def _nested_div_soup(nodes: int, depth: int = 50) -> BeautifulSoup:
+    """生成约 nodes 个元素的深层嵌套 div 文档 (每条链 depth 层，末端一个段落)"""
+    chains = max(1, nodes // (depth + 1))
+    chain = "<div>" * depth + "<p>Deeply nested paragraph text.</p>" + "</div>" * depth
+    return BeautifulSoup(f"<html><body>{chain * chains}</body></html>", "html.parser")
+
+
+def bench_extraction(sizes: List[int], repeat: int = 3) -> List[Dict[str, Any]]:
+    """块提取耗时随节点数的变化 (线性遍历时 us/node 应基本恒定)"""
+    processor = HTMLProcessor(translator=None)
+    results = []
+    for nodes in sizes:
+        soup = _nested_div_soup(nodes)
+        actual_nodes = len(soup.find_all(True))
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            blocks = processor._extract_target_blocks(soup, "zh")
+            best = min(best, time.perf_counter() - started)
+        results.append({
+            'nodes': actual_nodes,
+            'blocks': len(blocks),
+            'seconds': round(best, 4),
+            'us_per_node': round(best / actual_nodes * 1e6, 2),
+        })
+        print(f"🌲 extraction nodes={actual_nodes:<7} {best * 1000:>8.1f}ms  "
+              f"{results[-1]['us_per_node']:>6.2f} us/node", file=sys.stderr)
+    return results
+
+
+def _serialize(document) -> str:
+    if isinstance(document, BeautifulSoup):
+        return str(document)
+    document.modified = True  # 强制完整序列化，而不是直接返回原文
+    return document.serialize()
+
+
+def bench_engines(chapters: int, paragraphs: int = 80, repeat: int = 3, seed: int = 0) -> List[Dict[str, Any]]:
+    """各 HTML 引擎解析 + 序列化合成章节的耗时 (取多轮最佳)"""
+    rng = random.Random(seed)
+    corpus = [_xhtml(f"Chapter {i}", [_paragraph(rng) for _ in range(paragraphs)]) for i in range(chapters)]
+    size_mb = sum(len(c.encode("utf-8")) for c in corpus) / 1024 / 1024
+    results = []
+    for engine in ENGINES:
+        processor = HTMLProcessor(translator=None, workers=0, engine=engine)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for content in corpus:
+                _serialize(processor._parse_document(content))
+            best = min(best, time.perf_counter() - started)
+        results.append({'engine': engine, 'chapters': chapters, 'mb': round(size_mb, 2), 'seconds': round(best, 4),
+                        'mb_per_second': round(size_mb / best, 2)})
+        print(f"🧩 engine {engine:<5} {chapters} 章 {size_mb:.1f}MB  {best * 1000:>8.1f}ms  "
+              f"{results[-1]['mb_per_second']:>6.2f} MB/s", file=sys.stderr)
+    baseline = next(r['seconds'] for r in results if r['engine'] == "bs4")
+    for r in results:
+        r['speedup_vs_bs4'] = round(baseline / r['seconds'], 2)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent.parent,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """打印与基线结果的对比 (墙钟时间比值 >1 表示变慢)"""
+    old = {r['processor']: r for r in baseline.get('results', [])}
+    print(f"\n📊 对比基线 {baseline.get('commit') or '?'} → {current.get('commit') or '?'}", file=sys.stderr)
+    for r in current['results']:
+        base = old.get(r['processor'])
+        if not base or base['size'] != r['size'] or not base['wall_seconds']:
+            continue
+        ratio = r['wall_seconds'] / base['wall_seconds']
+        flag = "⚠️ " if ratio > 1.1 else "  "
+        print(f"{flag}{r['processor']:<5} 墙钟 {base['wall_seconds']:.2f}s → {r['wall_seconds']:.2f}s ({ratio:.2f}x), "
+              f"RSS {_format_mb(base['peak_rss_mb'])} → {_format_mb(r['peak_rss_mb'])}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端吞吐基准测试")
+    parser.add_argument("--processors", default=",".join(PROCESSORS), help="要测试的处理器 (逗号分隔)")
+    parser.add_argument("--scale", type=float, default=1.0, help="语料规模倍数 (1.0 ≈ 800 段 EPUB)")
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="模型池 (逗号分隔)")
+    parser.add_argument("--latency", action="append", metavar="MODEL=SPEC",
+                        help="模拟延迟分布，如 default=fixed:0.05 (可重复，见 mock_ark_server.py)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟 500 错误比例")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    parser.add_argument("--external", action="store_true", help="通过 ARK_BASE_URL 连接外部 mock 服务器")
+    parser.add_argument("--output", "-o", help="结果 JSON 输出路径 (默认输出到 stdout)")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--extraction", action="store_true",
+                        help="同时测量 HTML 块提取随节点数的扩展性 (深层嵌套 div)")
+    parser.add_argument("--engines", action="store_true", help="同时对比 HTML 引擎 (lxml / bs4) 的解析+序列化耗时")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    warnings.filterwarnings("ignore", module="bs4")
+    processors = [p.strip() for p in args.processors.split(",") if p.strip()]
+    unknown = set(processors) - set(PROCESSORS)
+    if unknown:
+        parser.error(f"未知处理器: {', '.join(sorted(unknown))} (可选: {', '.join(PROCESSORS)})")
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+
+    mock_config = MockArkConfig(latency={"default": "lognormal:0.05,0.3"}, per_token_latency=0.0,
+                                error_rate=args.error_rate, seed=args.seed)
+    for item in args.latency or []:
+        key, _, spec = item.partition("=")
+        mock_config.latency[key.strip()] = spec
+
+    # 处理器的进度输出转到 stderr，保证 stdout 只有 JSON 结果
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run_benchmarks(processors, args.scale, models, mock_config, args.external, args.seed))
+    extraction = None
+    if args.extraction:
+        extraction = bench_extraction([int(n * args.scale) for n in (2_000, 4_000, 8_000, 16_000, 32_000)])
+    engines = bench_engines(max(1, int(40 * args.scale)), seed=args.seed) if args.engines else None
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'scale': args.scale, 'models': models, 'latency': mock_config.latency,
+                   'error_rate': args.error_rate, 'seed': args.seed, 'external': args.external},
+        'results': results,
+    }
+    if extraction is not None:
+        report['extraction'] = extraction
+    if engines is not None:
+        report['engines'] = engines
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
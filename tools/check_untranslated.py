@@ -2,19 +2,81 @@
 """
 EPUB 漏译检测工具
 检查 EPUB 文件中是否还有未翻译的英文段落
+
+章节按字节分批送入进程池并行解析 (QA_WORKERS，默认 CPU 核数，0 或 1 表示在当前进程内检查)，
+判定规则使用预编译的正则与一次遍历的 ASCII 字符分类计数。检查本身不输出到控制台，结果全部结构化返回。
+同一个检查器多轮检查同一本书时 (修复闭环)，只重新扫描 zip 中 CRC32 / 长度变化过的章节，其余复用上一轮结果。
+书有工作区 (<epub>.workspace/) 时直接检查工作区，不需要先导出 ePub。
 """
 
+import atexit
+import logging
+import multiprocessing
+import os
+import string
+import threading
 import zipfile
 import re
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
 from pathlib import Path
 from bs4 import BeautifulSoup, NavigableString
-from typing import List, Dict, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 添加项目根目录到 sys.path (直接运行本脚本时)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from processors import lxml_engine
+from processors.block_ledger import BlockLedger
+from processors.epub_workspace import book_exists, open_epub
+
+logger = logging.getLogger(__name__)
+
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_URL_RE = re.compile(r'^https?://')
+_EMAIL_RE = re.compile(r'[\w.-]+@[\w.-]+\.\w+')
+_DOMAIN_RE = re.compile(r'^[\w.-]+\.(com|org|net|io|co|edu|gov|us|uk|cn)$', re.I)
+_ISBN_RE = re.compile(r'ISBN[\s:-]*[\d-]{10,}', re.I)
+_CODE_RE = re.compile(r'[{}[\]<>=;]')
+_WORD_RE = re.compile(r'\b[a-zA-Z]{2,}\b')
+# 非 ASCII 的特殊符号 (Unicode 空白除外)；ASCII 部分由下面的分类表统计
+_NON_ASCII_SYMBOL_RE = re.compile(r'[^\x00-\x7f\s]')
+
+# ASCII 字符分类表：英文字母 -> 'a'，特殊符号 -> '#'，数字 / 空白 / 常用标点 -> '.'
+# 一次 translate 后用 str.count 统计，代替逐类 re.findall
+_ASCII_CLASSES = str.maketrans({
+    c: 'a' if c in string.ascii_letters else ('.' if c.isspace() or c in string.digits + ".,!?-'\"()" else '#')
+    for c in map(chr, range(128))
+})
+
+
+def _count_classes(text: str) -> Tuple[int, int, int]:
+    """统计 (中文字符数, 英文字母数, 特殊符号数)，与原先的三个 findall 计数一致"""
+    classes = text.translate(_ASCII_CLASSES)
+    letters, symbols = classes.count('a'), classes.count('#')
+    if text.isascii():
+        return 0, letters, symbols
+    return len(_CJK_RE.findall(text)), letters, symbols + len(_NON_ASCII_SYMBOL_RE.findall(text))
+
 
 class EPUBTranslationChecker:
     """EPUB 翻译完整性检查器"""
     
-    def __init__(self):
+    # 每个进程池任务携带的章节字节数 (减少进程间往返)
+    BATCH_BYTES = 512 * 1024
+
+    def __init__(self, engine: Optional[str] = None, workers: Optional[int] = None):
+        # DOM 引擎: lxml (默认) 或 bs4，可用环境变量 HTML_ENGINE 指定
+        self.engine = lxml_engine.resolve_engine(engine)
+        # 解析章节的进程数；0 或 1 时在当前进程内检查
+        self.workers = workers if workers is not None else int(os.getenv('QA_WORKERS', os.cpu_count() or 1))
+        # 增量质检索引 {书的绝对路径: {章节: (CRC32, 长度, 漏译条目)}}：
+        # 同一个检查器多轮检查同一本书时，zip 目录中指纹未变的章节直接复用上次结果，只重新扫描被改动的章节
+        self._verdicts: Dict[str, Dict[str, Tuple[int, int, List[Dict]]]] = {}
+
         # 块级标签，我们要检查这些标签内的文本
         self.block_tags = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div', 'blockquote'}
         
@@ -28,9 +90,8 @@ class EPUBTranslationChecker:
         """判断文本是否主要为中文（超过30%即视为已翻译）"""
         if not text:
             return False
-        chinese_count = len(re.findall(r'[\u4e00-\u9fff]', text))
-        total_chars = len(text)
-        return (chinese_count / total_chars) > 0.3 if total_chars > 0 else False
+        chinese_count = 0 if text.isascii() else len(_CJK_RE.findall(text))
+        return chinese_count / len(text) > 0.3
     
     def _is_meaningful_english(self, text: str) -> bool:
         """判断是否为有意义的英文文本（需要翻译的）"""
@@ -45,85 +106,71 @@ class EPUBTranslationChecker:
             return False
         
         # 过滤：URL
-        if re.match(r'^https?://', text) or 'www.' in text:
+        if _URL_RE.match(text) or 'www.' in text:
             return False
         
         # [新增] 过滤：邮箱地址
-        if re.search(r'[\w.-]+@[\w.-]+\.\w+', text):
+        if '@' in text and _EMAIL_RE.search(text):
             return False
         
         # [新增] 过滤：看起来像域名 (xxx.com, xxx.org 等)
-        if re.match(r'^[\w.-]+\.(com|org|net|io|co|edu|gov|us|uk|cn)$', text, re.I):
+        if _DOMAIN_RE.match(text):
             return False
         
         # [新增] 过滤：ISBN 编号
-        if re.search(r'ISBN[\s:-]*[\d-]{10,}', text, re.I):
+        if _ISBN_RE.search(text):
             return False
         
         # 过滤：看起来像代码
-        if re.search(r'[{}[\]<>=;]', text) and len(text) < 100:
+        if len(text) < 100 and _CODE_RE.search(text):
             return False
         
+        chinese_chars, english_letters, symbols = _count_classes(text)
+
         # 过滤：大量符号（可能是代码或特殊标记）
-        symbols = len(re.findall(r'[^a-zA-Z0-9\s\.,!?\-\'\"()]', text))
         if symbols > len(text) * 0.3:  # 超过30%是特殊符号
             return False
         
         # 检查是否包含足够的英文字母
-        english_letters = len(re.findall(r'[a-zA-Z]', text))
         if english_letters < 3:
             return False
         
         # [修改] 提高门槛：至少3个英文单词才认为需要翻译
-        words = re.findall(r'\b[a-zA-Z]{2,}\b', text)
-        if len(words) < 3:  # 从 2 改为 3
+        if sum(1 for _ in islice(_WORD_RE.finditer(text), 3)) < 3:  # 从 2 改为 3
             return False
         
         # [新增] 如果文本中有足够多的中文字符(超过20%)，可能是中英混合的版权信息，不算漏译
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
         if chinese_chars > 0 and (chinese_chars / len(text)) > 0.2:
             return False
         
         return True
     
+    def is_untranslated(self, text: str) -> bool:
+        """块文本是否判定为漏译 (非中文为主的有意义英文)"""
+        return bool(text) and not self._is_chinese_dominant(text) and self._is_meaningful_english(text)
+
     def check_html_content(self, html_content: str, filename: str) -> List[Dict]:
         """检查单个 HTML 文件的翻译情况
         
         Returns:
             List of dicts with keys: 'file', 'tag', 'text', 'context'
+        无法解析时抛出异常
         """
         untranslated = []
         
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-        except Exception as e:
-            print(f"⚠️  无法解析 {filename}: {e}")
-            return untranslated
-        
         # 查找所有块级元素
-        for block in soup.find_all(self.block_tags):
-            # 跳过被排除的父标签
-            if any(parent.name in self.exclude_tags for parent in block.parents):
-                continue
-            
-            # 获取完整文本
-            full_text = block.get_text(" ", strip=True)
-            
+        for block, tag_name, full_text in self._iter_blocks(html_content):
             if not full_text:
                 continue
             
-            # 如果已经是中文为主，跳过
-            if self._is_chinese_dominant(full_text):
-                continue
-            
-            # 检查是否为有意义的英文
-            if self._is_meaningful_english(full_text):
+            # 中文为主的跳过，只报告有意义的英文
+            if self.is_untranslated(full_text):
                 # 提取上下文（前后20个字符）
                 context = self._extract_context(block)
                 
                 untranslated.append({
                     'file': filename,
-                    'tag': block.name,
+                    'tag': tag_name,
                     'text': full_text[:200],  # 只取前200字符避免过长
                     'full_text': full_text,   # 保留完整文本
                     'context': context
@@ -131,94 +178,226 @@ class EPUBTranslationChecker:
         
         return untranslated
     
+    def _iter_blocks(self, html_content: str) -> List[Tuple]:
+        """解析文档，返回不在排除标签内的所有块级元素 [(元素, 标签名, 完整文本)]"""
+        if self.engine == "lxml":
+            try:
+                document = lxml_engine.parse_document(html_content)
+            except lxml_engine.DocumentTooDeepError:
+                document = None  # 嵌套过深，改用 html.parser
+            if document is not None:
+                return [(block, lxml_engine.local_name(block), lxml_engine.get_text(block))
+                        for block in lxml_engine.collect_blocks(document.root, self.block_tags, self.exclude_tags,
+                                                                leaf_only=False)]
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        return [
+            (block, block.name, block.get_text(" ", strip=True))
+            for block in soup.find_all(self.block_tags)
+            # 跳过被排除的父标签
+            if not any(parent.name in self.exclude_tags for parent in block.parents)
+        ]
+    
     def _extract_context(self, element) -> str:
         """提取元素的上下文（前一个和后一个兄弟节点的部分文本）"""
         context_parts = []
+        is_lxml = not hasattr(element, 'find_previous_sibling')
         
         # 前一个兄弟
-        prev = element.find_previous_sibling()
-        if prev:
-            prev_text = prev.get_text(" ", strip=True)
+        prev = lxml_engine.previous_element(element) if is_lxml else element.find_previous_sibling()
+        if prev is not None:
+            prev_text = lxml_engine.get_text(prev) if is_lxml else prev.get_text(" ", strip=True)
             if prev_text:
                 context_parts.append(f"...{prev_text[-30:]}")
         
         # 当前元素的类名
-        classes = element.get('class', [])
+        classes = lxml_engine.get_classes(element) if is_lxml else element.get('class', [])
         if classes:
             context_parts.append(f"[class={' '.join(classes)}]")
         
         # 后一个兄弟
-        next_elem = element.find_next_sibling()
-        if next_elem:
-            next_text = next_elem.get_text(" ", strip=True)
+        next_elem = lxml_engine.next_element(element) if is_lxml else element.find_next_sibling()
+        if next_elem is not None:
+            next_text = lxml_engine.get_text(next_elem) if is_lxml else next_elem.get_text(" ", strip=True)
             if next_text:
                 context_parts.append(f"{next_text[:30]}...")
         
         return " | ".join(context_parts) if context_parts else ""
     
-    def check_epub(self, epub_path: str) -> Dict:
+    def _ledger_details(self, ledger, filename: str) -> List[Dict]:
+        """从块级台账得出漏译 (不解析 HTML)，条目附带块 ID 与原文哈希，可直接做块级修补"""
+        return [{
+            'file': filename,
+            'tag': block.tag,
+            'text': block.text[:200],
+            'full_text': block.text,
+            'context': '',
+            'block_id': block.id,
+            'block_hash': block.hash,
+        } for block in ledger.leaks(filename, self.is_untranslated)]
+
+    def check_epub(self, epub_path: str, ledger=None) -> Dict:
         """检查整个 EPUB 文件
         
+        ledger 为翻译时生成的块级台账 (BlockLedger) 时，内容与台账一致的章节直接读台账；
+        本检查器上次检查过且内容未变的章节复用上次结果；其余章节解析扫描。
+        
         Returns:
-            Dict with keys: 'total_files', 'untranslated_count', 'details'
+            Dict with keys: 'epub_file', 'total_files', 'untranslated_count', 'details', 'ledger_files',
+            'cached_files', 'errors' (errors 为无法检查的章节 [{'file', 'error'}])
+        """
+        return self.check_epubs([epub_path], {str(epub_path): ledger}, raise_errors=True)[str(epub_path)]
+
+    def check_epubs(self, epub_paths: Iterable[str], ledgers: Optional[Dict[str, object]] = None,
+                    raise_errors: bool = False,
+                    on_report: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
         """
-        epub_path = Path(epub_path)
+        检查多本 EPUB，返回 {路径: 报告}。所有书的章节连续送入同一个进程池，书与书之间不等待；
+        章节边读边送，同时在途的批次有上限，不会把所有书一次读进内存。
+        ledgers 为 {路径: 台账}。书无法打开时 raise_errors=False 则该书报告的 'error' 为错误信息。
+        on_report(路径, 报告) 在一本书的章节全部读完并取回结果时立即调用 (在检查所在的线程中)，
+        此时检查已不再读取这本书，调用方可以开始修改它，不必等其他书检查完。
+        """
+        ledgers = ledgers or {}
+        reports = {str(path): self._new_report(path) for path in epub_paths}
+        # 各书 HTML 文件的顺序，最后按此排列漏译条目
+        order: Dict[str, Dict[str, int]] = {path: {} for path in reports}
+        # 本次需要扫描的章节的 zip 指纹 {书: {章节: (CRC32, 长度)}}，扫描后写入增量索引
+        fingerprints: Dict[str, Dict[str, Tuple[int, int]]] = {path: {} for path in reports}
+        # 已送检、尚未取回结果的章节数；章节已全部读完的书
+        outstanding = {path: 0 for path in reports}
+        read_done = set()
+
+        def finish(path: str):
+            if path not in read_done or outstanding[path]:
+                return
+            read_done.discard(path)
+            report = reports[path]
+            report['details'].sort(key=lambda item: order[path][item['file']])
+            report['untranslated_count'] = len(report['details'])
+            if on_report is not None:
+                on_report(path, report)
+
+        def chapters() -> Iterator[Tuple[str, str, bytes]]:
+            for path, report in reports.items():
+                try:
+                    for chapter in self._read_chapters(path, ledgers.get(path), report, order[path], fingerprints[path]):
+                        outstanding[path] += 1
+                        yield chapter
+                except (OSError, ValueError) as e:
+                    if raise_errors:
+                        raise
+                    report['error'] = str(e)
+                read_done.add(path)
+                finish(path)
+
+        for path, name, details, error in self._scan(chapters()):
+            report = reports[path]
+            outstanding[path] -= 1
+            if error is not None:
+                report['errors'].append({'file': name, 'error': error})
+            else:
+                report['details'].extend(details)
+                report['total_files'] += 1
+                self._verdicts.setdefault(os.path.abspath(path), {})[name] = (*fingerprints[path][name], details)
+            finish(path)
+        return reports
+
+    @staticmethod
+    def _new_report(epub_path) -> Dict:
+        return {'epub_file': str(epub_path), 'total_files': 0, 'untranslated_count': 0, 'details': [],
+                'ledger_files': 0, 'cached_files': 0, 'errors': []}
+
+    def _read_chapters(self, epub_path: str, ledger, report: Dict, order: Dict[str, int],
+                       fingerprints: Dict[str, Tuple[int, int]]) -> Iterator[Tuple[str, str, bytes]]:
+        """
+        按书中顺序产出需要扫描的章节 (路径, 章节名, 内容)。
+        与台账一致、或与增量索引中指纹相同的章节直接写入报告，不解压。
+        """
+        path = Path(epub_path)
+        verdicts = self._verdicts.get(os.path.abspath(epub_path), {})
         
-        if not epub_path.exists():
-            raise FileNotFoundError(f"找不到文件: {epub_path}")
+        if not book_exists(path):
+            raise FileNotFoundError(f"找不到文件: {path}")
         
-        if not epub_path.suffix.lower() == '.epub':
+        if not path.suffix.lower() == '.epub':
             raise ValueError("文件必须是 .epub 格式")
         
-        print(f"📖 正在检查: {epub_path.name}")
-        print("=" * 60)
-        
-        all_untranslated = []
-        checked_files = 0
-        
         try:
-            with zipfile.ZipFile(epub_path, 'r') as zf:
-                # 获取所有 HTML/XHTML 文件
-                html_files = [
-                    name for name in zf.namelist()
-                    if name.endswith(('.html', '.xhtml', '.htm'))
-                    and not name.startswith('__MACOSX')  # 排除 macOS 元数据
-                ]
-                
-                print(f"📄 找到 {len(html_files)} 个 HTML 文件\n")
-                
-                for html_file in html_files:
-                    try:
-                        content = zf.read(html_file).decode('utf-8')
-                        untranslated = self.check_html_content(content, html_file)
-                        
-                        if untranslated:
-                            all_untranslated.extend(untranslated)
-                            print(f"⚠️  {html_file}: 发现 {len(untranslated)} 处未翻译")
-                        else:
-                            print(f"✅ {html_file}: 无漏译")
-                        
-                        checked_files += 1
-                        
-                    except Exception as e:
-                        print(f"❌ {html_file}: 检查失败 - {e}")
-        
+            # 有工作区时读取工作区 (CRC32 / 长度取自清单，未改动的条目取自底本的 zip 目录)
+            with open_epub(path, create=False) as book:
+                for name in book.namelist():
+                    # 获取所有 HTML/XHTML 文件，排除 macOS 元数据
+                    if not name.endswith(('.html', '.xhtml', '.htm')) or name.startswith('__MACOSX'):
+                        continue
+                    order[name] = len(order)
+                    crc, size = book.entry_fingerprint(name)
+                    # 非叶子块自身的文本仍是原文时，台账与扫描的块定义不一致，改为扫描
+                    if (ledger is not None and ledger.is_current(name, crc, size)
+                            and not ledger.has_loose_leaks(name, self.is_untranslated)):
+                        report['details'].extend(self._ledger_details(ledger, name))
+                        report['ledger_files'] += 1
+                        report['total_files'] += 1
+                        continue
+                    cached = verdicts.get(name)
+                    if cached is not None and cached[:2] == (crc, size):
+                        report['details'].extend(cached[2])
+                        report['cached_files'] += 1
+                        report['total_files'] += 1
+                        continue
+                    fingerprints[name] = (crc, size)
+                    yield epub_path, name, book.read(name)
         except zipfile.BadZipFile:
             raise ValueError("文件不是有效的 EPUB (ZIP) 格式")
-        
-        return {
-            'total_files': checked_files,
-            'untranslated_count': len(all_untranslated),
-            'details': all_untranslated
-        }
+
+    def _scan(self, chapters: Iterable[Tuple[str, str, bytes]]) -> Iterator[Tuple[str, str, List[Dict], Optional[str]]]:
+        """扫描章节，按输入顺序产出 (路径, 章节名, 漏译条目, 错误信息)"""
+        pool = _get_check_pool(self.workers) if self.workers > 1 else None
+        if pool is None:
+            for key, name, content in chapters:
+                yield (key, name, *_check_chapter(self, name, content))
+            return
+
+        pending = deque()
+        for batch in self._batches(chapters):
+            pending.append((batch, pool.submit(_check_chapters_stage, self.engine, batch)))
+            # 在途批次有上限：边读边送，不把整个目录的章节一次读进内存
+            if len(pending) >= self.workers * 2:
+                yield from self._collect(*pending.popleft())
+        while pending:
+            yield from self._collect(*pending.popleft())
+
+    def _collect(self, batch: List[Tuple[str, str, bytes]], future) -> List[Tuple]:
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            if not _check_pool_disabled:
+                logger.warning("⚠️ 质检进程池已损坏，改为在当前进程检查")
+            _disable_check_pool()
+            return [(key, name, *_check_chapter(self, name, content)) for key, name, content in batch]
+
+    def _batches(self, chapters: Iterable[Tuple[str, str, bytes]]) -> Iterator[List[Tuple[str, str, bytes]]]:
+        """把章节按字节数打包成进程池任务"""
+        batch, size = [], 0
+        for chapter in chapters:
+            batch.append(chapter)
+            size += len(chapter[2])
+            if size >= self.BATCH_BYTES:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
     
     def generate_report(self, result: Dict, output_file: str = None):
         """生成详细报告"""
         print("\n" + "=" * 60)
         print("📊 检查结果汇总")
         print("=" * 60)
-        print(f"✅ 检查文件数: {result['total_files']}")
+        print(f"📖 文件: {Path(result['epub_file']).name}")
+        print(f"✅ 检查文件数: {result['total_files']} (台账 {result['ledger_files']})")
         print(f"⚠️  漏译段落数: {result['untranslated_count']}")
+        for error in result['errors']:
+            print(f"❌ {error['file']}: 检查失败 - {error['error']}")
         
         if result['untranslated_count'] == 0:
             print("\n🎉 恭喜！未发现漏译！")
@@ -259,13 +438,65 @@ class EPUBTranslationChecker:
         if output_file:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write("EPUB 漏译检测报告\n")
-                f.write(f"生成时间: {Path(epub_path).name}\n")
+                f.write(f"文件: {Path(result['epub_file']).name}\n")
                 f.write(f"总文件数: {result['total_files']}\n")
                 f.write(f"漏译段落: {result['untranslated_count']}\n")
                 f.writelines(report_lines)
             print(f"\n💾 详细报告已保存至: {output_file}")
 
 
+# ==================== 进程池 ====================
+
+_check_pool: Optional[ProcessPoolExecutor] = None
+_check_pool_disabled = False
+# 多本书可能在不同线程中同时检查 (目录模式修复闭环)
+_check_pool_lock = threading.Lock()
+_stage_checkers: Dict[str, EPUBTranslationChecker] = {}
+
+
+def _get_check_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """按需创建共享进程池 (多本书、多轮质检复用)；创建失败时返回 None (在当前进程检查)"""
+    global _check_pool, _check_pool_disabled
+    with _check_pool_lock:
+        if _check_pool_disabled:
+            return None
+        if _check_pool is None:
+            try:
+                # spawn: 不继承父进程的事件循环、线程与连接状态
+                _check_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(_check_pool.shutdown, wait=False, cancel_futures=True)
+            except (OSError, ValueError, NotImplementedError) as e:
+                logger.warning(f"⚠️ 无法创建质检进程池 ({e})，改为在当前进程检查")
+                _check_pool_disabled = True
+                return None
+        return _check_pool
+
+
+def _disable_check_pool():
+    global _check_pool, _check_pool_disabled
+    with _check_pool_lock:
+        _check_pool_disabled = True
+        if _check_pool is not None:
+            _check_pool.shutdown(wait=False, cancel_futures=True)
+            _check_pool = None
+
+
+def _check_chapter(checker: EPUBTranslationChecker, name: str, content: bytes) -> Tuple[List[Dict], Optional[str]]:
+    """检查单个章节，返回 (漏译条目, 错误信息)"""
+    try:
+        return checker.check_html_content(content.decode('utf-8'), name), None
+    except Exception as e:
+        return [], str(e)
+
+
+def _check_chapters_stage(engine: str, batch: List[Tuple[str, str, bytes]]) -> List[Tuple]:
+    """[工作进程] 检查一批章节；每个进程按引擎复用一个检查器"""
+    if engine not in _stage_checkers:
+        _stage_checkers[engine] = EPUBTranslationChecker(engine=engine, workers=0)
+    checker = _stage_checkers[engine]
+    return [(key, name, *_check_chapter(checker, name, content)) for key, name, content in batch]
+
+
 def main():
     if len(sys.argv) < 2:
         print("用法: uv run python tools/check_untranslated.py <epub文件路径> [输出报告路径]")
@@ -278,7 +509,8 @@ def main():
     checker = EPUBTranslationChecker()
     
     try:
-        result = checker.check_epub(epub_path)
+        # 有翻译台账时，内容未变的章节直接读台账
+        result = checker.check_epub(epub_path, ledger=BlockLedger.load(epub_path))
         checker.generate_report(result, output_file)
         
         # 返回适当的退出码
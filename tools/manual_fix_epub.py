@@ -4,31 +4,20 @@ EPUB 手动精修辅助工具
 功能：解压 EPUB -> 等待用户修改 -> 重新打包 (保持 mimetype 首位)
 """
 
-import os
 import sys
 import zipfile
 import shutil
-import tempfile
 import argparse
 from pathlib import Path
 
+# 添加项目根目录到 sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from processors.epub_container import pack_directory
+
 def repack_epub(source_dir: str, output_path: str):
-    """标准的 EPUB 重打包逻辑"""
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # 1. 必须首先写入 mimetype，且不能压缩
-        mimetype_path = os.path.join(source_dir, 'mimetype')
-        if os.path.exists(mimetype_path):
-            zf.write(mimetype_path, 'mimetype', compress_type=zipfile.ZIP_STORED)
-        else:
-            print("⚠️  警告: 未找到 mimetype 文件，生成的 epub 可能不标准")
-        
-        # 2. 写入其他文件
-        for root, _, files in os.walk(source_dir):
-            for f in files:
-                if f == 'mimetype': continue
-                full_path = os.path.join(root, f)
-                rel_path = os.path.relpath(full_path, source_dir)
-                zf.write(full_path, rel_path)
+    """标准的 EPUB 重打包逻辑 (mimetype 首位不压缩，其余条目并行压缩)"""
+    pack_directory(source_dir, output_path)
 
 def main():
     parser = argparse.ArgumentParser(description="EPUB 手动精修助手")
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+本地 ARK 模拟服务器 (Mock ARK Server)
+离线压测并发/限流/降级逻辑，不消耗真实额度。
+
+实现两个接口：
+- POST /api/v3/responses         (doubao-seed-translation 格式)
+- POST /api/v3/chat/completions  (Chat 格式，支持编号 JSON 打包请求)
+
+模拟行为：
+- 可配置的延迟分布 (fixed / uniform / lognormal / exp)，按模型名匹配
+- 每模型 RPM/TPM 滑动窗口限流，超限返回 429 + Retry-After
+- 额度用尽返回 SetLimitExceeded，输入超长返回 400 InvalidParameter
+- 可选随机 500 错误
+- 确定性的伪翻译 (相同输入总是相同输出，目标为中日文时输出 CJK 字符)
+
+用法:
+    python tools/mock_ark_server.py --port 8900
+    ARK_BASE_URL=http://127.0.0.1:8900/api/v3 python main.py epub -f book.epub
+
+    # 模拟慢车道延迟 + 低 RPM + 额度上限
+    python tools/mock_ark_server.py --latency seed-translation=lognormal:0.8,0.4 \\
+        --rpm deepseek-v3-250324=600 --quota doubao-seed-translation-250915=200000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# 添加项目根目录到 sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.config import get_model_rate_limits
+from core.token_tracker import TokenTracker
+
+# doubao-seed-translation 的真实输入上限 (客户端按 900 预留了余量)
+SEED_MAX_INPUT_TOKENS = 1000
+CJK_TARGETS = ("zh", "ja", "jp", "ko", "chinese", "japanese", "korean")
+
+
+@dataclass
+class MockArkConfig:
+    """模拟服务器配置"""
+    # 延迟分布：{模型名片段: "lognormal:0.3,0.5"}，"default" 为兜底
+    latency: Dict[str, str] = field(default_factory=lambda: {
+        "seed-translation": "lognormal:0.6,0.3",
+        "default": "lognormal:0.3,0.3",
+    })
+    # 每输出 Token 额外延迟 (秒)
+    per_token_latency: float = 0.0005
+    # 按模型覆盖 RPM/TPM (默认沿用 core.config 的车道上限)
+    rpm_overrides: Dict[str, int] = field(default_factory=dict)
+    tpm_overrides: Dict[str, int] = field(default_factory=dict)
+    # 每模型总 Token 额度，用尽后返回 SetLimitExceeded
+    quota_tokens: Dict[str, int] = field(default_factory=dict)
+    # 每模型最大输入 Token (默认仅 seed-translation 有 1000 上限)
+    max_input_tokens: Dict[str, int] = field(default_factory=dict)
+    # 随机 500 错误比例
+    error_rate: float = 0.0
+    # 随机数种子 (延迟与错误注入可复现)
+    seed: int = 42
+
+
+def parse_latency_spec(spec: str) -> Tuple[str, List[float]]:
+    """解析 "lognormal:0.3,0.5" 形式的延迟分布"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+    if kind not in expected or len(values) != expected[kind]:
+        raise ValueError(f"无效的延迟分布: {spec} (支持 fixed:s / uniform:lo,hi / lognormal:median,sigma / exp:mean)")
+    return kind, values
+
+
+def pseudo_translate(text: str, target: str) -> str:
+    """确定性伪翻译：CJK 目标逐词映射为汉字，其余目标加语言前缀"""
+    if not text.strip():
+        return text
+    if any(t in target.lower() for t in CJK_TARGETS):
+        chars = []
+        for word in re.findall(r'\w+|[^\w\s]', text):
+            digest = int(hashlib.md5(word.lower().encode('utf-8')).hexdigest()[:8], 16)
+            chars.append(chr(0x4E00 + digest % 0x51A5) if word[0].isalnum() else word)
+        return "".join(chars)
+    return f"[{target}] {text}"
+
+
+class MockArk:
+    """模拟服务器状态：限流窗口、额度、统计"""
+
+    WINDOW = 60.0
+
+    def __init__(self, config: Optional[MockArkConfig] = None):
+        self.config = config or MockArkConfig()
+        self.random = random.Random(self.config.seed)
+        self.tracker = TokenTracker()
+        self.latency = {k: parse_latency_spec(v) for k, v in self.config.latency.items()}
+        self._windows: Dict[str, Deque[Tuple[float, int]]] = {}
+        self._used_tokens: Dict[str, int] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._inflight = 0
+        self.peak_inflight = 0
+
+    def reset(self):
+        self._windows.clear()
+        self._used_tokens.clear()
+        self.stats.clear()
+        self.peak_inflight = 0
+
+    def _count(self, model: str, key: str):
+        model_stats = self.stats.setdefault(model, {})
+        model_stats[key] = model_stats.get(key, 0) + 1
+
+    def _sample_latency(self, model: str, out_tokens: int) -> float:
+        kind, values = next((v for k, v in self.latency.items() if k != "default" and k in model),
+                            self.latency.get("default", ("fixed", [0.0])))
+        if kind == "fixed":
+            base = values[0]
+        elif kind == "uniform":
+            base = self.random.uniform(values[0], values[1])
+        elif kind == "lognormal":
+            base = values[0] * self.random.lognormvariate(0.0, values[1])
+        else:
+            base = self.random.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+        return base + out_tokens * self.config.per_token_latency
+
+    def _max_input(self, model: str) -> Optional[int]:
+        if model in self.config.max_input_tokens:
+            return self.config.max_input_tokens[model]
+        return SEED_MAX_INPUT_TOKENS if "seed-translation" in model else None
+
+    def _check_rate_limit(self, model: str, tokens: int) -> Optional[Tuple[str, float]]:
+        """滑动窗口 RPM/TPM 检查；超限返回 (错误码, Retry-After 秒数)，否则记入窗口"""
+        rpm, tpm = get_model_rate_limits(model, self.config.rpm_overrides, self.config.tpm_overrides)
+        now = time.monotonic()
+        window = self._windows.setdefault(model, deque())
+        while window and now - window[0][0] >= self.WINDOW:
+            window.popleft()
+        if len(window) >= rpm:
+            return "RateLimitExceeded.EndpointRPMExceeded", self.WINDOW - (now - window[0][0])
+        window_tokens = sum(t for _, t in window)
+        if window_tokens + tokens > tpm:
+            # 等到足够多的 Token 移出窗口
+            freed = 0
+            for ts, t in window:
+                freed += t
+                if window_tokens - freed + tokens <= tpm:
+                    return "RateLimitExceeded.EndpointTPMExceeded", self.WINDOW - (now - ts)
+            return "RateLimitExceeded.EndpointTPMExceeded", self.WINDOW
+        window.append((now, tokens))
+        return None
+
+    async def handle(self, model: str, source_text: str, output_text: str) -> Tuple[int, Dict, Dict[str, str]]:
+        """公共处理流程：返回 (状态码, 错误体或 None, 额外响应头)"""
+        self._count(model, 'requests')
+        in_tokens = self.tracker.estimate_tokens(source_text)
+        out_tokens = self.tracker.estimate_tokens(output_text)
+
+        max_input = self._max_input(model)
+        if max_input is not None and in_tokens > max_input:
+            self._count(model, 'invalid_parameter')
+            return 400, _error_body("InvalidParameter",
+                                    f"Total tokens of input ({in_tokens}) exceed max limit ({max_input})"), {}
+
+        quota = self.config.quota_tokens.get(model)
+        if quota is not None and self._used_tokens.get(model, 0) >= quota:
+            self._count(model, 'set_limit_exceeded')
+            return 429, _error_body("SetLimitExceeded",
+                                    "Your account has reached the set inference limit for this model"), {}
+
+        limited = self._check_rate_limit(model, in_tokens + out_tokens)
+        if limited:
+            code, retry_after = limited
+            self._count(model, 'rate_limited')
+            return 429, _error_body(code, f"Request was rejected: {code}"), {"Retry-After": str(max(1, round(retry_after)))}
+
+        self._inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self._inflight)
+        try:
+            await asyncio.sleep(self._sample_latency(model, out_tokens))
+        finally:
+            self._inflight -= 1
+
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self._count(model, 'server_error')
+            return 500, _error_body("InternalServiceError", "The service encountered an unexpected internal error"), {}
+
+        self._used_tokens[model] = self._used_tokens.get(model, 0) + in_tokens + out_tokens
+        self._count(model, 'ok')
+        return 200, {'input_tokens': in_tokens, 'output_tokens': out_tokens}, {}
+
+
+def _error_body(code: str, message: str) -> Dict:
+    return {"error": {"code": code, "message": message, "type": "BadRequest" if code == "InvalidParameter" else code}}
+
+
+def _chat_target(messages: List[Dict]) -> str:
+    """从系统提示词 "Translate into X." 中取目标语言"""
+    for message in messages:
+        if message.get("role") == "system":
+            match = re.search(r'Translate into ([^.\n]+)', message.get("content", ""))
+            if match:
+                return match.group(1)
+    return "zh"
+
+
+def _chat_translate(messages: List[Dict]) -> Tuple[str, str]:
+    """返回 (原文, 伪译文)；编号 JSON 打包请求按编号逐段翻译"""
+    target = _chat_target(messages)
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    try:
+        segments = json.loads(user)
+    except (json.JSONDecodeError, TypeError):
+        segments = None
+    if isinstance(segments, dict) and all(isinstance(v, str) for v in segments.values()):
+        translated = {k: pseudo_translate(v, target) for k, v in segments.items()}
+        return user, json.dumps(translated, ensure_ascii=False)
+    return user, pseudo_translate(user, target)
+
+
+def create_app(config: Optional[MockArkConfig] = None) -> FastAPI:
+    """创建模拟服务器应用 (测试中可直接配合 httpx.ASGITransport 使用)"""
+    ark = MockArk(config)
+    app = FastAPI(title="Mock ARK Server")
+    app.state.ark = ark
+
+    def unauthorized(request: Request) -> Optional[JSONResponse]:
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse(_error_body("AuthenticationError", "The API key in the request is missing or invalid"),
+                                status_code=401)
+        return None
+
+    @app.post("/api/v3/responses")
+    async def responses(request: Request):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        body = await request.json()
+        model = body.get("model", "")
+        content = body["input"][0]["content"][0]
+        options = content.get("translation_options", {})
+        text = content.get("text", "")
+        output = pseudo_translate(text, options.get("target_language", "zh"))
+
+        status, result, headers = await ark.handle(model, text, output)
+        if status != 200:
+            return JSONResponse(result, status_code=status, headers=headers)
+        return {
+            "id": f"resp_{uuid.uuid4().hex[:16]}",
+            "object": "response",
+            "model": model,
+            "status": "completed",
+            "output": [{"type": "message", "role": "assistant",
+                        "content": [{"type": "output_text", "text": output}]}],
+            "usage": {"input_tokens": result['input_tokens'], "output_tokens": result['output_tokens'],
+                      "total_tokens": result['input_tokens'] + result['output_tokens']},
+        }
+
+    @app.post("/api/v3/chat/completions")
+    async def chat_completions(request: Request):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        body = await request.json()
+        model = body.get("model", "")
+        source, output = _chat_translate(body.get("messages", []))
+
+        status, result, headers = await ark.handle(model, source, output)
+        if status != 200:
+            return JSONResponse(result, status_code=status, headers=headers)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": result['input_tokens'], "completion_tokens": result['output_tokens'],
+                      "total_tokens": result['input_tokens'] + result['output_tokens']},
+        }
+
+    @app.get("/mock/stats")
+    async def stats():
+        return {"models": ark.stats, "peak_inflight": ark.peak_inflight}
+
+    @app.post("/mock/reset")
+    async def reset():
+        ark.reset()
+        return {"status": "ok"}
+
+    return app
+
+
+def _parse_pairs(items: Optional[List[str]], cast=int) -> Dict:
+    """解析重复的 --opt model=value 参数"""
+    result = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"参数格式应为 模型=值: {item}")
+        result[key.strip()] = cast(value)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 ARK 模拟服务器 (离线压测)")
+    parser.add_argument("--host", default="127.0.0.1", help="绑定地址")
+    parser.add_argument("--port", "-p", type=int, default=8900, help="监听端口")
+    parser.add_argument("--latency", action="append", metavar="MODEL=SPEC",
+                        help="延迟分布，如 seed-translation=lognormal:0.8,0.4 或 default=fixed:0.2 (可重复)")
+    parser.add_argument("--per-token-latency", type=float, default=MockArkConfig.per_token_latency,
+                        help="每输出 Token 额外延迟 (秒)")
+    parser.add_argument("--rpm", action="append", metavar="MODEL=N", help="覆盖模型 RPM 上限 (可重复)")
+    parser.add_argument("--tpm", action="append", metavar="MODEL=N", help="覆盖模型 TPM 上限 (可重复)")
+    parser.add_argument("--quota", action="append", metavar="MODEL=N", help="模型总 Token 额度，用尽返回 SetLimitExceeded")
+    parser.add_argument("--max-input", action="append", metavar="MODEL=N", help="模型最大输入 Token，超出返回 InvalidParameter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机 500 错误比例 (0-1)")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    args = parser.parse_args()
+
+    config = MockArkConfig(
+        per_token_latency=args.per_token_latency,
+        rpm_overrides=_parse_pairs(args.rpm),
+        tpm_overrides=_parse_pairs(args.tpm),
+        quota_tokens=_parse_pairs(args.quota),
+        max_input_tokens=_parse_pairs(args.max_input),
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    if args.latency:
+        config.latency.update(_parse_pairs(args.latency, cast=str))
+    for spec in config.latency.values():
+        parse_latency_spec(spec)
+
+    import uvicorn
+    print(f"🧪 Mock ARK 服务器: http://{args.host}:{args.port}/api/v3")
+    print(f"   设置 ARK_BASE_URL=http://{args.host}:{args.port}/api/v3 即可让翻译器连接本服务器")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,13 @@
 #!/usr/bin/env python3
 """
 EPUB 漏译精准修补工具 (Surgical Patcher)
-结合 check_untranslated.py 的检测结果，只重跑有问题的章节。
+结合 check_untranslated.py 的检测结果，只重跑有问题的章节；
+有翻译台账 (<epub>.ledger.json) 的章节只重新翻译漏译的块。
 """
 
 import sys
-import os
-import shutil
 import asyncio
 import logging
-import tempfile
-import zipfile
 from pathlib import Path
 
 # 添加项目根目录到 sys.path
@@ -19,7 +16,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # 导入现有模块
 from core.config import TranslatorConfig
 from core.client import AsyncTranslator
-from processors.html_worker import HTMLProcessor
+from processors.epub_workspace import open_epub
+from processors.block_ledger import BlockLedger
+from processors.epub_worker import patch_untranslated
 from tools.check_untranslated import EPUBTranslationChecker
 
 # 配置日志
@@ -35,9 +34,10 @@ async def patch_epub(input_path: str, output_path: str, config: TranslatorConfig
     # 1. 诊断阶段
     logger.info("🔍 [阶段1] 正在扫描漏译段落...")
     checker = EPUBTranslationChecker()
-    # 捕获 check_epub 的打印输出以免刷屏，或者直接调用逻辑
+    # 有台账时，内容未变的章节直接读台账
+    ledger = BlockLedger.load(input_path)
     try:
-        report = checker.check_epub(input_path)
+        report = checker.check_epub(input_path, ledger=ledger)
     except Exception as e:
         logger.error(f"扫描失败: {e}")
         return
@@ -57,63 +57,23 @@ async def patch_epub(input_path: str, output_path: str, config: TranslatorConfig
     
     # 初始化翻译器
     translator = AsyncTranslator(config)
-    processor = HTMLProcessor(translator)
+    # 检测结果里的段落就是该翻而没翻的：无台账的章节以强制模式整章重译 (不经过 URL/代码与中文过滤)
+    logger.info("🔓 无台账的章节使用强制翻译模式")
 
-    # 【关键大招】临时放宽过滤条件 (Monkey Patch)
-    # 我们假设既然 check_untranslated 把它揪出来了，那它肯定就是该翻而没翻的
-    # 所以我们临时废掉 _is_url_or_code，防止 ISBN 或短句再次被跳过
-    original_filter = processor._is_url_or_code
-    processor._is_url_or_code = lambda text: False 
-    logger.info("🔓 已临时解除过滤器限制 (强制翻译模式)")
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # 解压
-        with zipfile.ZipFile(input_path, 'r') as zf:
-            zf.extractall(temp_dir)
-        
+    # 直接读写 zip (有工作区时读取工作区)，只取出需要修补的章节
+    with open_epub(input_path, create=False) as container:
         # 3. 执行外科手术
         logger.info("💉 [阶段3] 开始精准修补...")
-        
-        tasks = []
-        for rel_path in files_to_fix:
-            full_path = os.path.join(temp_dir, rel_path)
-            if not os.path.exists(full_path):
-                logger.warning(f"文件找不到: {rel_path}")
-                continue
-                
-            logger.info(f"   处理文件: {rel_path}")
-            # 对这些文件再次运行 process_file
-            # 这里的 target_lang='zh' 会触发中文跳过逻辑，所以只会翻译剩下的英文
-            tasks.append(
-                processor.process_file(full_path, full_path, target_lang="zh")
-            )
-        
-        # 并发执行修复
-        await asyncio.gather(*tasks)
-        
-        # 恢复过滤器 (虽然脚本马上结束了，但这是好习惯)
-        processor._is_url_or_code = original_filter
-
-        # 4. 缝合伤口 (重新打包)
-        logger.info("📦 [阶段4] 重新打包...")
-        repack_epub(temp_dir, output_path)
+        stats = await patch_untranslated(container, report['details'], translator, target_lang="zh", ledger=ledger)
+        logger.info(f"   块级修补 {stats['blocks']} 处，整章重译 {stats['files']} 个文件")
+
+        # 4. 缝合伤口 (写出新 ePub，未改动的条目原样复制)
+        logger.info("📦 [阶段4] 写出修补后的 ePub...")
+        container.save(output_path)
+        if ledger is not None:
+            ledger.save(output_path)
         logger.info(f"✅ 修补完成！文件已保存至: {output_path}")
 
-def repack_epub(source_dir: str, output_path: str):
-    """标准的 ePub 打包逻辑"""
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # mimetype 必须不压缩且在最前
-        mimetype_path = os.path.join(source_dir, 'mimetype')
-        if os.path.exists(mimetype_path):
-            zf.write(mimetype_path, 'mimetype', compress_type=zipfile.ZIP_STORED)
-        
-        for root, _, files in os.walk(source_dir):
-            for f in files:
-                if f == 'mimetype': continue
-                full_path = os.path.join(root, f)
-                arc_name = os.path.relpath(full_path, source_dir)
-                zf.write(full_path, arc_name)
-
 def main():
     if len(sys.argv) < 2:
         print("用法: python patch_leaks.py <有漏译的epub路径> [输出路径]")
@@ -132,6 +92,8 @@ def main():
         config = TranslatorConfig.from_env()
         # 强制高并发，反正只修几个文件
         config.max_concurrent = 50 
+        # 补漏不读缓存：缓存里可能就是上次没翻出来的原文
+        config.cache_read = False
     except Exception as e:
         print(f"配置加载失败: {e}")
         sys.exit(1)